@@ -24,10 +24,10 @@ class CustomUserAdmin(UserAdmin):
 
 
 class OTPAdmin(admin.ModelAdmin):
-    list_display = ('user', 'otp_code', 'created_at', 'expires_at', 'is_used')
+    list_display = ('user', 'created_at', 'expires_at', 'is_used')
     list_filter = ('is_used', 'created_at', 'expires_at')
-    search_fields = ('user__email', 'user__phone_number', 'otp_code')
-    readonly_fields = ('created_at', 'expires_at')
+    search_fields = ('user__email', 'user__phone_number')
+    readonly_fields = ('code_hash', 'created_at', 'expires_at')
 
 
 admin.site.register(User, CustomUserAdmin)
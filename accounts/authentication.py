@@ -0,0 +1,69 @@
+"""
+Token authentication with a cache in front of the Token + User lookup.
+
+Each cached entry maps a token key to its user for AUTH_TOKEN_CACHE_TIMEOUT
+seconds in the AUTH_TOKEN_CACHE_ALIAS cache, whose MAX_ENTRIES bounds its size;
+after that the token and user are read again. Entries are dropped when the
+token is deleted or the user is saved (which covers deactivation and user_type
+changes), see accounts/signals.py, but only in the cache of the process doing
+the write. Other processes, and writes that bypass signals such as
+queryset.update(), see a revocation once the entry expires, so the timeout is
+kept short; a cache shared by all workers makes revocation immediate.
+"""
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+def _cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def _token_cache_key(key):
+    return f'auth-token:{key}'
+
+
+def _user_cache_key(user_id):
+    return f'auth-token-user:{user_id}'
+
+
+def forget_token(key):
+    _cache().delete(_token_cache_key(key))
+
+
+def forget_user(user_id):
+    """Drop the cached token entry of a user, if any"""
+    cache = _cache()
+    key = cache.get(_user_cache_key(user_id))
+    if key is not None:
+        cache.delete_many([_token_cache_key(key), _user_cache_key(user_id)])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        cache = _cache()
+        user, expires_at = cache.get(_token_cache_key(key), (None, 0))
+        # Checked here too, so the timeout holds whatever the backend's expiry granularity
+        if user is None or time.time() >= expires_at:
+            model = self.get_model()
+            try:
+                token = model.objects.select_related('user').get(key=key)
+            except model.DoesNotExist:
+                raise exceptions.AuthenticationFailed(_('Invalid token.'))
+            user = token.user
+            timeout = settings.AUTH_TOKEN_CACHE_TIMEOUT
+            cache.set_many({
+                _token_cache_key(key): (user, time.time() + timeout),
+                _user_cache_key(user.pk): key,
+            }, timeout)
+        else:
+            # Rebuilt without a query; request.auth.key is all callers use
+            token = self.get_model()(key=key, user=user)
+
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (user, token)
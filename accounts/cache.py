@@ -0,0 +1,36 @@
+"""
+Cached profile responses.
+
+UserProfileView serves the serialized user and profile from the
+PROFILE_CACHE_ALIAS cache, keyed per user. The token is left out of the cached
+data and filled in from the request. Entries are dropped after commit when the
+user or profile is saved or deleted, see accounts/signals.py, in the cache of
+the process doing the write. Other processes, unless PROFILE_CACHE_ALIAS is
+shared, and writes that bypass signals see the change when the entry expires
+after PROFILE_CACHE_TIMEOUT.
+"""
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_cache():
+    return caches[settings.PROFILE_CACHE_ALIAS]
+
+
+def _profile_key(user_id):
+    return f'accounts:profile:{user_id}'
+
+
+def forget_profile(user_id):
+    get_cache().delete(_profile_key(user_id))
+
+
+def cached_profile(user_id, compute):
+    """Return the cached profile data of a user, or compute and cache it"""
+    cache = get_cache()
+    key = _profile_key(user_id)
+    data = cache.get(key)
+    if data is None:
+        data = compute()
+        cache.set(key, data, settings.PROFILE_CACHE_TIMEOUT)
+    return data
@@ -0,0 +1,283 @@
+"""
+OTP delivery.
+
+Sending an OTP only queues the message; a few worker threads per channel
+(email, sms) hand queued messages to the channel's transport in batches and
+retry failed sends with exponential backoff, so no request waits on an SMS or
+SMTP round trip. Queues are held in memory rather than in a job table: the
+database only keeps hashes of codes, and a code lost with its process is
+recovered by requesting another. Transports are chosen per channel by the
+OTP_TRANSPORTS setting, which must name one for every channel.
+"""
+import logging
+import queue
+import random
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core import checks, mail
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+from laundry_service import metrics
+from .models import OTP_VALIDITY_MINUTES
+
+logger = logging.getLogger(__name__)
+
+delivery_latency = metrics.histogram(
+    'otp_delivery_latency_seconds', 'Time from queueing an OTP message to its delivery', ['channel']
+)
+delivery_outcomes = metrics.counter(
+    'otp_messages_total', 'OTP messages by outcome: sent, retried, failed or dropped', ['channel', 'outcome']
+)
+
+
+CHANNELS = ('email', 'sms')
+
+
+class Message:
+    def __init__(self, channel, recipient, body):
+        self.channel = channel
+        self.recipient = recipient
+        self.body = body
+        self.queued_at = time.monotonic()
+        self.attempts = 0
+
+
+class BaseTransport:
+    def send_messages(self, messages):
+        """
+        Send a batch of messages. Returns the messages that could not be sent,
+        which are retried; raising retries the whole batch.
+        """
+        raise NotImplementedError
+
+
+class ConsoleTransport(BaseTransport):
+    """Writes messages to a stream (stdout by default), a stand-in for a provider in development"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self._lock = threading.Lock()
+
+    def write_messages(self, stream, messages):
+        for message in messages:
+            stream.write(f'[{message.channel}] {message.recipient}: {message.body}\n')
+        stream.flush()
+
+    def send_messages(self, messages):
+        with self._lock:
+            self.write_messages(self.stream, messages)
+        return []
+
+
+class FileTransport(ConsoleTransport):
+    """Appends messages to OTP_DELIVERY_FILE_PATH"""
+
+    def __init__(self, path=None):
+        super().__init__()
+        self.path = path or settings.OTP_DELIVERY_FILE_PATH
+
+    def send_messages(self, messages):
+        with self._lock, open(self.path, 'a') as stream:
+            self.write_messages(stream, messages)
+        return []
+
+
+class EmailTransport(BaseTransport):
+    """Sends email through the EMAIL_BACKEND, over one connection per batch"""
+    subject = 'Your verification code'
+
+    def send_messages(self, messages):
+        connection = mail.get_connection()
+        connection.send_messages([
+            mail.EmailMessage(self.subject, message.body, to=[message.recipient], connection=connection)
+            for message in messages
+        ])
+        return []
+
+
+class DeliveryQueue:
+    """Queue of messages for one channel, drained by worker threads started on first use"""
+
+    def __init__(self, channel, transport, workers=1, batch_size=50, batch_wait=0.05,
+                 max_attempts=5, retry_delay=1, max_retry_delay=60, max_queued=10000):
+        self.channel = channel
+        self.transport = transport
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0
+        self._threads = []
+
+    def put(self, message):
+        """Queue message for delivery. Returns False when the queue is full and it was dropped."""
+        with self._lock:
+            self._pending += 1
+            # Threads do not survive a fork, so a forked worker process starts its own
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            while len(self._threads) < self.workers:
+                thread = threading.Thread(target=self._work, name=f'otp-delivery-{self.channel}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        return self._enqueue(message)
+
+    def wait_idle(self, timeout=None):
+        """Block until every queued message was sent or given up on. Returns False on timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending == 0, timeout)
+
+    def _enqueue(self, message):
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            logger.warning('OTP %s queue is full, dropping a message', self.channel)
+            self._finish(message, 'dropped')
+            return False
+        return True
+
+    def _finish(self, message, outcome):
+        delivery_outcomes.inc(channel=self.channel, outcome=outcome)
+        with self._idle:
+            self._pending -= 1
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        # Give a burst of requests a moment to share one provider call
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _work(self):
+        while True:
+            self._deliver(self._next_batch())
+
+    def _deliver(self, batch):
+        for message in batch:
+            message.attempts += 1
+        try:
+            failed = {id(message) for message in self.transport.send_messages(batch) or ()}
+        except Exception:
+            logger.exception('Sending %d OTP %s messages failed', len(batch), self.channel)
+            failed = {id(message) for message in batch}
+
+        now = time.monotonic()
+        for message in batch:
+            if id(message) in failed:
+                self._retry(message)
+            else:
+                delivery_latency.observe(now - message.queued_at, channel=self.channel)
+                self._finish(message, 'sent')
+
+    def _retry(self, message):
+        if message.attempts >= self.max_attempts:
+            logger.error('Giving up on an OTP %s message after %d attempts', self.channel, message.attempts)
+            self._finish(message, 'failed')
+            return
+        delivery_outcomes.inc(channel=self.channel, outcome='retried')
+        # Exponential backoff with jitter, so a provider outage is not met with synchronized retries
+        delay = min(self.retry_delay * 2 ** (message.attempts - 1), self.max_retry_delay)
+        timer = threading.Timer(delay * random.uniform(0.5, 1), self._enqueue, [message])
+        timer.daemon = True
+        timer.start()
+
+
+class Dispatcher:
+    """A DeliveryQueue per channel"""
+
+    def __init__(self, transports, **options):
+        self.queues = {
+            channel: DeliveryQueue(channel, transport, **options) for channel, transport in transports.items()
+        }
+
+    def send(self, channel, recipient, body):
+        delivery_queue = self.queues.get(channel)
+        if delivery_queue is None:
+            # Reported by the deployment check; the code is recovered by requesting another
+            logger.error('No OTP transport is configured for the %s channel, dropping a message', channel)
+            return False
+        return delivery_queue.put(Message(channel, recipient, body))
+
+    def wait_idle(self, timeout=None):
+        return all(delivery_queue.wait_idle(timeout) for delivery_queue in self.queues.values())
+
+
+def check_transports(app_configs=None, **kwargs):
+    """
+    Deployment check that OTP_TRANSPORTS covers every channel and that
+    transports writing codes in plain text are only used with DEBUG.
+    """
+    errors = []
+    transports = settings.OTP_TRANSPORTS
+    for channel in CHANNELS:
+        if channel not in transports:
+            errors.append(checks.Error(
+                f'OTP_TRANSPORTS has no transport for the {channel} channel.',
+                hint=f'Codes for the {channel} channel cannot be delivered; configure a provider transport.',
+                id='accounts.E001',
+            ))
+    for channel, path in transports.items():
+        try:
+            transport_class = import_string(path)
+        except ImportError as error:
+            errors.append(checks.Error(f'OTP_TRANSPORTS[{channel!r}]: {error}', id='accounts.E002'))
+            continue
+        if issubclass(transport_class, ConsoleTransport) and not settings.DEBUG:
+            errors.append(checks.Error(
+                f'OTP_TRANSPORTS uses {path} for {channel}, which writes codes in plain text.',
+                hint='Configure a provider transport or enable DEBUG.',
+                id='accounts.E003',
+            ))
+    return errors
+
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher():
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = Dispatcher(
+                {channel: import_string(path)() for channel, path in settings.OTP_TRANSPORTS.items()},
+                workers=settings.OTP_DELIVERY_WORKERS,
+                batch_size=settings.OTP_DELIVERY_BATCH_SIZE,
+                batch_wait=settings.OTP_DELIVERY_BATCH_WAIT,
+                max_attempts=settings.OTP_DELIVERY_MAX_ATTEMPTS,
+                retry_delay=settings.OTP_DELIVERY_RETRY_DELAY,
+                max_retry_delay=settings.OTP_DELIVERY_MAX_RETRY_DELAY,
+            )
+        return _dispatcher
+
+
+def set_dispatcher(dispatcher):
+    """Replace the dispatcher, e.g. with one using a recording transport in tests. Returns the previous one."""
+    global _dispatcher
+    with _dispatcher_lock:
+        previous, _dispatcher = _dispatcher, dispatcher
+    return previous
+
+
+def send_otp(user, otp_code):
+    """Queue otp_code for delivery to the user's email, or else phone, once the current transaction commits"""
+    if user.email:
+        channel, recipient = 'email', user.email
+    else:
+        channel, recipient = 'sms', user.full_phone
+    body = f'Your verification code is {otp_code}. It expires in {OTP_VALIDITY_MINUTES} minutes.'
+    transaction.on_commit(lambda: get_dispatcher().send(channel, recipient, body))
@@ -0,0 +1,65 @@
+import statistics
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from rest_framework.test import APIClient
+from accounts.models import OTP, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the SQL statements and latency of OTP verification through the full request stack. '
+        'Runs against a throwaway test database, so the configured database is neither written nor '
+        'locked, with in-process caches and rate limits lifted. Reports the current code path only; '
+        'compare runs on two checkouts to measure a change.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        caches = {
+            alias: {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'benchmark-{alias}'}
+            for alias in settings.CACHES
+        }
+        rate_limits = {name: (options['requests'] * 2, window) for name, (_, window) in settings.RATE_LIMITS.items()}
+
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(CACHES=caches, RATE_LIMITS=rate_limits):
+                self.run_benchmark(options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def verify(self, client, user):
+        otp_code = OTP.generate_otp(user)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = client.post('/api/auth/verify-otp/', {'email': user.email, 'otp': otp_code})
+            duration = time.perf_counter() - start
+        if response.status_code != 200:
+            raise RuntimeError(f'Verification failed: {response.data}')
+        return len(queries), duration
+
+    def run_benchmark(self, requests):
+        client = APIClient()
+        user = User.objects.create_user(email='benchmark-verify-otp@example.invalid', user_type='customer')
+
+        statements, _ = self.verify(client, user)
+        self.stdout.write(f'First login: {statements} statements')
+
+        durations = []
+        for _ in range(requests):
+            statements, duration = self.verify(client, user)
+            durations.append(duration)
+        self.stdout.write(f'Returning user: {statements} statements')
+
+        p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) > 1 else durations[0]
+        self.stdout.write(self.style.SUCCESS(
+            f'{requests} verifications: p50 {statistics.median(durations) * 1000:.2f}ms, p95 {p95 * 1000:.2f}ms'
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from accounts.models import OTP
+
+
+class Command(BaseCommand):
+    help = 'Delete used and expired one-time passwords'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = OTP.purge(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} one-time passwords'))
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:25
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def delete_plaintext_otps(apps, schema_editor):
+    # Outstanding codes were stored in plain text and may be several per user;
+    # they expire within minutes, so users simply request a new one
+    apps.get_model('accounts', 'OTP').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0008_user_user_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_plaintext_otps, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='otp',
+            name='otp_code',
+        ),
+        migrations.AddField(
+            model_name='otp',
+            name='code_hash',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AlterField(
+            model_name='otp',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='otp', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='otp',
+            index=models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ),
+    ]
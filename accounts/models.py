@@ -4,10 +4,14 @@ from django.core.validators import validate_email, RegexValidator
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 import uuid
-import random
+import secrets
+from django.db.models import Q
 from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
 from datetime import timedelta
 
+OTP_VALIDITY_MINUTES = 5
+
 
 class UserManager(BaseUserManager):
     def _validate_input(self, email=None, country_code=None, phone_number=None):
@@ -116,37 +120,86 @@ class User(AbstractBaseUser, PermissionsMixin):
 
 
 class OTP(models.Model):
+    """
+    The current one-time password of a user. Each user has at most one row,
+    replaced in a single upsert whenever a new code is sent; only a keyed hash
+    of the code is stored.
+    """
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='otps')
-    otp_code = models.CharField(max_length=6)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='otp')
+    code_hash = models.CharField(max_length=64)
     created_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     is_used = models.BooleanField(default=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['expires_at'], name='otp_expires_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user} - {self.otp_code}"
+        return f"{self.user} - {self.created_at}"
 
     def is_valid(self):
         return not self.is_used and self.expires_at > timezone.now()
 
-    def mark_used(self):
-        self.is_used = True
-        self.save(update_fields=['is_used'])
+    @staticmethod
+    def hash_code(user_id, otp_code):
+        return salted_hmac('accounts.OTP', f'{user_id}:{otp_code}', algorithm='sha256').hexdigest()
 
     @classmethod
     def generate_otp(cls, user):
-        # Invalidate previous unused OTPs (mark as used)
-        cls.objects.filter(user=user, is_used=False).update(is_used=True)
+        """Replace the user's OTP with a new code in one upsert. Returns the plain code."""
+        otp_code = f'{secrets.randbelow(10 ** 6):06d}'
+        # By id, so the unsaved instance (whose pk the upsert may not use) is not cached on the user
+        cls.objects.bulk_create(
+            [cls(
+                user_id=user.pk,
+                code_hash=cls.hash_code(user.pk, otp_code),
+                expires_at=timezone.now() + timedelta(minutes=OTP_VALIDITY_MINUTES)
+            )],
+            update_conflicts=True,
+            unique_fields=['user'],
+            update_fields=['code_hash', 'created_at', 'expires_at', 'is_used'],
+        )
+        user._state.fields_cache.pop('otp', None)
+        return otp_code
 
-        # Create new OTP
-        otp_code = str(random.randint(100000, 999999)).zfill(6)
-        expires_at = timezone.now() + timedelta(minutes=5)
+    @classmethod
+    def verify(cls, user, otp_code):
+        """
+        Check otp_code against the user's current OTP and consume it.
+        The conditional UPDATE makes sure a code is only accepted once.
+        Loading the user with select_related('otp') saves the OTP query.
+        """
+        try:
+            otp = user.otp
+        except cls.DoesNotExist:
+            return False
+        if not otp.is_valid():
+            return False
+        if not constant_time_compare(otp.code_hash, cls.hash_code(user.pk, otp_code)):
+            return False
+        consumed = cls.objects.filter(
+            pk=otp.pk, code_hash=otp.code_hash, is_used=False, expires_at__gt=timezone.now()
+        ).update(is_used=True)
+        otp.is_used = True
+        return consumed == 1
 
-        cls.objects.create(user=user, otp_code=otp_code, expires_at=expires_at)
-        return otp_code
+    @classmethod
+    def purge(cls, batch_size=1000):
+        """
+        Delete used and expired rows in batches of batch_size, each its own short
+        statement so the table is never locked for long. Returns the number deleted.
+        """
+        deleted = 0
+        while True:
+            expired = Q(is_used=True) | Q(expires_at__lte=timezone.now())
+            batch = list(cls.objects.filter(expired).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                return deleted
+            deleted += cls.objects.filter(expired, pk__in=batch).delete()[0]
 
 
 class UserProfile(models.Model):
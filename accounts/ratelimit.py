@@ -0,0 +1,74 @@
+"""
+Sliding-window rate limits held in the cache.
+
+Each (scope, key) pair counts hits in fixed windows with atomic cache
+increments; the previous window's count is weighted by how much of it still
+overlaps the sliding window. That approximates a true sliding log with two
+counters per key instead of a timestamp per hit.
+"""
+import hashlib
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def _cache():
+    return caches[settings.RATE_LIMIT_CACHE_ALIAS]
+
+
+def _counter_key(scope, key, window_index):
+    digest = hashlib.sha256(str(key).encode()).hexdigest()[:32]
+    return f'ratelimit:{scope}:{digest}:{window_index}'
+
+
+def hit(scope, key, limit, window):
+    """
+    Record a hit for key under scope, allowing limit hits per window seconds.
+    Returns 0 when allowed, otherwise the seconds to wait before retrying
+    (the hit is then not counted).
+    """
+    cache = _cache()
+    now = time.time()
+    window_index = int(now // window)
+    elapsed = now - window_index * window
+    current_key = _counter_key(scope, key, window_index)
+    previous_key = _counter_key(scope, key, window_index - 1)
+
+    # Counted before deciding, so concurrent hits each see the ones ahead of them.
+    # Kept for two windows so it can serve as the previous window next time.
+    cache.add(current_key, 0, timeout=2 * window)
+    try:
+        current = cache.incr(current_key) - 1
+    except ValueError:  # Evicted between add and incr
+        cache.set(current_key, 1, timeout=2 * window)
+        current = 0
+
+    previous = cache.get(previous_key, 0)
+    estimate = previous * (window - elapsed) / window + current
+    if estimate < limit:
+        return 0
+
+    try:
+        cache.decr(current_key)
+    except ValueError:
+        pass
+    if current >= limit:
+        return max(1, math.ceil(window - elapsed))
+    # Wait until enough of the previous window has slid out, at most until this one ends
+    return max(1, math.ceil(min((estimate - limit) * window / previous, window - elapsed)))
+
+
+def check_limits(limits):
+    """
+    Apply several (scope, key) limits, with limits a list of (scope, key) pairs whose
+    (limit, window) comes from the RATE_LIMITS setting. Returns the longest wait, or 0.
+    """
+    wait = 0
+    for scope, key in limits:
+        if key is None:
+            continue
+        limit, window = settings.RATE_LIMITS[scope]
+        wait = max(wait, hit(scope, key, limit, window))
+    return wait
@@ -3,7 +3,6 @@ from .models import User, UserProfile, OTP
 from django.core.validators import validate_email
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.utils import timezone
 from rest_framework.authtoken.models import Token
 
 
@@ -67,27 +66,23 @@ class VerifyOTPSerializer(serializers.Serializer):
         country_code = data.get('country_code')
         phone_number = data.get('phone_number')
         otp_code = data.get('otp')
-        user_type = data.get('user_type', 'customer')
 
         if not email and not (country_code and phone_number):
             raise serializers.ValidationError("Either email or both country code and phone number must be provided")
 
-        # Find or create the user: SendOTP should have created it, but create here if not present
+        # SendOTP creates the user, so an unknown identifier simply has no valid code.
+        # The OTP, profile and token the verify response needs come with the user.
+        users = User.objects.select_related('otp', 'profile', 'auth_token')
         if email:
-            user, created = User.objects.get_or_create(email=email, defaults={'country_code': None, 'phone_number': None, 'user_type': user_type})
+            user = users.filter(email=email).first()
         else:
-            user, created = User.objects.get_or_create(country_code=country_code, phone_number=phone_number, defaults={'email': None, 'user_type': user_type})
-
-        # Lookup latest matching OTP for this user
-        otp_qs = OTP.objects.filter(user=user, otp_code=otp_code, is_used=False, expires_at__gt=timezone.now())
-        otp_obj = otp_qs.order_by('-created_at').first()
-        if not otp_obj:
+            user = users.filter(country_code=country_code, phone_number=phone_number).first()
+        if user is None or not OTP.verify(user, otp_code):
             raise serializers.ValidationError("Invalid or expired OTP")
 
-        # Mark OTP used and verify user
-        otp_obj.mark_used()
-        user.is_verified = True
-        user.save(update_fields=['is_verified'])
+        if not user.is_verified:
+            user.is_verified = True
+            user.save(update_fields=['is_verified'])
 
         data['user'] = user
         return data
@@ -126,5 +121,11 @@ class UserSerializer(serializers.ModelSerializer):
             return ""
 
     def get_token(self, obj):
-        token, _ = Token.objects.get_or_create(user=obj)
-        return token.key
+        # The token the request authenticated with needs no lookup; tokens are created at login
+        request = self.context.get('request')
+        if request is not None and request.user == obj and isinstance(request.auth, Token):
+            return request.auth.key
+        try:
+            return obj.auth_token.key
+        except Token.DoesNotExist:
+            return None
@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+from .models import User, UserProfile
+from .authentication import forget_token, forget_user
+from .cache import forget_profile
+
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_saved_user(sender, instance, **kwargs):
+    # Cached users must not outlive deactivation or a user_type change
+    forget_user(instance.pk)
+
+
+def _forget_profile_after_commit(user_id):
+    # After commit, so a concurrent read cannot cache the old rows again
+    transaction.on_commit(lambda: forget_profile(user_id))
+
+
+@receiver([post_save, post_delete], sender=User)
+def forget_user_profile(sender, instance, created=False, **kwargs):
+    # A new user has nothing cached yet
+    if not created:
+        _forget_profile_after_commit(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=UserProfile)
+def forget_profile_of_user(sender, instance, **kwargs):
+    _forget_profile_after_commit(instance.user_id)
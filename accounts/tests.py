@@ -1,3 +1,357 @@
-from django.test import TestCase
+import re
+import threading
+import time
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.db import connection
+from datetime import timedelta
+from django.core.cache import caches
+from django.core import checks
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from laundry_service.testing import QueryPlanAssertions
+from .delivery import (
+    BaseTransport, DeliveryQueue, Dispatcher, Message, check_transports, delivery_outcomes, set_dispatcher
+)
+from . import ratelimit
+from .cache import forget_profile
+from .models import OTP, User, UserProfile
 
-# Create your tests here.
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite')
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    def test_otp_purge_uses_index(self):
+        queryset = OTP.objects.filter(expires_at__lte=timezone.now())
+        self.assertUsesIndex(queryset, 'otp_expires_idx')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        caches[settings.PROFILE_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(email='customer@example.com', user_type='customer')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def get_profile(self):
+        return self.client.get('/api/auth/profile/')
+
+    def test_repeat_requests_skip_token_lookup(self):
+        self.assertEqual(self.get_profile().status_code, 200)
+        # Token and serialized profile are both cached
+        with self.assertNumQueries(0):
+            response = self.get_profile()
+        self.assertEqual(response.data['token'], self.token.key)
+
+    def test_deactivation_and_token_delete_invalidate(self):
+        self.get_profile()
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get_profile().status_code, 401)
+
+        self.user.is_active = True
+        self.user.save()
+        self.get_profile()
+        self.token.delete()
+        self.assertEqual(self.get_profile().status_code, 401)
+
+    def after_token_cache_timeout(self):
+        later = time.time() + settings.AUTH_TOKEN_CACHE_TIMEOUT
+        return mock.patch('accounts.authentication.time', mock.Mock(time=lambda: later))
+
+    def test_revocation_in_another_process_takes_effect_after_timeout(self):
+        worker_caches = {
+            **settings.CACHES,
+            'worker-a': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-a'},
+            'worker-b': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'worker-b'},
+        }
+        with self.settings(CACHES=worker_caches, AUTH_TOKEN_CACHE_ALIAS='worker-a'):
+            self.assertEqual(self.get_profile().status_code, 200)
+            # Revoked in a worker with its own cache, whose invalidation never reaches worker-a
+            with self.settings(AUTH_TOKEN_CACHE_ALIAS='worker-b'):
+                self.user.is_active = False
+                self.user.save()
+            self.assertEqual(self.get_profile().status_code, 200)
+            with self.after_token_cache_timeout():
+                self.assertEqual(self.get_profile().status_code, 401)
+
+            caches['worker-a'].clear()
+            self.user.is_active = True
+            self.user.save()
+            self.assertEqual(self.get_profile().status_code, 200)
+            with self.settings(AUTH_TOKEN_CACHE_ALIAS='worker-b'):
+                self.token.delete()
+            with self.after_token_cache_timeout():
+                self.assertEqual(self.get_profile().status_code, 401)
+
+    def test_user_type_change_is_seen(self):
+        self.get_profile()
+        self.user.user_type = 'vendor'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.get_profile().data['user_type'], 'vendor')
+
+
+class UserProfileViewTests(TestCase):
+    def setUp(self):
+        caches[settings.PROFILE_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(email='customer@example.com', user_type='customer')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_profile_loads_in_one_query_then_from_cache(self):
+        UserProfile.objects.create(user=self.user, first_name='Asha', last_name='Rao')
+        self.client.get('/api/auth/profile/')
+        forget_profile(self.user.pk)
+        # Token is cached; user, profile and token come from one query
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/auth/profile/')
+        self.assertEqual(response.data['full_name'], 'Asha Rao')
+        self.assertEqual(response.data['profile']['first_name'], 'Asha')
+        self.assertEqual(response.data['token'], self.token.key)
+        self.assertEqual(list(response.data)[-1], 'token')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/auth/profile/').data, response.data)
+
+    def test_other_authentication_gets_the_users_token(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/auth/profile/').data['token'], self.token.key)
+        self.token.delete()
+        self.assertEqual(client.get('/api/auth/profile/').data['token'], Token.objects.get(user=self.user).key)
+
+    def test_profile_write_invalidates(self):
+        self.assertIsNone(self.client.get('/api/auth/profile/').data['profile'])
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/auth/profile/', {'first_name': 'Asha'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.client.get('/api/auth/profile/').data['full_name'], 'Asha')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch('/api/auth/profile/', {'pincode': '560001'})
+        self.assertEqual(self.client.get('/api/auth/profile/').data['profile']['pincode'], '560001')
+
+
+class OTPTests(TestCase):
+    def setUp(self):
+        caches[settings.RATE_LIMIT_CACHE_ALIAS].clear()
+        self.client = APIClient()
+        self.user = User.objects.create_user(email='customer@example.com', user_type='customer')
+
+    def verify(self, otp_code):
+        return self.client.post('/api/auth/verify-otp/', {'email': 'customer@example.com', 'otp': otp_code})
+
+    def test_new_code_replaces_previous_row(self):
+        first = OTP.generate_otp(self.user)
+        second = OTP.generate_otp(self.user)
+        self.assertEqual(OTP.objects.filter(user=self.user).count(), 1)
+        otp = OTP.objects.get(user=self.user)
+        self.assertNotIn(second, otp.code_hash)
+        if first != second:
+            self.assertFalse(OTP.verify(self.user, first))
+        self.assertTrue(OTP.verify(self.user, second))
+
+    def test_code_is_single_use(self):
+        otp_code = OTP.generate_otp(self.user)
+        response = self.verify(otp_code)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data['user']['is_verified'])
+        self.assertEqual(self.verify(otp_code).status_code, 400)
+
+    def test_verify_statements(self):
+        # First login: user with OTP, profile and token, consume the code, mark verified, issue a token
+        otp_code = OTP.generate_otp(self.user)
+        with self.assertNumQueries(6):
+            response = self.verify(otp_code)
+        self.assertEqual(response.data['token'], Token.objects.get(user=self.user).key)
+        self.assertIsNone(response.data['profile']['first_name'])
+
+        # Later logins only load the user and consume the code
+        otp_code = OTP.generate_otp(self.user)
+        with self.assertNumQueries(4):
+            response = self.verify(otp_code)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.data['user_exists'])
+
+    def test_expired_code_is_rejected_and_purged(self):
+        otp_code = OTP.generate_otp(self.user)
+        OTP.objects.filter(user=self.user).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertFalse(OTP.verify(self.user, otp_code))
+        self.assertEqual(OTP.purge(batch_size=1), 1)
+        self.assertFalse(OTP.objects.exists())
+
+    def test_verify_does_not_create_users(self):
+        response = self.client.post('/api/auth/verify-otp/', {'email': 'new@example.com', 'otp': '123456'})
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(User.objects.filter(email='new@example.com').exists())
+
+    def test_send_is_rate_limited_per_identifier(self):
+        limit, window = settings.RATE_LIMITS['otp-send-identifier']
+        for _ in range(limit):
+            response = self.client.post('/api/auth/send-otp/', {'email': 'Customer@example.com'})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post('/api/auth/send-otp/', {'email': 'customer@example.com'})
+        self.assertEqual(response.status_code, 429)
+        self.assertLessEqual(int(response['Retry-After']), window)
+        # Another identifier from the same address is still allowed
+        response = self.client.post('/api/auth/send-otp/', {'email': 'other@example.com'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_verify_is_rate_limited_per_identifier(self):
+        otp_code = OTP.generate_otp(self.user)
+        limit, _ = settings.RATE_LIMITS['otp-verify-identifier']
+        wrong = '000000' if otp_code != '000000' else '111111'
+        for _ in range(limit):
+            self.assertEqual(self.verify(wrong).status_code, 400)
+        self.assertEqual(self.verify(otp_code).status_code, 429)
+
+    def test_padded_identifiers_share_the_limit(self):
+        User.objects.create_user(country_code='+91', phone_number='9876543210', user_type='customer')
+        limit, _ = settings.RATE_LIMITS['otp-verify-identifier']
+        codes = []
+        for padding in range(limit + 2):
+            response = self.client.post('/api/auth/verify-otp/', {
+                'country_code': '+91 ', 'phone_number': ' ' * padding + '9876543210', 'otp': '000000'
+            })
+            codes.append(response.status_code)
+        self.assertEqual(codes, [400] * limit + [429] * 2)
+
+
+class RateLimitTests(TestCase):
+    def setUp(self):
+        caches[settings.RATE_LIMIT_CACHE_ALIAS].clear()
+
+    def test_concurrent_hits_do_not_exceed_the_limit(self):
+        workers = 20
+        barrier = threading.Barrier(workers)
+        waits = []
+        # Patched on the class, as every thread gets its own cache instance
+        cache_class = type(caches[settings.RATE_LIMIT_CACHE_ALIAS])
+
+        def slow_read(read):
+            # Widens the gap between reading the counts and acting on them
+            def wrapper(*args, **kwargs):
+                time.sleep(0.01)
+                return read(*args, **kwargs)
+            return wrapper
+
+        def attempt():
+            barrier.wait()
+            waits.append(ratelimit.hit('test', 'customer@example.com', 5, 600))
+        threads = [threading.Thread(target=attempt) for _ in range(workers)]
+        with mock.patch.object(cache_class, 'get', slow_read(cache_class.get)), \
+                mock.patch.object(cache_class, 'get_many', slow_read(cache_class.get_many)):
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(waits.count(0), 5)
+        self.assertNotEqual(ratelimit.hit('test', 'customer@example.com', 5, 600), 0)
+        # Refused hits are not counted, so one more is allowed under a limit of six
+        self.assertEqual(ratelimit.hit('test', 'customer@example.com', 6, 600), 0)
+
+
+class RecordingTransport(BaseTransport):
+    """Records each batch; fails the first failures calls, and waits for release if given"""
+
+    def __init__(self, failures=0, release=None):
+        self.failures = failures
+        self.release = release
+        self.sending = threading.Event()
+        self.messages = []
+        self.batches = []
+
+    def send_messages(self, messages):
+        self.sending.set()
+        if self.release is not None:
+            self.release.wait(5)
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('provider unavailable')
+        self.messages.extend(messages)
+        self.batches.append([message.recipient for message in messages])
+        return []
+
+
+class OTPTransportSettingsTests(TestCase):
+    def check_ids(self):
+        return [error.id for error in check_transports()]
+
+    @override_settings(DEBUG=False, OTP_TRANSPORTS={'email': 'accounts.delivery.EmailTransport'})
+    def test_every_channel_needs_a_transport(self):
+        self.assertEqual(self.check_ids(), ['accounts.E001'])
+
+    def test_plaintext_transports_need_debug(self):
+        transports = {'email': 'accounts.delivery.EmailTransport', 'sms': 'accounts.delivery.FileTransport'}
+        with override_settings(DEBUG=False, OTP_TRANSPORTS=transports):
+            self.assertEqual(self.check_ids(), ['accounts.E003'])
+        with override_settings(DEBUG=True, OTP_TRANSPORTS=transports):
+            self.assertEqual(self.check_ids(), [])
+
+    @override_settings(DEBUG=False, OTP_TRANSPORTS={'email': 'accounts.delivery.EmailTransport'})
+    def test_check_only_runs_for_deployments(self):
+        # Commands such as migrate must keep working before a transport is configured
+        self.assertEqual(checks.run_checks(tags=[checks.Tags.security]), [])
+        ids = [error.id for error in checks.run_checks(tags=[checks.Tags.security], include_deployment_checks=True)]
+        self.assertIn('accounts.E001', ids)
+
+
+class OTPDeliveryTests(TestCase):
+    def deliver(self, transport, messages, **options):
+        delivery_queue = DeliveryQueue('sms', transport, **{'batch_wait': 0, 'retry_delay': 0.01, **options})
+        for recipient in messages:
+            delivery_queue.put(Message('sms', recipient, 'code'))
+        self.assertTrue(delivery_queue.wait_idle(5))
+        return delivery_queue
+
+    def test_send_otp_queues_message_after_commit(self):
+        caches[settings.RATE_LIMIT_CACHE_ALIAS].clear()
+        transport = RecordingTransport()
+        dispatcher = Dispatcher({'email': transport, 'sms': transport}, batch_wait=0)
+        previous = set_dispatcher(dispatcher)
+        self.addCleanup(set_dispatcher, previous)
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = APIClient().post('/api/auth/send-otp/', {'email': 'customer@example.com'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(transport.messages, [])
+        self.assertEqual(len(callbacks), 1)
+        self.assertTrue(dispatcher.wait_idle(5))
+
+        self.assertEqual(transport.batches, [['customer@example.com']])
+        otp_code = re.search(r'\b\d{6}\b', transport.messages[0].body).group()
+        self.assertTrue(OTP.verify(User.objects.get(email='customer@example.com'), otp_code))
+
+    def test_failed_batch_is_retried(self):
+        retried = delivery_outcomes.value(channel='sms', outcome='retried')
+        transport = RecordingTransport(failures=2)
+        with self.assertLogs('accounts.delivery', 'ERROR') as logs:
+            self.deliver(transport, ['+911'], max_attempts=3)
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual(transport.batches, [['+911']])
+        self.assertEqual(delivery_outcomes.value(channel='sms', outcome='retried'), retried + 2)
+
+    def test_gives_up_after_max_attempts(self):
+        failed = delivery_outcomes.value(channel='sms', outcome='failed')
+        transport = RecordingTransport(failures=5)
+        with self.assertLogs('accounts.delivery', 'ERROR') as logs:
+            self.deliver(transport, ['+911'], max_attempts=2)
+        self.assertIn('Giving up on an OTP sms message after 2 attempts', logs.output[-1])
+        self.assertEqual(transport.batches, [])
+        self.assertEqual(delivery_outcomes.value(channel='sms', outcome='failed'), failed + 1)
+
+    def test_messages_queued_during_a_send_share_a_batch(self):
+        release = threading.Event()
+        transport = RecordingTransport(release=release)
+        delivery_queue = DeliveryQueue('sms', transport, batch_wait=0)
+        delivery_queue.put(Message('sms', '+911', 'code'))
+        self.assertTrue(transport.sending.wait(5))
+        # The single worker is now blocked sending the first message
+        for recipient in ['+912', '+913', '+914']:
+            delivery_queue.put(Message('sms', recipient, 'code'))
+        release.set()
+        self.assertTrue(delivery_queue.wait_idle(5))
+        self.assertEqual(transport.batches, [['+911'], ['+912', '+913', '+914']])
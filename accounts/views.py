@@ -5,7 +5,10 @@ from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
 from django.db import transaction
 from rest_framework.permissions import AllowAny
-from .models import User, UserProfile, OTP
+from .models import User, UserProfile
+from .cache import cached_profile
+from .delivery import send_otp
+from .ratelimit import check_limits
 from .serializers import (
     SendOTPSerializer,
     VerifyOTPSerializer,
@@ -15,11 +18,46 @@ from .serializers import (
 from rest_framework.authtoken.models import Token
 
 
+def otp_identifier(data):
+    """
+    The email or full phone number an OTP request is for, used to key its rate limits.
+    Normalized like the serializers trim their fields, so padded variants of one
+    identifier share its limits.
+    """
+    email, country_code, phone_number = (
+        str(data.get(field) or '').strip() for field in ('email', 'country_code', 'phone_number')
+    )
+    if email:
+        return email.lower()
+    if country_code and phone_number:
+        return f'{country_code}{phone_number}'
+    return None
+
+
+def rate_limited(request, scope):
+    """A 429 response when the identifier or client IP is over its limit for scope, else None"""
+    wait = check_limits([
+        (f'{scope}-identifier', otp_identifier(request.data)),
+        (f'{scope}-ip', request.META.get('REMOTE_ADDR')),
+    ])
+    if not wait:
+        return None
+    return Response(
+        {'status': 'error', 'message': 'Too many requests, try again later'},
+        status=status.HTTP_429_TOO_MANY_REQUESTS,
+        headers={'Retry-After': str(wait)}
+    )
+
+
 class SendOTPView(APIView):
     permission_classes = [AllowAny]
     def post(self, request):
         serializer = SendOTPSerializer(data=request.data)
         if serializer.is_valid():
+            limited = rate_limited(request, 'otp-send')
+            if limited:
+                return limited
+
             email = serializer.validated_data.get('email')
             country_code = serializer.validated_data.get('country_code')
             phone_number = serializer.validated_data.get('phone_number')
@@ -41,12 +79,9 @@ class SendOTPView(APIView):
             except Exception as e:
                 return Response({'status': 'error', 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
-            # Generate OTP using the OTP model
+            # Generate OTP using the OTP model and queue it for delivery
             otp_code = user.generate_otp()
-
-            # TODO: Integrate with your SMS/email service here
-            # send_otp_via_sms(user.full_phone, otp_code)
-            # send_otp_via_email(user.email, otp_code)
+            send_otp(user, otp_code)
 
             response_data = {'status': 'success', 'message': 'OTP sent successfully'}
             if settings.DEBUG:
@@ -60,14 +95,20 @@ class VerifyOTPView(APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        serializer = VerifyOTPSerializer(data=request.data)
-        if serializer.is_valid():
-            user = serializer.validated_data['user']
+        # Checked before validation, which consumes the code on a match
+        limited = rate_limited(request, 'otp-verify')
+        if limited:
+            return limited
 
-            # Get or create token
-            token, _ = Token.objects.get_or_create(user=user)
-
-            # Fetch related profile (if exists)
+        serializer = VerifyOTPSerializer(data=request.data)
+        # Consuming the code, marking the user verified and issuing a token commit together
+        with transaction.atomic():
+            valid = serializer.is_valid()
+            if valid:
+                user = serializer.validated_data['user']
+                # Token and profile were loaded with the user
+                token = getattr(user, 'auth_token', None) or Token.objects.create(user=user)
+        if valid:
             profile = getattr(user, 'profile', None)
 
             # Prepare user data
@@ -118,8 +159,20 @@ class UserProfileView(APIView):
 
     def get(self, request):
         """Get user profile with complete user data"""
-        user_serializer = UserSerializer(request.user)
-        return Response(user_serializer.data, status=status.HTTP_200_OK)
+        def serialize():
+            # User, profile and token in one query; the token is added per request
+            user = User.objects.select_related('profile', 'auth_token').get(pk=request.user.pk)
+            data = dict(UserSerializer(user, context={'request': request}).data)
+            del data['token']
+            return data
+
+        data = cached_profile(request.user.pk, serialize)
+        # The token the request authenticated with needs no lookup
+        if isinstance(request.auth, Token):
+            token = request.auth.key
+        else:
+            token = Token.objects.get_or_create(user=request.user)[0].key
+        return Response({**data, 'token': token}, status=status.HTTP_200_OK)
 
     def post(self, request):
         """Create user profile"""
@@ -129,7 +182,7 @@ class UserProfileView(APIView):
         serializer = UserProfileSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save(user=request.user)
-            user_serializer = UserSerializer(request.user)
+            user_serializer = UserSerializer(request.user, context={'request': request})
             return Response({'status': 'success', 'message': 'Profile created successfully', 'user': user_serializer.data}, status=status.HTTP_201_CREATED)
 
         return Response({'status': 'error', 'message': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
@@ -144,7 +197,7 @@ class UserProfileView(APIView):
         serializer = UserProfileSerializer(profile, data=request.data)
         if serializer.is_valid():
             serializer.save()
-            user_serializer = UserSerializer(request.user)
+            user_serializer = UserSerializer(request.user, context={'request': request})
             return Response({'status': 'success', 'message': 'Profile updated successfully', 'user': user_serializer.data}, status=status.HTTP_200_OK)
 
         return Response({'status': 'error', 'message': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
@@ -159,7 +212,7 @@ class UserProfileView(APIView):
         serializer = UserProfileSerializer(profile, data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
-            user_serializer = UserSerializer(request.user)
+            user_serializer = UserSerializer(request.user, context={'request': request})
             return Response({'status': 'success', 'message': 'Profile updated successfully', 'user': user_serializer.data}, status=status.HTTP_200_OK)
 
         return Response({'status': 'error', 'message': serializer.errors}, status=status.HTTP_400_BAD_REQUEST)
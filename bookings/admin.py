@@ -1,10 +1,16 @@
 from django.contrib import admin
-from .models import Booking
+from .models import Booking, BookingItem
+
+class BookingItemInline(admin.TabularInline):
+    model = BookingItem
+    extra = 0
+    readonly_fields = ('service_offering', 'service_name', 'unit', 'quantity', 'unit_price')
 
 class BookingAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'laundry_service', 'total_price', 'status', 'created_at')
     list_filter = ('status', 'created_at', 'laundry_service')
     search_fields = ('user__username', 'laundry_service__name')
-    readonly_fields = ('created_at', 'updated_at', 'total_price', 'user', 'laundry_service', 'service_offerings')
+    readonly_fields = ('created_at', 'updated_at', 'total_price', 'user', 'laundry_service')
+    inlines = [BookingItemInline]
 
 admin.site.register(Booking, BookingAdmin)
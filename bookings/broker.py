@@ -0,0 +1,111 @@
+"""
+Publish/subscribe for live booking updates.
+
+Booking events are published after commit to a channel per shop and per
+customer; the streaming endpoint subscribes to the channels of the connected
+user. The broker is chosen by the BOOKING_EVENT_BROKER setting (a dotted path)
+and defaults to an in-process broker, which only reaches subscribers in the
+same process. Deployments running several ASGI processes plug in a broker
+backed by a shared service with the same interface.
+"""
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+def shop_channel(laundry_service_id):
+    return f'shop:{laundry_service_id}'
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+class BaseBroker:
+    def publish(self, channel, message):
+        """Deliver message (a JSON-serializable dict) to the current subscribers of channel"""
+        raise NotImplementedError
+
+    def subscribe(self, channels):
+        """
+        Async context manager yielding a Subscription for the given channels.
+        Messages published while it is open are returned by its get().
+        """
+        raise NotImplementedError
+
+
+class Subscription:
+    def __init__(self, max_queued):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=max_queued)
+        self.overflowed = False
+
+    def deliver(self, message):
+        # Runs on the subscriber's loop; a slow client loses its stream rather than growing memory
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        """Next message, or None after timeout seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InMemoryBroker(BaseBroker):
+    """Process-local broker; publish may be called from any thread"""
+
+    def __init__(self, max_queued=100):
+        self.max_queued = max_queued
+        self._lock = threading.Lock()
+        self._subscribers = {}  # channel -> set of Subscription
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, message)
+            except RuntimeError:  # The subscriber's loop has closed
+                pass
+
+    @asynccontextmanager
+    async def subscribe(self, channels):
+        subscription = Subscription(self.max_queued)
+        with self._lock:
+            for channel in channels:
+                self._subscribers.setdefault(channel, set()).add(subscription)
+        try:
+            yield subscription
+        finally:
+            with self._lock:
+                for channel in channels:
+                    subscribers = self._subscribers.get(channel)
+                    if subscribers is not None:
+                        subscribers.discard(subscription)
+                        if not subscribers:
+                            del self._subscribers[channel]
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        broker_path = getattr(settings, 'BOOKING_EVENT_BROKER', None)
+        _broker = import_string(broker_path)() if broker_path else InMemoryBroker()
+    return _broker
+
+
+def set_broker(broker):
+    """Replace the broker, e.g. with a local stand-in in tests. Returns the previous one."""
+    global _broker
+    previous, _broker = _broker, broker
+    return previous
@@ -0,0 +1,91 @@
+"""
+Vendor booking dashboard.
+
+Every figure is computed with values().annotate() aggregates over all of a
+vendor's shops at once, so the dashboard costs the same four queries however
+many shops or bookings the vendor has.
+"""
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, Min, Sum, DateField
+from django.db.models.functions import TruncDay, TruncWeek
+
+from laundryshops.availability import shop_time_zone
+from laundryshops.models import LaundryService
+from .models import Booking
+
+PERIODS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+}
+
+# Bookings that do not count towards revenue
+NON_REVENUE_STATUSES = ('cancelled',)
+
+
+def _local_midnight(day):
+    return datetime.combine(day, time.min, tzinfo=shop_time_zone())
+
+
+def _money(value):
+    return str((value or Decimal('0')).quantize(Decimal('0.01')))
+
+
+def vendor_dashboard(vendor, start=None, end=None, period='day'):
+    """
+    Booking statistics for every shop of vendor.
+    start and end are inclusive dates in shop local time and limit the status
+    counts and revenue; the pending queue always reflects all pending bookings.
+    """
+    tz = shop_time_zone()
+    bookings = Booking.objects.filter(laundry_service__vendor=vendor).order_by()
+    if start:
+        bookings = bookings.filter(created_at__gte=_local_midnight(start))
+    if end:
+        bookings = bookings.filter(created_at__lt=_local_midnight(end + timedelta(days=1)))
+
+    shops = {
+        shop['id']: {
+            'id': shop['id'],
+            'shop_name': shop['shop_name'],
+            'bookings': {status: 0 for status, _ in Booking.STATUS_CHOICES},
+            'total_bookings': 0,
+            'revenue': Decimal('0'),
+            'pending_queue': 0,
+            'oldest_pending': None,
+        }
+        for shop in LaundryService.objects.filter(vendor=vendor).order_by('shop_name').values('id', 'shop_name')
+    }
+
+    for row in bookings.values('laundry_service', 'status').annotate(count=Count('id'), revenue=Sum('total_price')):
+        shop = shops[row['laundry_service']]
+        shop['bookings'][row['status']] = row['count']
+        shop['total_bookings'] += row['count']
+        if row['status'] not in NON_REVENUE_STATUSES:
+            shop['revenue'] += row['revenue']
+
+    pending = Booking.objects.filter(laundry_service__vendor=vendor, status='pending').order_by()
+    for row in pending.values('laundry_service').annotate(count=Count('id'), oldest=Min('created_at')):
+        shops[row['laundry_service']]['pending_queue'] = row['count']
+        shops[row['laundry_service']]['oldest_pending'] = row['oldest']
+
+    revenue = [
+        {'period': row['period'], 'bookings': row['count'], 'revenue': _money(row['revenue'])}
+        for row in bookings.exclude(status__in=NON_REVENUE_STATUSES)
+        .annotate(period=PERIODS[period]('created_at', output_field=DateField(), tzinfo=tz))
+        .values('period')
+        .annotate(count=Count('id'), revenue=Sum('total_price'))
+        .order_by('period')
+    ]
+
+    for shop in shops.values():
+        shop['revenue'] = _money(shop['revenue'])
+    return {
+        'start': start,
+        'end': end,
+        'period': period,
+        'pending_queue': sum(shop['pending_queue'] for shop in shops.values()),
+        'shops': list(shops.values()),
+        'revenue': revenue,
+    }
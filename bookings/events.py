@@ -0,0 +1,71 @@
+"""
+Booking change log.
+
+Every booking write appends a BookingEvent. Vendor apps poll the changes feed
+with the last event id they saw and receive only what changed since, instead of
+downloading the whole booking list to spot differences. Once the write commits,
+each event is also published to the shop's and the customer's broker channels
+for the streaming endpoint.
+"""
+from django.db import transaction
+from .broker import get_broker, shop_channel, user_channel
+from .models import Booking, BookingEvent
+
+DEFAULT_FEED_LIMIT = 100
+MAX_FEED_LIMIT = 500
+
+
+def event_message(event):
+    """Stream representation of an event, matching BookingEventSerializer"""
+    return {
+        'cursor': event.id,
+        'booking': event.booking_id,
+        'laundry_service': event.laundry_service_id,
+        'kind': event.kind,
+        'status': event.status,
+        'version': event.version,
+        'created_at': event.created_at.isoformat().replace('+00:00', 'Z'),
+    }
+
+
+def publish_events(events, user_ids):
+    broker = get_broker()
+    for event, user_id in zip(events, user_ids):
+        message = event_message(event)
+        broker.publish(shop_channel(event.laundry_service_id), message)
+        broker.publish(user_channel(user_id), message)
+
+
+def record_events(kind, bookings):
+    """
+    Append one event of kind per booking, with the booking's current status and
+    version, and publish them once the surrounding transaction commits.
+    """
+    bookings = list(bookings)
+    events = BookingEvent.objects.bulk_create([
+        BookingEvent(
+            booking_id=booking.id,
+            laundry_service_id=booking.laundry_service_id,
+            kind=kind,
+            status=booking.status,
+            version=booking.version
+        )
+        for booking in bookings
+    ])
+    user_ids = [booking.user_id for booking in bookings]
+    transaction.on_commit(lambda: publish_events(events, user_ids))
+
+
+def changes_since(shop_ids, since=0, limit=DEFAULT_FEED_LIMIT):
+    """
+    Events of the given shops after cursor since, oldest first, and the current
+    state of the bookings they touched that still exist.
+    Returns (events, bookings, has_more).
+    """
+    events = list(
+        BookingEvent.objects.filter(laundry_service_id__in=shop_ids, id__gt=since).order_by('id')[:limit + 1]
+    )
+    has_more = len(events) > limit
+    events = events[:limit]
+    bookings = Booking.objects.filter(pk__in={event.booking_id for event in events if event.kind != BookingEvent.DELETED})
+    return events, bookings, has_more
@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:12
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def copy_service_offerings(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingItem = apps.get_model('bookings', 'BookingItem')
+    links = Booking.service_offerings.through.objects.select_related('serviceoffering')
+    BookingItem.objects.bulk_create([
+        BookingItem(
+            booking_id=link.booking_id,
+            service_offering_id=link.serviceoffering_id,
+            quantity=1,
+            unit_price=link.serviceoffering.price
+        )
+        for link in links
+    ], batch_size=500)
+
+
+def copy_booking_items(apps, schema_editor):
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingItem = apps.get_model('bookings', 'BookingItem')
+    Booking.service_offerings.through.objects.bulk_create([
+        Booking.service_offerings.through(booking_id=item.booking_id, serviceoffering_id=item.service_offering_id)
+        for item in BookingItem.objects.all()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0007_availability_window'),
+        ('bookings', '0002_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('unit_price', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='bookings.booking')),
+                ('service_offering', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_items', to='laundryshops.serviceoffering')),
+            ],
+            options={
+                'unique_together': {('booking', 'service_offering')},
+            },
+        ),
+        # Django cannot add a through model to an existing M2M field, so the links are
+        # copied into BookingItem and the field is recreated on top of it
+        migrations.RunPython(copy_service_offerings, copy_booking_items),
+        migrations.RemoveField(
+            model_name='booking',
+            name='service_offerings',
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='service_offerings',
+            field=models.ManyToManyField(through='bookings.BookingItem', to='laundryshops.serviceoffering'),
+        ),
+    ]
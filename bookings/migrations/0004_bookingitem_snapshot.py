@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_snapshots(apps, schema_editor):
+    BookingItem = apps.get_model('bookings', 'BookingItem')
+    items = list(BookingItem.objects.select_related('service_offering__service_type'))
+    for item in items:
+        item.service_name = item.service_offering.service_type.name
+        item.unit = item.service_offering.unit
+    BookingItem.objects.bulk_update(items, ['service_name', 'unit'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0007_availability_window'),
+        ('bookings', '0003_bookingitem'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='bookingitem',
+            options={'ordering': ['id']},
+        ),
+        migrations.AddField(
+            model_name='bookingitem',
+            name='service_name',
+            field=models.CharField(default='', max_length=100),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='bookingitem',
+            name='unit',
+            field=models.CharField(default='', max_length=50),
+            preserve_default=False,
+        ),
+        migrations.RunPython(populate_snapshots, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='bookingitem',
+            name='service_offering',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='booking_items', to='laundryshops.serviceoffering'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def record_existing_bookings(apps, schema_editor):
+    # Seed the log so a feed read from the start covers bookings made before it existed
+    Booking = apps.get_model('bookings', 'Booking')
+    BookingEvent = apps.get_model('bookings', 'BookingEvent')
+    BookingEvent.objects.bulk_create([
+        BookingEvent(
+            booking_id=booking.id,
+            laundry_service_id=booking.laundry_service_id,
+            kind='created',
+            status=booking.status,
+            version=booking.version
+        )
+        for booking in Booking.objects.order_by('id')
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0007_availability_window'),
+        ('bookings', '0005_booking_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('booking_id', models.BigIntegerField()),
+                ('kind', models.CharField(choices=[('created', 'Created'), ('updated', 'Updated'), ('status_changed', 'Status Changed'), ('deleted', 'Deleted')], max_length=20)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('confirmed', 'Confirmed'), ('in_progress', 'In Progress'), ('completed', 'Completed'), ('cancelled', 'Cancelled')], max_length=20)),
+                ('version', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('laundry_service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booking_events', to='laundryshops.laundryservice')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['laundry_service', 'id'], name='booking_event_shop_idx')],
+            },
+        ),
+        migrations.RunPython(record_existing_bookings, migrations.RunPython.noop),
+    ]
@@ -1,8 +1,26 @@
 
 from django.db import models
+from django.db.models import DecimalField, ExpressionWrapper, F, Sum
 from django.conf import settings
 from laundryshops.models import LaundryService, ServiceOffering
 
+class BookingQuerySet(models.QuerySet):
+    def with_item_totals(self):
+        """Annotate item_count and items_total, summed in SQL from the frozen line items"""
+        return self.annotate(
+            item_count=Sum('items__quantity'),
+            items_total=Sum(line_total('items__')),
+        )
+
+
+def line_total(prefix=''):
+    """quantity * unit_price of a BookingItem, optionally through a relation prefix"""
+    return ExpressionWrapper(
+        F(f'{prefix}quantity') * F(f'{prefix}unit_price'),
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    )
+
+
 class Booking(models.Model):
     STATUS_CHOICES = (
         ('pending', 'Pending'),
@@ -14,12 +32,73 @@ class Booking(models.Model):
 
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='bookings')
     laundry_service = models.ForeignKey(LaundryService, on_delete=models.CASCADE, related_name='bookings')
-    service_offerings = models.ManyToManyField(ServiceOffering)
+    service_offerings = models.ManyToManyField(ServiceOffering, through='BookingItem')
     total_price = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    version = models.PositiveIntegerField(default=1)  # Incremented on every status change and edit
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = BookingQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='booking_user_created_idx'),
+            models.Index(fields=['user', 'status'], name='booking_user_status_idx'),
+            models.Index(fields=['laundry_service', '-created_at', '-id'], name='booking_shop_created_idx'),
+            models.Index(fields=['laundry_service', 'status'], name='booking_shop_status_idx'),
+        ]
+
     def __str__(self):
         user_identifier = self.user.email or self.user.full_phone or str(self.user.id)
         return f"Booking {self.id} by {user_identifier}"
+
+
+class BookingItem(models.Model):
+    """Line item of a booking, priced when the booking is placed"""
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='items')
+    # Kept when the offering is deleted; the fields below are copied from it at booking time
+    service_offering = models.ForeignKey(
+        ServiceOffering, on_delete=models.SET_NULL, null=True, blank=True, related_name='booking_items'
+    )
+    service_name = models.CharField(max_length=100)
+    unit = models.CharField(max_length=50)
+    quantity = models.PositiveIntegerField(default=1)
+    unit_price = models.DecimalField(max_digits=8, decimal_places=2)
+
+    class Meta:
+        unique_together = ['booking', 'service_offering']
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Booking {self.booking_id} - {self.service_name} x {self.quantity}"
+
+
+class BookingEvent(models.Model):
+    """Append-only log of booking changes; the id is the cursor of the changes feed"""
+    CREATED = 'created'
+    UPDATED = 'updated'
+    STATUS_CHANGED = 'status_changed'
+    DELETED = 'deleted'
+    KIND_CHOICES = (
+        (CREATED, 'Created'),
+        (UPDATED, 'Updated'),
+        (STATUS_CHANGED, 'Status Changed'),
+        (DELETED, 'Deleted'),
+    )
+
+    # A plain id rather than a foreign key, so events outlive deleted bookings
+    booking_id = models.BigIntegerField()
+    laundry_service = models.ForeignKey(LaundryService, on_delete=models.CASCADE, related_name='booking_events')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    status = models.CharField(max_length=20, choices=Booking.STATUS_CHOICES)
+    version = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['laundry_service', 'id'], name='booking_event_shop_idx'),
+        ]
+
+    def __str__(self):
+        return f"Booking {self.booking_id} {self.kind} ({self.status})"
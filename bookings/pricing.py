@@ -0,0 +1,92 @@
+"""
+Booking pricing.
+
+Requested line items are checked against the chosen shop's offerings and priced
+from a single query, then written together with the booking in one transaction.
+Line items keep a copy of the offering's name, unit and price, so reading a
+booking never goes back to the live catalogue. Edits are written with the same
+conditional UPDATE on status and version as status transitions.
+"""
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework import serializers
+from laundryshops.models import ServiceOffering
+from .models import Booking, BookingItem, BookingEvent
+from .events import record_events
+from .transitions import BookingConflict
+
+
+def price_items(laundry_service, items):
+    """
+    Validate and price line items for a booking at laundry_service.
+    items are dicts with service_offering_id and quantity.
+    Returns (unsaved BookingItem list, total price).
+    """
+    quantities = {}
+    for item in items:
+        offering_id = item['service_offering_id']
+        if offering_id in quantities:
+            raise serializers.ValidationError('Each service offering can only be booked once.')
+        # PATCH skips serializer defaults, so a missing quantity is filled in here
+        quantities[offering_id] = item.get('quantity', 1)
+    if not quantities:
+        raise serializers.ValidationError('At least one item is required.')
+
+    # Scoped to the shop, so offerings of other shops are reported as unavailable
+    offerings = {
+        row['id']: row
+        for row in ServiceOffering.objects.filter(laundry_service=laundry_service, id__in=quantities)
+        .values('id', 'price', 'unit', 'service_type__name')
+    }
+    unavailable = [offering_id for offering_id in quantities if offering_id not in offerings]
+    if unavailable:
+        raise serializers.ValidationError(
+            f'Service offerings not offered by this laundry service: {", ".join(map(str, unavailable))}'
+        )
+
+    # Name, unit and price are frozen on the line so later catalogue edits don't rewrite history
+    lines = [
+        BookingItem(
+            service_offering_id=offering_id,
+            service_name=offerings[offering_id]['service_type__name'],
+            unit=offerings[offering_id]['unit'],
+            quantity=quantity,
+            unit_price=offerings[offering_id]['price']
+        )
+        for offering_id, quantity in quantities.items()
+    ]
+    total = sum((line.unit_price * line.quantity for line in lines), Decimal('0.00'))
+    return lines, total
+
+
+def save_booking(items, booking=None, **fields):
+    """
+    Create a booking, or update the given one, and replace its line items when items is not None.
+    Updates only apply to a booking still pending at the version it was read at,
+    and raise BookingConflict otherwise.
+    """
+    created = booking is None
+    with transaction.atomic():
+        if created:
+            booking = Booking.objects.create(**fields)
+        else:
+            updated_at = timezone.now()
+            # A shop confirming the booking meanwhile makes this match no row
+            if not Booking.objects.filter(pk=booking.pk, status='pending', version=booking.version).update(
+                version=F('version') + 1, updated_at=updated_at, **fields
+            ):
+                raise BookingConflict()
+            for field, value in fields.items():
+                setattr(booking, field, value)
+            booking.version += 1
+            booking.updated_at = updated_at
+            if items is not None:
+                BookingItem.objects.filter(booking=booking).delete()
+        if items is not None:
+            for item in items:
+                item.booking = booking
+            BookingItem.objects.bulk_create(items)
+        record_events(BookingEvent.CREATED if created else BookingEvent.UPDATED, [booking])
+    return booking
@@ -1,12 +1,60 @@
-
+from django.db.models import prefetch_related_objects
 from rest_framework import serializers
-from .models import Booking
-from laundryshops.serializers import ServiceOfferingSerializer
+from .models import Booking, BookingItem, BookingEvent
+from .pricing import price_items, save_booking
+
+# Relations BookingSerializer renders for each booking
+BOOKING_PREFETCH = ('items',)
+
+class BookingItemSerializer(serializers.ModelSerializer):
+    # Plain id: offerings are resolved and checked against the shop in one query when pricing
+    service_offering = serializers.IntegerField(source='service_offering_id')
+    quantity = serializers.IntegerField(min_value=1, default=1)
+
+    class Meta:
+        model = BookingItem
+        fields = ('service_offering', 'service_name', 'unit', 'quantity', 'unit_price')
+        read_only_fields = ('service_name', 'unit', 'unit_price')
 
 class BookingSerializer(serializers.ModelSerializer):
-    service_offerings = ServiceOfferingSerializer(many=True, read_only=True)
+    # Rendered from the frozen line items, not the live offerings
+    items = BookingItemSerializer(many=True)
 
     class Meta:
         model = Booking
-        fields = '__all__'
-        read_only_fields = ('user', 'total_price',)
+        fields = (
+            'id', 'user', 'laundry_service', 'items', 'total_price', 'status', 'version', 'created_at', 'updated_at'
+        )
+        # Status changes go through bookings.transitions
+        read_only_fields = ('user', 'total_price', 'status', 'version')
+
+    def validate(self, attrs):
+        if self.instance is not None and self.instance.status != 'pending':
+            raise serializers.ValidationError('Only pending bookings can be changed.')
+        laundry_service = attrs.get('laundry_service', getattr(self.instance, 'laundry_service', None))
+        if 'items' in attrs:
+            try:
+                attrs['items'], attrs['total_price'] = price_items(laundry_service, attrs['items'])
+            except serializers.ValidationError as exc:
+                raise serializers.ValidationError({'items': exc.detail})
+        elif self.instance is not None and laundry_service != self.instance.laundry_service:
+            raise serializers.ValidationError({'items': 'Items are required when changing the laundry service.'})
+        return attrs
+
+    def create(self, validated_data):
+        items = validated_data.pop('items')
+        booking = save_booking(items, **validated_data)
+        prefetch_related_objects([booking], *BOOKING_PREFETCH)
+        return booking
+
+    def update(self, instance, validated_data):
+        items = validated_data.pop('items', None)
+        return save_booking(items, booking=instance, **validated_data)
+
+class BookingEventSerializer(serializers.ModelSerializer):
+    cursor = serializers.IntegerField(source='id')
+    booking = serializers.IntegerField(source='booking_id')
+
+    class Meta:
+        model = BookingEvent
+        fields = ('cursor', 'booking', 'laundry_service', 'kind', 'status', 'version', 'created_at')
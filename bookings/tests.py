@@ -0,0 +1,441 @@
+import json
+from datetime import time
+from decimal import Decimal
+from unittest import mock, skipUnless
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from accounts.models import User
+from laundry_service.testing import QueryPlanAssertions
+from laundryshops.models import LaundryService, ServiceType, ServiceOffering
+from . import tickets, transitions
+from .broker import BaseBroker, InMemoryBroker, set_broker, shop_channel, user_channel
+from .models import Booking, BookingEvent
+from .pricing import price_items
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite')
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    def test_user_bookings_use_index(self):
+        queryset = Booking.objects.filter(user_id=1).order_by('-created_at', '-id')
+        self.assertUsesIndex(queryset, 'booking_user_created_idx')
+        self.assertNoTempSort(queryset)
+
+    def test_user_bookings_by_status_use_index(self):
+        queryset = Booking.objects.filter(user_id=1, status='pending')
+        self.assertUsesIndex(queryset, 'booking_user_status_idx')
+
+    def test_shop_bookings_use_index(self):
+        queryset = Booking.objects.filter(laundry_service_id=1).order_by('-created_at', '-id')
+        self.assertUsesIndex(queryset, 'booking_shop_created_idx')
+        self.assertNoTempSort(queryset)
+
+    def test_shop_bookings_by_status_use_index(self):
+        queryset = Booking.objects.filter(laundry_service_id=1, status='pending')
+        self.assertUsesIndex(queryset, 'booking_shop_status_idx')
+
+    def test_changes_feed_uses_index(self):
+        queryset = BookingEvent.objects.filter(laundry_service_id__in=[1, 2], id__gt=10).order_by('id')
+        self.assertUsesIndex(queryset, 'booking_event_shop_idx')
+
+
+class BookingPricingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = User.objects.create_user(email='customer@example.com', password='secret', user_type='customer')
+        cls.shop, cls.other_shop = [
+            LaundryService.objects.create(
+                shop_name=name, district='Pune', state='Maharashtra', zipcode='411001',
+                pickup_start_time=time(9), pickup_end_time=time(18),
+                delivery_start_time=time(9), delivery_end_time=time(18)
+            )
+            for name in ('Fresh Folds', 'Spin Cycle')
+        ]
+        wash, iron = ServiceType.objects.create(name='Wash'), ServiceType.objects.create(name='Iron')
+        cls.wash = ServiceOffering.objects.create(laundry_service=cls.shop, service_type=wash, price=Decimal('40.00'))
+        cls.iron = ServiceOffering.objects.create(laundry_service=cls.shop, service_type=iron, price=Decimal('15.50'))
+        cls.other_wash = ServiceOffering.objects.create(
+            laundry_service=cls.other_shop, service_type=wash, price=Decimal('35.00')
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer)
+
+    def book(self, items):
+        return self.client.post('/api/bookings/', {'laundry_service': self.shop.id, 'items': items}, format='json')
+
+    def test_items_are_priced_with_quantities(self):
+        # Shop lookup, one pricing query, the booking, its items and its event in one
+        # transaction, then the items prefetch for the response
+        with self.assertNumQueries(8):
+            response = self.book([
+                {'service_offering': self.wash.id, 'quantity': 2},
+                {'service_offering': self.iron.id},
+            ])
+        self.assertEqual(response.status_code, 201)
+        booking = Booking.objects.get()
+        self.assertEqual(booking.total_price, Decimal('95.50'))
+        self.assertEqual(
+            list(booking.items.values_list('service_name', 'quantity', 'unit_price')),
+            [('Wash', 2, Decimal('40.00')), ('Iron', 1, Decimal('15.50'))]
+        )
+
+    def test_items_keep_booked_price_and_name(self):
+        booking_id = self.book([{'service_offering': self.wash.id, 'quantity': 3}]).data['id']
+        self.wash.price = Decimal('55.00')
+        self.wash.save()
+        self.wash.delete()
+
+        with self.assertNumQueries(2):
+            item = self.client.get(f'/api/bookings/{booking_id}/').data['items'][0]
+        self.assertEqual(item['service_offering'], None)
+        self.assertEqual((item['service_name'], item['unit_price']), ('Wash', '40.00'))
+        booking = Booking.objects.with_item_totals().get()
+        self.assertEqual((booking.item_count, booking.items_total), (3, Decimal('120.00')))
+
+    def test_offerings_of_other_shops_are_rejected(self):
+        response = self.book([{'service_offering': self.other_wash.id}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('items', response.data)
+        self.assertFalse(Booking.objects.exists())
+
+
+    def test_item_edits_bump_the_version(self):
+        booking_id = self.book([{'service_offering': self.wash.id}]).data['id']
+        response = self.client.patch(
+            f'/api/bookings/{booking_id}/', {'items': [{'service_offering': self.iron.id, 'quantity': 2}]}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['version'], response.data['total_price']), (2, '31.00'))
+        stale = self.client.patch(
+            f'/api/bookings/{booking_id}/', {'items': [{'service_offering': self.wash.id}], 'version': 1}, format='json'
+        )
+        self.assertEqual(stale.status_code, 409)
+
+    def test_item_edit_racing_a_confirmation_is_rejected(self):
+        booking_id = self.book([{'service_offering': self.wash.id}]).data['id']
+
+        def confirmed_meanwhile(*args):
+            # The shop confirms between the edit's status check and its write
+            transitions.transition_booking(Booking.objects.get(pk=booking_id), 'confirmed')
+            return price_items(*args)
+        with mock.patch('bookings.serializers.price_items', side_effect=confirmed_meanwhile):
+            response = self.client.patch(
+                f'/api/bookings/{booking_id}/', {'items': [{'service_offering': self.iron.id}]}, format='json'
+            )
+        self.assertEqual(response.status_code, 409)
+        booking = Booking.objects.get(pk=booking_id)
+        self.assertEqual((booking.status, booking.version, booking.total_price), ('confirmed', 2, Decimal('40.00')))
+        self.assertEqual(list(booking.items.values_list('service_name', flat=True)), ['Wash'])
+
+
+class VendorDashboardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user(email='vendor@example.com', password='secret', user_type='vendor')
+        customer = User.objects.create_user(email='customer@example.com', password='secret', user_type='customer')
+        cls.shops = [
+            LaundryService.objects.create(
+                vendor=cls.vendor, shop_name=name, district='Pune', state='Maharashtra', zipcode='411001',
+                pickup_start_time=time(9), pickup_end_time=time(18),
+                delivery_start_time=time(9), delivery_end_time=time(18)
+            )
+            for name in ('Fresh Folds', 'Spin Cycle')
+        ]
+        for shop, status, price in [
+            (cls.shops[0], 'pending', '100.00'),
+            (cls.shops[0], 'completed', '250.00'),
+            (cls.shops[0], 'cancelled', '80.00'),
+            (cls.shops[1], 'pending', '40.00'),
+        ]:
+            Booking.objects.create(user=customer, laundry_service=shop, status=status, total_price=Decimal(price))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.vendor)
+
+    def test_dashboard_aggregates_all_shops_in_constant_queries(self):
+        with self.assertNumQueries(4):
+            response = self.client.get('/api/shop/bookings/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['pending_queue'], 2)
+        first, second = response.data['shops']
+        self.assertEqual((first['total_bookings'], first['revenue']), (3, '350.00'))
+        self.assertEqual(first['bookings']['cancelled'], 1)
+        self.assertEqual((second['pending_queue'], second['revenue']), (1, '40.00'))
+        self.assertEqual([row['revenue'] for row in response.data['revenue']], ['390.00'])
+
+    def test_shop_bookings_list_vendor_bookings(self):
+        response = self.client.get('/api/shop/bookings/', {'laundry_service': self.shops[1].id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_invalid_date_range_is_rejected(self):
+        response = self.client.get('/api/shop/bookings/dashboard/', {'start': '18-10-2026'})
+        self.assertEqual(response.status_code, 400)
+
+
+class BookingTransitionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user(email='vendor@example.com', password='secret', user_type='vendor')
+        cls.customer = User.objects.create_user(email='customer@example.com', password='secret', user_type='customer')
+        cls.shop = LaundryService.objects.create(
+            vendor=cls.vendor, shop_name='Fresh Folds', district='Pune', state='Maharashtra', zipcode='411001',
+            pickup_start_time=time(9), pickup_end_time=time(18),
+            delivery_start_time=time(9), delivery_end_time=time(18)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.vendor)
+        self.bookings = [
+            Booking.objects.create(user=self.customer, laundry_service=self.shop, total_price=Decimal('10.00'))
+            for _ in range(3)
+        ]
+
+    def transition(self, booking, new_status, **data):
+        return self.client.patch(f'/api/shop/bookings/{booking.id}/', {'status': new_status, **data}, format='json')
+
+    def test_status_follows_transition_table(self):
+        booking = self.bookings[0]
+        self.assertEqual(self.transition(booking, 'completed').status_code, 400)
+        response = self.transition(booking, 'confirmed')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['status'], response.data['version']), ('confirmed', 2))
+
+    def test_stale_version_conflicts(self):
+        booking = self.bookings[0]
+        self.transition(booking, 'confirmed', version=1)
+        response = self.transition(booking, 'cancelled', version=1)
+        self.assertEqual(response.status_code, 409)
+        booking.refresh_from_db()
+        self.assertEqual((booking.status, booking.version), ('confirmed', 2))
+
+    def test_customer_can_only_cancel_pending(self):
+        self.client.force_authenticate(self.customer)
+        booking = self.bookings[0]
+        self.assertEqual(self.client.patch(f'/api/bookings/{booking.id}/', {'status': 'confirmed'}).status_code, 400)
+        self.assertEqual(self.client.patch(f'/api/bookings/{booking.id}/', {'status': 'cancelled'}).status_code, 200)
+
+    def test_bulk_transition_uses_one_update(self):
+        first, second, third = self.bookings
+        Booking.objects.filter(pk=third.pk).update(status='completed')
+        # Vendor bookings read, then a single conditional UPDATE and the events in one transaction
+        with self.assertNumQueries(5):
+            response = self.client.post('/api/shop/bookings/transition/', {
+                'status': 'confirmed',
+                'bookings': [{'id': first.id, 'version': 1}, second.id, third.id],
+            }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['updated']), [first.id, second.id])
+        self.assertEqual([error['id'] for error in response.data['errors']], [third.id])
+        self.assertEqual(Booking.objects.filter(status='confirmed', version=2).count(), 2)
+
+    def test_bulk_transition_racing_an_identical_one(self):
+        first, second, third = self.bookings
+        update = transitions._transition_update
+
+        def racing_update(conditions, target):
+            # Another request confirms the second booking between the read and the UPDATE. It
+            # is committed there, so it is applied again should this call roll back its own work.
+            Booking.objects.filter(pk=second.pk, version=1).update(status='confirmed', version=2)
+            return update(conditions, target)
+
+        with mock.patch('bookings.transitions._transition_update', racing_update):
+            response = self.client.post('/api/shop/bookings/transition/', {
+                'status': 'confirmed', 'bookings': [first.id, second.id, third.id],
+            }, format='json')
+        self.assertEqual(sorted(response.data['updated']), [first.id, third.id])
+        self.assertEqual([error['id'] for error in response.data['errors']], [second.id])
+        self.assertEqual(
+            sorted(BookingEvent.objects.filter(kind=BookingEvent.STATUS_CHANGED).values_list('booking_id', flat=True)),
+            [first.id, third.id]
+        )
+        self.assertEqual(Booking.objects.get(pk=second.pk).version, 2)
+
+
+class BookingChangesFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user(email='vendor@example.com', password='secret', user_type='vendor')
+        cls.customer = User.objects.create_user(email='customer@example.com', password='secret', user_type='customer')
+        cls.shop = LaundryService.objects.create(
+            vendor=cls.vendor, shop_name='Fresh Folds', district='Pune', state='Maharashtra', zipcode='411001',
+            pickup_start_time=time(9), pickup_end_time=time(18),
+            delivery_start_time=time(9), delivery_end_time=time(18)
+        )
+        cls.wash = ServiceOffering.objects.create(
+            laundry_service=cls.shop, service_type=ServiceType.objects.create(name='Wash'), price=Decimal('40.00')
+        )
+
+    def setUp(self):
+        self.customer_client = APIClient()
+        self.customer_client.force_authenticate(self.customer)
+        self.client = APIClient()
+        self.client.force_authenticate(self.vendor)
+
+    def book(self):
+        return self.customer_client.post('/api/bookings/', {
+            'laundry_service': self.shop.id, 'items': [{'service_offering': self.wash.id}]
+        }, format='json').data['id']
+
+    def test_feed_returns_only_changes_since_cursor(self):
+        first = self.book()
+        cursor = self.client.get('/api/shop/bookings/changes/').data['cursor']
+
+        second = self.book()
+        self.client.patch(f'/api/shop/bookings/{first}/', {'status': 'confirmed'}, format='json')
+        self.customer_client.delete(f'/api/bookings/{second}/')
+
+        response = self.client.get('/api/shop/bookings/changes/', {'since': cursor})
+        self.assertEqual(
+            [(event['booking'], event['kind']) for event in response.data['events']],
+            [(second, 'created'), (first, 'status_changed'), (second, 'deleted')]
+        )
+        self.assertEqual([booking['id'] for booking in response.data['bookings']], [first])
+        self.assertFalse(response.data['has_more'])
+
+        response = self.client.get('/api/shop/bookings/changes/', {'since': response.data['cursor']})
+        self.assertEqual((response.data['events'], response.data['bookings']), ([], []))
+
+
+class RecordingBroker(BaseBroker):
+    """Local stand-in that keeps published messages instead of delivering them"""
+    def __init__(self):
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+
+class BookingBrokerTests(TestCase):
+    def test_in_memory_broker_delivers_to_subscribed_channels(self):
+        broker = InMemoryBroker()
+
+        async def exchange():
+            async with broker.subscribe(['shop:1']) as subscription:
+                broker.publish('shop:2', {'cursor': 1})
+                broker.publish('shop:1', {'cursor': 2})
+                return await subscription.get(timeout=1), await subscription.get(timeout=0.01)
+
+        self.assertEqual(async_to_sync(exchange)(), ({'cursor': 2}, None))
+        self.assertEqual(broker._subscribers, {})
+
+    def test_events_are_published_after_commit(self):
+        vendor = User.objects.create_user(email='vendor@example.com', password='secret', user_type='vendor')
+        customer = User.objects.create_user(email='customer@example.com', password='secret', user_type='customer')
+        shop = LaundryService.objects.create(
+            vendor=vendor, shop_name='Fresh Folds', district='Pune', state='Maharashtra', zipcode='411001',
+            pickup_start_time=time(9), pickup_end_time=time(18),
+            delivery_start_time=time(9), delivery_end_time=time(18)
+        )
+        booking = Booking.objects.create(user=customer, laundry_service=shop, total_price=Decimal('10.00'))
+        broker = RecordingBroker()
+        previous = set_broker(broker)
+        self.addCleanup(set_broker, previous)
+
+        client = APIClient()
+        client.force_authenticate(vendor)
+        with self.captureOnCommitCallbacks(execute=True):
+            client.patch(f'/api/shop/bookings/{booking.id}/', {'status': 'confirmed'}, format='json')
+            self.assertEqual(broker.published, [])
+
+        self.assertEqual([channel for channel, _ in broker.published], [shop_channel(shop.id), user_channel(customer.id)])
+        message = broker.published[0][1]
+        self.assertEqual((message['booking'], message['kind'], message['status']), (booking.id, 'status_changed', 'confirmed'))
+
+
+@override_settings(BOOKING_STREAM_HEARTBEAT=0.01, BOOKING_STREAM_MAX_DURATION=0.05)
+class BookingStreamTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.vendor = User.objects.create_user(email='vendor@example.com', password='secret', user_type='vendor')
+        cls.customer = User.objects.create_user(email='customer@example.com', password='secret', user_type='customer')
+        cls.token = Token.objects.create(user=cls.customer)
+        cls.shop = LaundryService.objects.create(
+            vendor=cls.vendor, shop_name='Fresh Folds', district='Pune', state='Maharashtra', zipcode='411001',
+            pickup_start_time=time(9), pickup_end_time=time(18),
+            delivery_start_time=time(9), delivery_end_time=time(18)
+        )
+        cls.booking = Booking.objects.create(user=cls.customer, laundry_service=cls.shop, total_price=Decimal('10.00'))
+        cls.events = [
+            BookingEvent.objects.create(
+                booking_id=cls.booking.id, laundry_service=cls.shop, kind=kind, status='pending', version=1
+            )
+            for kind in (BookingEvent.CREATED, BookingEvent.UPDATED, BookingEvent.UPDATED)
+        ]
+
+    def setUp(self):
+        self.broker = InMemoryBroker()
+        previous = set_broker(self.broker)
+        self.addCleanup(set_broker, previous)
+
+    def connect(self, headers=None, **params):
+        return AsyncClient().get('/api/bookings/stream/', params, headers={
+            'Authorization': f'Token {self.token.key}', **(headers or {})
+        })
+
+    async def read(self, response):
+        return [chunk.decode() async for chunk in response.streaming_content]
+
+    def cursors(self, frames):
+        return [json.loads(frame.split('data: ')[1])['cursor'] for frame in frames if frame.startswith('id: ')]
+
+    def test_streams_are_refused_under_wsgi(self):
+        response = self.client.get('/api/bookings/stream/')
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+
+    def test_stream_tickets_are_single_use(self):
+        client = APIClient()
+        client.force_authenticate(self.customer)
+        response = client.post('/api/bookings/stream/ticket/')
+        self.assertEqual(response.status_code, 200)
+        ticket = response.data['ticket']
+        self.assertEqual(tickets.redeem_ticket(ticket), self.customer.pk)
+        self.assertIsNone(tickets.redeem_ticket(ticket))
+        self.assertEqual(APIClient().post('/api/bookings/stream/ticket/').status_code, 401)
+
+    async def test_token_or_ticket_is_required(self):
+        self.assertEqual((await self.connect({'Authorization': 'Token wrong'})).status_code, 401)
+        # The account token is not accepted in the URL
+        self.assertEqual((await AsyncClient().get('/api/bookings/stream/', {'token': self.token.key})).status_code, 401)
+
+        response = await self.connect()
+        self.assertEqual((response.status_code, response['Content-Type']), (200, 'text/event-stream'))
+        await self.read(response)
+
+        ticket = await sync_to_async(tickets.issue_ticket)(self.customer)
+        response = await AsyncClient().get('/api/bookings/stream/', {'ticket': ticket})
+        self.assertEqual(response.status_code, 200)
+        await self.read(response)
+        self.assertEqual((await AsyncClient().get('/api/bookings/stream/', {'ticket': ticket})).status_code, 401)
+
+    async def test_missed_events_are_replayed_after_last_event_id(self):
+        first, second, third = [event.id for event in self.events]
+        frames = await self.read(await self.connect({'Last-Event-ID': str(first)}))
+        self.assertEqual(frames[0], 'retry: 3000\n\n')
+        self.assertEqual(self.cursors(frames), [second, third])
+        # Without a cursor nothing is replayed
+        self.assertEqual(self.cursors(await self.read(await self.connect())), [])
+
+    async def test_idle_streams_send_keepalives_until_they_close(self):
+        frames = await self.read(await self.connect())
+        self.assertIn(': keepalive\n\n', frames)
+        self.assertEqual(self.cursors(frames), [])
+
+    @override_settings(BOOKING_STREAM_MAX_DURATION=30)
+    async def test_published_events_are_sent_and_overflow_closes_the_stream(self):
+        self.broker.max_queued = 1
+        response = await self.connect()
+        frames = response.streaming_content
+        self.assertEqual((await anext(frames)).decode(), 'retry: 3000\n\n')
+        channel = user_channel(self.customer.pk)
+        for cursor in (101, 102, 103):
+            self.broker.publish(channel, {'cursor': cursor})
+        # The client fell behind: it gets what was queued, then the stream ends long before its deadline
+        self.assertEqual(self.cursors([chunk.decode() async for chunk in frames]), [101])
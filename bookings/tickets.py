@@ -0,0 +1,44 @@
+"""
+Single-use tickets for booking event streams.
+
+Browsers' EventSource cannot send an Authorization header, and the account
+token must not travel in a URL where proxies and access logs keep it. Clients
+instead exchange their token for a random ticket, valid once and for
+BOOKING_STREAM_TICKET_TIMEOUT seconds, and open the stream with ?ticket=.
+Tickets are held in the BOOKING_STREAM_TICKET_CACHE_ALIAS cache, which must be
+shared between processes when the ticket and stream requests can reach
+different workers.
+"""
+import hashlib
+import secrets
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+def get_cache():
+    return caches[settings.BOOKING_STREAM_TICKET_CACHE_ALIAS]
+
+
+def _ticket_key(ticket):
+    # Hashed, so the cache never holds a usable ticket
+    return f'bookings:stream-ticket:{hashlib.sha256(ticket.encode()).hexdigest()}'
+
+
+def issue_ticket(user):
+    ticket = secrets.token_urlsafe(32)
+    get_cache().set(_ticket_key(ticket), user.pk, settings.BOOKING_STREAM_TICKET_TIMEOUT)
+    return ticket
+
+
+def redeem_ticket(ticket):
+    """Id of the user a ticket was issued to, or None when it is unknown, expired or already used"""
+    if not ticket:
+        return None
+    cache = get_cache()
+    key = _ticket_key(ticket)
+    user_id = cache.get(key)
+    # Only the request whose delete removed the entry may use it
+    if user_id is None or not cache.delete(key):
+        return None
+    return user_id
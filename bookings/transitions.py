@@ -0,0 +1,139 @@
+"""
+Booking status transitions.
+
+Status changes go through an explicit transition table and are written with a
+conditional UPDATE on the status and version the caller last read, so two
+concurrent updates cannot silently overwrite each other: the loser matches no
+row and gets a 409 instead.
+"""
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.exceptions import APIException
+from .models import Booking, BookingEvent
+from .events import record_events
+
+# Statuses a shop may move a booking to from each status
+TRANSITIONS = {
+    'pending': {'confirmed', 'cancelled'},
+    'confirmed': {'in_progress', 'cancelled'},
+    'in_progress': {'completed'},
+    'completed': set(),
+    'cancelled': set(),
+}
+
+# Customers may only cancel a booking the shop has not confirmed yet
+CUSTOMER_TRANSITIONS = {
+    'pending': {'cancelled'},
+}
+
+BULK_TRANSITION_LIMIT = 100
+
+
+class BookingConflict(APIException):
+    status_code = status.HTTP_409_CONFLICT
+    default_detail = 'Booking was modified by another request, reload it and try again.'
+    default_code = 'conflict'
+
+
+class _ConcurrentChange(Exception):
+    """Rolls back a batched transition that did not match every row it was meant to"""
+
+
+def check_transition(current, target, allowed=TRANSITIONS):
+    if target not in dict(Booking.STATUS_CHOICES):
+        raise serializers.ValidationError({'status': f'Unknown status: {target}'})
+    if target not in allowed.get(current, ()):
+        raise serializers.ValidationError({'status': f'Cannot change status from {current} to {target}'})
+
+
+def _transition_update(conditions, target):
+    return Booking.objects.filter(conditions).update(
+        status=target, version=F('version') + 1, updated_at=timezone.now()
+    )
+
+
+def _record_transitions(rows, target):
+    # Unsaved instances carrying the post-update state, to describe the events
+    record_events(BookingEvent.STATUS_CHANGED, [
+        Booking(
+            id=row['id'], user_id=row['user'], laundry_service_id=row['laundry_service'],
+            status=target, version=row['version'] + 1
+        )
+        for row in rows
+    ])
+
+
+def transition_booking(booking, target, expected_version=None, allowed=TRANSITIONS):
+    """
+    Move booking to target status. expected_version is the version the client
+    last saw; without it the version of the loaded booking is used.
+    Raises ValidationError for a disallowed transition and BookingConflict when
+    the booking changed since it was read.
+    """
+    if expected_version is not None and expected_version != booking.version:
+        raise BookingConflict()
+    check_transition(booking.status, target, allowed)
+
+    with transaction.atomic():
+        if not _transition_update(Q(pk=booking.pk, status=booking.status, version=booking.version), target):
+            raise BookingConflict()
+        # Mirror the UPDATE on the instance instead of reloading it
+        booking.status = target
+        booking.version += 1
+        record_events(BookingEvent.STATUS_CHANGED, [booking])
+    return booking
+
+
+def transition_bookings(queryset, requested, target, allowed=TRANSITIONS):
+    """
+    Move several bookings to target with a single conditional UPDATE.
+    requested is a list of (booking_id, expected_version or None).
+    Returns (updated booking ids, [{'id', 'error'}]) for the bookings that were not changed.
+    """
+    current = {
+        row['id']: row for row in queryset.filter(pk__in=[booking_id for booking_id, _ in requested])
+        .order_by().values('id', 'user', 'laundry_service', 'status', 'version')
+    }
+
+    errors = []
+    candidates = {}
+    for booking_id, expected_version in requested:
+        row = current.get(booking_id)
+        if booking_id in candidates:
+            errors.append({'id': booking_id, 'error': 'Listed more than once.'})
+        elif row is None:
+            errors.append({'id': booking_id, 'error': 'Not found.'})
+        elif expected_version is not None and expected_version != row['version']:
+            errors.append({'id': booking_id, 'error': BookingConflict.default_detail})
+        elif target not in allowed.get(row['status'], ()):
+            errors.append({'id': booking_id, 'error': f'Cannot change status from {row["status"]} to {target}'})
+        else:
+            candidates[booking_id] = row
+    if not candidates:
+        return [], errors
+
+    conditions = Q()
+    for row in candidates.values():
+        conditions |= Q(pk=row['id'], status=row['status'], version=row['version'])
+    try:
+        with transaction.atomic():
+            if _transition_update(conditions, target) != len(candidates):
+                raise _ConcurrentChange()
+            _record_transitions(candidates.values(), target)
+            return list(candidates), errors
+    except _ConcurrentChange:
+        pass
+
+    # Some rows changed concurrently and the batched UPDATE was rolled back. One
+    # conditional UPDATE per row tells from its row count which ones this call wrote.
+    updated = []
+    with transaction.atomic():
+        for booking_id, row in candidates.items():
+            if _transition_update(Q(pk=booking_id, status=row['status'], version=row['version']), target):
+                updated.append(booking_id)
+            else:
+                errors.append({'id': booking_id, 'error': BookingConflict.default_detail})
+        _record_transitions([candidates[booking_id] for booking_id in updated], target)
+    return updated, errors
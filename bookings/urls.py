@@ -5,11 +5,21 @@ from .views import (
     BookingDetailView,
     ShopBookingListView,
     ShopBookingDetailView,
+    ShopBookingDashboardView,
+    ShopBookingTransitionView,
+    ShopBookingChangesView,
+    BookingStreamTicketView,
+    booking_event_stream,
 )
 
 urlpatterns = [
     path('bookings/', BookingListCreateView.as_view(), name='booking_list_create'),
+    path('bookings/stream/', booking_event_stream, name='booking_event_stream'),
+    path('bookings/stream/ticket/', BookingStreamTicketView.as_view(), name='booking_stream_ticket'),
     path('bookings/<int:pk>/', BookingDetailView.as_view(), name='booking_detail'),
     path('shop/bookings/', ShopBookingListView.as_view(), name='shop_booking_list'),
+    path('shop/bookings/dashboard/', ShopBookingDashboardView.as_view(), name='shop_booking_dashboard'),
+    path('shop/bookings/transition/', ShopBookingTransitionView.as_view(), name='shop_booking_transition'),
+    path('shop/bookings/changes/', ShopBookingChangesView.as_view(), name='shop_booking_changes'),
     path('shop/bookings/<int:pk>/', ShopBookingDetailView.as_view(), name='shop_booking_detail'),
 ]
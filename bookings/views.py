@@ -1,58 +1,293 @@
 
-from rest_framework import generics, permissions, status
+import asyncio
+import json
+from rest_framework import generics, permissions, serializers, status
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.response import Response
-from .models import Booking, ServiceOffering
-from .serializers import BookingSerializer
+from rest_framework.views import APIView
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Q
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from .models import Booking, BookingEvent
+from laundryshops.models import LaundryService
+from accounts.authentication import CachedTokenAuthentication
+from accounts.models import User
+from .serializers import BookingSerializer, BookingEventSerializer, BOOKING_PREFETCH
+from laundry_service.pagination import CreatedAtCursorPagination
+from . import dashboard
+from .events import record_events, changes_since, event_message, DEFAULT_FEED_LIMIT, MAX_FEED_LIMIT
+from .broker import get_broker, shop_channel, user_channel
+from .tickets import issue_ticket, redeem_ticket
+from .transitions import (
+    BookingConflict, transition_booking, transition_bookings, CUSTOMER_TRANSITIONS, BULK_TRANSITION_LIMIT
+)
+
+class IsShopOwner(permissions.BasePermission):
+    """Only vendors manage bookings made at their shops"""
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated and request.user.user_type == 'vendor'
+
+def with_items(queryset):
+    return queryset.prefetch_related(*BOOKING_PREFETCH)
+
+def parse_version(value):
+    """Optional expected version from a request body; None when not given"""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({'version': 'A valid integer is required.'})
 
 class BookingListCreateView(generics.ListCreateAPIView):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user)
+        return with_items(Booking.objects.filter(user=self.request.user))
 
     def perform_create(self, serializer):
-        service_offering_ids = self.request.data.get('service_offerings', [])
-        service_offerings = ServiceOffering.objects.filter(id__in=service_offering_ids)
-        
-        total_price = sum(offering.price_per_unit for offering in service_offerings)
-        
-        serializer.save(
-            user=self.request.user,
-            total_price=total_price,
-            service_offerings=service_offerings
-        )
+        # Items are validated and priced against the shop by the serializer
+        serializer.save(user=self.request.user)
 
 class BookingDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = BookingSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Booking.objects.filter(user=self.request.user)
+        return with_items(Booking.objects.filter(user=self.request.user))
+
+    def update(self, request, *args, **kwargs):
+        new_status = request.data.get('status')
+        if new_status:
+            # Customers can only cancel, through the same conditional update shops use
+            instance = self.get_object()
+            transition_booking(instance, new_status, parse_version(request.data.get('version')), CUSTOMER_TRANSITIONS)
+            return Response(self.get_serializer(instance).data)
+        return super().update(request, *args, **kwargs)
+
+    def perform_update(self, serializer):
+        expected_version = parse_version(self.request.data.get('version'))
+        if expected_version is not None and expected_version != serializer.instance.version:
+            raise BookingConflict()
+        serializer.save()
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            record_events(BookingEvent.DELETED, [instance])
+            instance.delete()
 
 class ShopBookingListView(generics.ListAPIView):
     serializer_class = BookingSerializer
-    permission_classes = [permissions.IsAuthenticated] # Should be custom permission for shop owner
+    permission_classes = [IsShopOwner]
+    pagination_class = CreatedAtCursorPagination
 
     def get_queryset(self):
-        # This assumes the user is a shop owner and has a related laundry service
-        # You'll need to implement the logic to get the laundry service for the current user
-        laundry_service = self.request.user.laundryservice 
-        return Booking.objects.filter(laundry_service=laundry_service)
+        # Bookings across all of the vendor's shops, optionally narrowed to one of them
+        queryset = Booking.objects.filter(laundry_service__vendor=self.request.user)
+        laundry_service = self.request.query_params.get('laundry_service')
+        if laundry_service:
+            if not laundry_service.isdigit():
+                return Booking.objects.none()
+            queryset = queryset.filter(laundry_service_id=laundry_service)
+        return with_items(queryset)
 
 class ShopBookingDetailView(generics.UpdateAPIView):
     serializer_class = BookingSerializer
-    permission_classes = [permissions.IsAuthenticated] # Should be custom permission for shop owner
+    permission_classes = [IsShopOwner]
 
     def get_queryset(self):
-        laundry_service = self.request.user.laundryservice
-        return Booking.objects.filter(laundry_service=laundry_service)
+        return with_items(Booking.objects.filter(laundry_service__vendor=self.request.user))
 
-    def partial_update(self, request, *args, **kwargs):
+    def update(self, request, *args, **kwargs):
         instance = self.get_object()
         new_status = request.data.get('status')
         if new_status:
-            instance.status = new_status
-            instance.save()
+            transition_booking(instance, new_status, parse_version(request.data.get('version')))
             return Response(self.get_serializer(instance).data)
         return Response({'error': 'Status not provided'}, status=status.HTTP_400_BAD_REQUEST)
+
+class ShopBookingTransitionView(APIView):
+    """
+    Move many of the vendor's bookings to one status in a single request.
+    Body: {"status": "confirmed", "bookings": [{"id": 1, "version": 3}, 2, ...]}
+    """
+    permission_classes = [IsShopOwner]
+
+    def post(self, request):
+        new_status = request.data.get('status')
+        bookings = request.data.get('bookings')
+        if not new_status or not isinstance(bookings, list) or not bookings:
+            return Response({
+                'status': 'error',
+                'message': 'status and a non-empty bookings list are required'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if len(bookings) > BULK_TRANSITION_LIMIT:
+            return Response({
+                'status': 'error',
+                'message': f'At most {BULK_TRANSITION_LIMIT} bookings can be changed at once'
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if new_status not in dict(Booking.STATUS_CHOICES):
+            return Response({'status': 'error', 'message': f'Unknown status: {new_status}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        requested = []
+        for entry in bookings:
+            try:
+                if isinstance(entry, dict):
+                    requested.append((int(entry['id']), parse_version(entry.get('version'))))
+                else:
+                    requested.append((int(entry), None))
+            except (KeyError, TypeError, ValueError):
+                return Response({
+                    'status': 'error',
+                    'message': 'bookings must be ids or objects with an id and optional version'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        updated, errors = transition_bookings(
+            Booking.objects.filter(laundry_service__vendor=request.user), requested, new_status
+        )
+        if not updated:
+            return Response({'status': 'error', 'updated': updated, 'errors': errors},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'success', 'updated': updated, 'errors': errors}, status=status.HTTP_200_OK)
+
+class ShopBookingDashboardView(APIView):
+    """Booking counts by status, revenue by day or week and pending queues for the vendor's shops"""
+    permission_classes = [IsShopOwner]
+
+    def get(self, request):
+        period = request.query_params.get('period', 'day')
+        if period not in dashboard.PERIODS:
+            return Response({
+                'status': 'error',
+                'message': f'period must be one of: {", ".join(dashboard.PERIODS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        dates = {}
+        for param in ('start', 'end'):
+            value = request.query_params.get(param)
+            try:
+                dates[param] = parse_date(value) if value else None
+            except ValueError:
+                dates[param] = None
+            if value and dates[param] is None:
+                return Response({
+                    'status': 'error',
+                    'message': f'{param} must be a date in YYYY-MM-DD format'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(dashboard.vendor_dashboard(request.user, period=period, **dates))
+
+class ShopBookingChangesView(APIView):
+    """
+    Incremental sync feed: booking events of the vendor's shops after ?since=<cursor>,
+    with the current state of the bookings they touched
+    """
+    permission_classes = [IsShopOwner]
+
+    def get(self, request):
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = min(max(int(request.query_params.get('limit', DEFAULT_FEED_LIMIT)), 1), MAX_FEED_LIMIT)
+        except ValueError:
+            return Response({
+                'status': 'error',
+                'message': 'since and limit must be integers'
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        shop_ids = list(LaundryService.objects.filter(vendor=request.user).values_list('id', flat=True))
+        events, bookings, has_more = changes_since(shop_ids, since, limit)
+        return Response({
+            'events': BookingEventSerializer(events, many=True).data,
+            'bookings': BookingSerializer(with_items(bookings), many=True).data,
+            'cursor': events[-1].id if events else since,
+            'has_more': has_more,
+        })
+
+class BookingStreamTicketView(APIView):
+    """Exchange the account token for a short-lived, single-use ticket opening an event stream"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        return Response({
+            'ticket': issue_ticket(request.user),
+            'expires_in': settings.BOOKING_STREAM_TICKET_TIMEOUT,
+        })
+
+def _sse(message):
+    return f"id: {message['cursor']}\nevent: booking\ndata: {json.dumps(message)}\n\n"
+
+async def _stream_events(user, shop_ids, last_event_id):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + settings.BOOKING_STREAM_MAX_DURATION
+    channels = [user_channel(user.pk)] + [shop_channel(shop_id) for shop_id in shop_ids]
+
+    # Subscribe before replaying so nothing committed in between is missed
+    async with get_broker().subscribe(channels) as subscription:
+        yield 'retry: 3000\n\n'
+        sent = last_event_id
+        if last_event_id is not None:
+            missed = BookingEvent.objects.filter(
+                Q(laundry_service_id__in=shop_ids) | Q(booking_id__in=Booking.objects.filter(user=user).values('id')),
+                id__gt=last_event_id
+            ).order_by('id')[:MAX_FEED_LIMIT]
+            async for event in missed:
+                yield _sse(event_message(event))
+                sent = event.id
+
+        while loop.time() < deadline and not subscription.overflowed:
+            message = await subscription.get(timeout=settings.BOOKING_STREAM_HEARTBEAT)
+            if message is None:
+                yield ': keepalive\n\n'
+            elif sent is None or message['cursor'] > sent:
+                yield _sse(message)
+                sent = message['cursor']
+
+async def booking_event_stream(request):
+    """
+    Server-sent events of the user's bookings (and, for vendors, their shops' bookings).
+    Only served through asgi.py: under WSGI Django consumes the whole async stream
+    before sending any of it, so events would arrive together when the stream closes.
+    Streams close after BOOKING_STREAM_MAX_DURATION seconds and EventSource
+    reconnects with Last-Event-ID, replaying what was missed.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            'status': 'error',
+            'message': 'Booking event streams are only served by the ASGI application'
+        }, status=501)
+    header = request.headers.get('Authorization', '')
+    if header.startswith('Token '):
+        try:
+            user, _ = await sync_to_async(CachedTokenAuthentication().authenticate_credentials)(header[len('Token '):])
+        except AuthenticationFailed as exc:
+            return JsonResponse({'status': 'error', 'message': str(exc.detail)}, status=401)
+    else:
+        # EventSource cannot send headers, so browsers come with a ticket instead of the token
+        user = None
+        user_id = await sync_to_async(redeem_ticket)(request.GET.get('ticket', ''))
+        if user_id is not None:
+            user = await User.objects.filter(pk=user_id, is_active=True).afirst()
+        if user is None:
+            return JsonResponse({'status': 'error', 'message': 'Invalid or expired stream ticket.'}, status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    shop_ids = []
+    if user.user_type == 'vendor':
+        shop_ids = [pk async for pk in LaundryService.objects.filter(vendor=user).values_list('id', flat=True)]
+
+    response = StreamingHttpResponse(_stream_events(user, shop_ids, last_event_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Let proxies pass events through as they are written
+    return response
@@ -2,6 +2,9 @@
 ASGI config for laundry_service project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve the project through it, e.g. with
+``gunicorn -k uvicorn.workers.UvicornWorker laundry_service.asgi:application``;
+booking event streams are refused under WSGI.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
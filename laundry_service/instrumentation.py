@@ -0,0 +1,207 @@
+"""
+Request instrumentation.
+
+InstrumentationMiddleware records, per view of the INSTRUMENTED_APPS, the
+number of SQL statements, the time spent in the database, in serializers and
+in rendering the response, and the total latency of each request into the
+histograms of laundry_service.metrics, which MetricsView exposes to admins.
+Requests slower than SLOW_REQUEST_THRESHOLD seconds are logged with their SQL.
+
+Statements are counted by an execute wrapper installed once on every database
+connection, which reports to the request in the current context. Serializer
+time is measured around Serializer.data and ListSerializer.data, where views
+build their response data; it includes the queries of lazily evaluated
+relations, which are also part of the database time. Render time is measured
+by TimedJSONRenderer, the default API renderer, and only covers encoding the
+already serialized data. For streaming responses the latency is the time until
+streaming starts. The middleware serves both sync and async requests.
+"""
+import contextvars
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from rest_framework.renderers import JSONRenderer
+from rest_framework.serializers import ListSerializer, Serializer
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+request_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Time to respond to a request', ['view', 'method']
+)
+request_queries = metrics.histogram(
+    'http_request_db_queries', 'SQL statements executed per request', ['view', 'method'], buckets=QUERY_COUNT_BUCKETS
+)
+request_db_time = metrics.histogram(
+    'http_request_db_seconds', 'Time spent executing SQL per request', ['view', 'method']
+)
+request_serializer_time = metrics.histogram(
+    'http_request_serializer_seconds', 'Time spent in serializers building response data per request', ['view', 'method']
+)
+request_render_time = metrics.histogram(
+    'http_request_render_seconds', 'Time spent encoding the response body per request', ['view', 'method']
+)
+requests_total = metrics.counter(
+    'http_requests_total', 'Requests by response status', ['view', 'method', 'status']
+)
+
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+class RequestStats:
+    def __init__(self, max_statements=0):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.render_time = 0.0
+        # Set while a serializer builds data, so nested serializers are not timed twice
+        self.serializing = False
+        self.max_statements = max_statements
+        self.statements = []
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.queries += 1
+            self.db_time += duration
+            # Parameters are left out, the log must not carry codes or personal data
+            if len(self.statements) < self.max_statements:
+                self.statements.append((duration, sql))
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    return stats.record_query(execute, sql, params, many, context)
+
+
+def install_query_recorder(connection, **kwargs):
+    """Add record_query to a connection's execute wrappers; safe to call more than once"""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+# Connections are per thread and created lazily, so each one is covered when it connects
+connection_created.connect(install_query_recorder)
+
+
+def _timed_data(data):
+    """Wrap a serializer's data property to add its time to the request being instrumented"""
+    def timed(serializer):
+        stats = _current.get()
+        if stats is None or stats.serializing:
+            return data.fget(serializer)
+        stats.serializing = True
+        start = time.perf_counter()
+        try:
+            return data.fget(serializer)
+        finally:
+            stats.serializer_time += time.perf_counter() - start
+            stats.serializing = False
+    timed.timed = True
+    return property(timed)
+
+
+def install_serializer_timing():
+    """Time Serializer.data and ListSerializer.data; safe to call more than once"""
+    for serializer_class in (Serializer, ListSerializer):
+        if not getattr(serializer_class.data.fget, 'timed', False):
+            serializer_class.data = _timed_data(serializer_class.data)
+
+
+# DRF has no hook around building response data, so the two data properties every serializer uses are wrapped
+install_serializer_timing()
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer that adds its time to the request being instrumented"""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        stats = _current.get()
+        if stats is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type, renderer_context)
+        finally:
+            stats.render_time += time.perf_counter() - start
+
+
+def view_name(request):
+    """Dotted name of the view that handled request, or None if it is not instrumented"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return None
+    view = getattr(match.func, 'view_class', None) or getattr(match.func, 'cls', None) or match.func
+    if view.__module__.split('.')[0] not in settings.INSTRUMENTED_APPS:
+        return None
+    return f'{view.__module__}.{view.__name__}'
+
+
+class InstrumentationMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+        for connection in connections.all():
+            install_query_recorder(connection)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token, start = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token, start = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.finish(request, response, stats, time.perf_counter() - start)
+        return response
+
+    def start(self):
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+        stats = RequestStats(settings.SLOW_REQUEST_MAX_STATEMENTS if threshold is not None else 0)
+        return stats, _current.set(stats), time.perf_counter()
+
+    def finish(self, request, response, stats, duration):
+        view = view_name(request)
+        if view is None:
+            return
+        labels = {'view': view, 'method': request.method}
+        request_latency.observe(duration, **labels)
+        request_queries.observe(stats.queries, **labels)
+        request_db_time.observe(stats.db_time, **labels)
+        request_serializer_time.observe(stats.serializer_time, **labels)
+        request_render_time.observe(stats.render_time, **labels)
+        requests_total.inc(status=response.status_code, **labels)
+
+        threshold = settings.SLOW_REQUEST_THRESHOLD
+        if threshold is not None and duration >= threshold:
+            logger.warning(
+                'Slow request %s %s (%s): %.3fs, %d queries in %.3fs, serializers %.3fs, rendering %.3fs%s',
+                request.method, request.path, view, duration, stats.queries, stats.db_time, stats.serializer_time,
+                stats.render_time,
+                ''.join(f'\n  {statement_time * 1000:.1f}ms {sql}' for statement_time, sql in stats.statements)
+            )
@@ -0,0 +1,148 @@
+"""
+Process-local metrics.
+
+Counters and histograms are kept in memory per process and keyed by label
+values; they are cheap enough to update on every request or delivery. Metrics
+are registered once by name, so modules can declare them at import time.
+"""
+import bisect
+import threading
+
+# Upper bounds in seconds, suited to request and delivery latencies
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        """(label values, value) pairs"""
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket counts (the last one for values above every bound), sum
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def count(self, **labels):
+        series = self._values.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def samples(self):
+        """(label values, cumulative bucket counts, count, sum) tuples"""
+        with self._lock:
+            snapshot = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        samples = []
+        for key, counts, total in snapshot:
+            cumulative, running = [], 0
+            for count in counts[:-1]:
+                running += count
+                cumulative.append(running)
+            samples.append((key, cumulative, running + counts[-1], total))
+        return samples
+
+
+def _register(cls, name, *args, **kwargs):
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f'Metric {name} is already registered as a {metric.kind}')
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    return _register(Counter, name, documentation, labelnames)
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+
+def registered():
+    """All registered metrics, sorted by name"""
+    with _registry_lock:
+        return [_registry[name] for name in sorted(_registry)]
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = [*zip(labelnames, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(str(value))}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in registered():
+        lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        if metric.kind == 'counter':
+            for values, value in sorted(metric.samples()):
+                lines.append(f'{metric.name}{_format_labels(metric.labelnames, values)} {_format_value(value)}')
+            continue
+        for values, cumulative, count, total in sorted(metric.samples()):
+            for bound, bucket_count in zip(metric.buckets, cumulative):
+                labels = _format_labels(metric.labelnames, values, [('le', _format_value(float(bound)))])
+                lines.append(f'{metric.name}_bucket{labels} {bucket_count}')
+            labels = _format_labels(metric.labelnames, values, [('le', '+Inf')])
+            lines.append(f'{metric.name}_bucket{labels} {count}')
+            labels = _format_labels(metric.labelnames, values)
+            lines.append(f'{metric.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{metric.name}_count{labels} {count}')
+    return '\n'.join(lines) + '\n'
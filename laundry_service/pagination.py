@@ -0,0 +1,24 @@
+from django.conf import settings
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+
+
+class StandardPagination(PageNumberPagination):
+    """Page number pagination used by default for list endpoints"""
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.MAX_PAGE_SIZE
+
+
+class CreatedAtCursorPagination(CursorPagination):
+    """
+    Keyset pagination on (created_at, id), newest first.
+    Each page is a range scan from the cursor position instead of an OFFSET.
+    """
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+
+    @property
+    def max_page_size(self):
+        return settings.MAX_PAGE_SIZE
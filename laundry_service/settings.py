@@ -49,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'laundry_service.instrumentation.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -111,13 +112,23 @@ AUTH_PASSWORD_VALIDATORS = [
 # Add REST framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    'DEFAULT_PAGINATION_CLASS': 'laundry_service.pagination.StandardPagination',
+    'PAGE_SIZE': 20,
+    # The JSON renderer reports its time to laundry_service.instrumentation
+    'DEFAULT_RENDERER_CLASSES': [
+        'laundry_service.instrumentation.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Upper bound for the ?page_size= query parameter on paginated endpoints
+MAX_PAGE_SIZE = 100
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/4.2/topics/i18n/
@@ -143,3 +154,101 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Custom user model
 AUTH_USER_MODEL = 'accounts.User'
+
+# Seconds an in-process shop coordinate index may be reused before it is rebuilt.
+# Saves in the same process invalidate it immediately; this bounds staleness across workers.
+GEO_INDEX_MAX_AGE = 300
+
+# Full-text search backend for laundry services (dotted path). When unset, an SQLite FTS5
+# index is used on SQLite and icontains filtering on other databases.
+LAUNDRY_SEARCH_BACKEND = None
+
+# Seconds the in-process address autocomplete index is reused before a full rebuild
+AUTOCOMPLETE_INDEX_MAX_AGE = 300
+
+# Time zone that shop operating hours and pickup times are expressed in,
+# used to resolve open_now and pickup_at filters
+SHOP_TIME_ZONE = 'Asia/Kolkata'
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'laundry-service',
+    },
+    'auth-tokens': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'auth-tokens',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+}
+
+# Cache alias and timeout (seconds) for cached catalogue API responses. Writes invalidate entries
+# in this cache only, so with several worker processes it must be shared between them;
+# with a process-local cache other workers serve stale responses for up to the timeout.
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Cache alias and timeout (seconds) for token -> user lookups of CachedTokenAuthentication.
+# A process-local cache only sees invalidations from its own process, so a revoked token or
+# deactivated user stays valid in other workers for up to the timeout. Use a shared cache for
+# immediate revocation across workers.
+AUTH_TOKEN_CACHE_ALIAS = 'auth-tokens'
+AUTH_TOKEN_CACHE_TIMEOUT = 5
+
+# Cache alias and timeout (seconds) for serialized user profiles served by the profile endpoint.
+# Writes drop entries in this cache only; with a process-local cache other workers can serve
+# the previous profile for up to the timeout.
+PROFILE_CACHE_ALIAS = 'default'
+PROFILE_CACHE_TIMEOUT = 300
+
+# Sliding-window rate limits as (requests, window seconds), counted in RATE_LIMIT_CACHE_ALIAS.
+# The cache must be shared between processes for the limits to hold across workers.
+RATE_LIMIT_CACHE_ALIAS = 'default'
+RATE_LIMITS = {
+    'otp-send-identifier': (3, 600),
+    'otp-send-ip': (20, 3600),
+    'otp-verify-identifier': (5, 600),
+    'otp-verify-ip': (50, 3600),
+}
+
+# Transports delivering OTP messages per channel (dotted paths to accounts.delivery.BaseTransport subclasses).
+# Every channel needs one, checked by `manage.py check --deploy`; no SMS provider transport ships with the project, so
+# deployments must configure one. ConsoleTransport and FileTransport write codes in plain text
+# and are refused unless DEBUG is on. Under DEBUG both channels print to the console.
+OTP_TRANSPORTS = {
+    'email': 'accounts.delivery.EmailTransport',
+}
+if DEBUG:
+    OTP_TRANSPORTS['sms'] = 'accounts.delivery.ConsoleTransport'
+    EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+OTP_DELIVERY_FILE_PATH = BASE_DIR / 'otp_messages.log'
+# Worker threads per channel, messages per transport call, and seconds a worker waits to fill a batch
+OTP_DELIVERY_WORKERS = 2
+OTP_DELIVERY_BATCH_SIZE = 50
+OTP_DELIVERY_BATCH_WAIT = 0.05
+# Attempts per message; the retry delay (seconds) doubles per attempt up to the maximum
+OTP_DELIVERY_MAX_ATTEMPTS = 5
+OTP_DELIVERY_RETRY_DELAY = 1
+OTP_DELIVERY_MAX_RETRY_DELAY = 60
+
+# Broker for live booking events (dotted path to a bookings.broker.BaseBroker subclass).
+# The default in-process broker only reaches streams served by the same process.
+BOOKING_EVENT_BROKER = None
+# Seconds between keepalive comments, and before a booking event stream is closed for the client to reconnect
+BOOKING_STREAM_HEARTBEAT = 15
+BOOKING_STREAM_MAX_DURATION = 300
+# Cache alias and lifetime (seconds) of the single-use tickets browsers open event streams with.
+# The ticket is redeemed by whichever worker serves the stream, so with several worker
+# processes the cache must be shared between them.
+BOOKING_STREAM_TICKET_CACHE_ALIAS = 'default'
+BOOKING_STREAM_TICKET_TIMEOUT = 30
+
+# Apps whose views InstrumentationMiddleware records into the metrics served at /api/metrics/.
+# Metrics are kept per process, so each worker reports its own.
+INSTRUMENTED_APPS = ('laundryshops', 'bookings', 'accounts')
+# Requests slower than this many seconds are logged with up to SLOW_REQUEST_MAX_STATEMENTS SQL statements; None disables
+SLOW_REQUEST_THRESHOLD = 1.0
+SLOW_REQUEST_MAX_STATEMENTS = 50
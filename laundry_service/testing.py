@@ -0,0 +1,25 @@
+from django.db import connection
+
+
+class QueryPlanAssertions:
+    """Assertions on the SQLite query plan chosen for a queryset"""
+
+    def query_plan(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = self.query_plan(queryset)
+        self.assertTrue(
+            any(f'INDEX {index_name}' in step for step in plan),
+            f'{index_name} not used, query plan: {plan}'
+        )
+
+    def assertNoTempSort(self, queryset):
+        plan = self.query_plan(queryset)
+        self.assertFalse(
+            any('TEMP B-TREE' in step for step in plan),
+            f'Query sorts in a temporary b-tree, query plan: {plan}'
+        )
@@ -0,0 +1,86 @@
+import time
+from unittest import mock
+from django.core.cache import caches
+from django.conf import settings
+from django.db import connection
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from accounts.models import User
+from accounts.serializers import UserSerializer
+from .instrumentation import (
+    record_query, request_queries, request_render_time, request_serializer_time, requests_total
+)
+
+PROFILE_VIEW = 'accounts.views.UserProfileView'
+
+
+class InstrumentationTests(TestCase):
+    def setUp(self):
+        caches[settings.PROFILE_CACHE_ALIAS].clear()
+        self.user = User.objects.create_user(email='customer@example.com', user_type='customer')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_request_is_recorded_per_view(self):
+        labels = {'view': PROFILE_VIEW, 'method': 'GET'}
+        requests = request_queries.count(**labels)
+        ok = requests_total.value(status=200, **labels)
+        rendered = request_render_time.count(**labels)
+
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 200)
+        self.assertEqual(request_queries.count(**labels), requests + 1)
+        self.assertEqual(request_render_time.count(**labels), rendered + 1)
+        self.assertEqual(requests_total.value(status=200, **labels), ok + 1)
+
+    def test_serializer_time_is_recorded(self):
+        represent = UserSerializer.to_representation
+
+        def slow_representation(serializer, user):
+            time.sleep(0.01)
+            return represent(serializer, user)
+        with mock.patch('laundry_service.instrumentation.request_serializer_time.observe') as observe, \
+                mock.patch.object(UserSerializer, 'to_representation', slow_representation):
+            self.assertEqual(self.client.get('/api/auth/profile/').status_code, 200)
+        self.assertGreaterEqual(observe.call_args.args[0], 0.01)
+
+    def test_statements_are_counted_once(self):
+        self.assertEqual(connection.execute_wrappers.count(record_query), 1)
+        with mock.patch('laundry_service.instrumentation.request_queries.observe') as observe:
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get('/api/auth/profile/')
+        self.assertEqual(observe.call_args.args[0], len(queries))
+        self.assertEqual(connection.execute_wrappers.count(record_query), 1)
+
+    async def test_async_requests_are_recorded(self):
+        labels = {'view': PROFILE_VIEW, 'method': 'GET'}
+        ok = requests_total.value(status=200, **labels)
+        response = await AsyncClient().get('/api/auth/profile/', headers={'Authorization': f'Token {self.token.key}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(requests_total.value(status=200, **labels), ok + 1)
+
+    def test_metrics_endpoint_is_for_staff(self):
+        self.client.get('/api/auth/profile/')
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        self.user.is_staff = True
+        self.user.save()
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE http_request_db_queries histogram', body)
+        self.assertIn(f'http_requests_total{{view="{PROFILE_VIEW}",method="GET",status="200"}}', body)
+        self.assertIn(f'http_request_duration_seconds_bucket{{view="{PROFILE_VIEW}",method="GET",le="+Inf"}}', body)
+        # The metrics endpoint itself is not instrumented
+        self.assertNotIn('MetricsView', body)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_slow_requests_are_logged_with_sql(self):
+        with self.assertLogs('laundry_service.instrumentation', 'WARNING') as logs:
+            self.client.get('/api/auth/profile/')
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn(PROFILE_VIEW, logs.output[0])
+        self.assertIn('FROM "accounts_user"', logs.output[0])
@@ -16,10 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path,include
+from .views import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('accounts.urls')),
     path('api/laundry/', include('laundryshops.urls')),
     path('api/', include('bookings.urls')),
+    path('api/metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -0,0 +1,194 @@
+"""
+In-memory autocomplete index for district, state and address suggestions.
+
+Values are kept in sorted prefix lists keyed by every word start, so "del"
+suggests both "Delhi" and "New Delhi". The index is built lazily with one query,
+updated incrementally after LaundryService writes commit, and rebuilt after
+AUTOCOMPLETE_INDEX_MAX_AGE seconds to pick up changes made by other workers.
+Lookups made while another request builds the first snapshot get None, so
+callers can fall back to the database instead of waiting.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+from collections import Counter
+from django.conf import settings
+
+
+def normalize(text):
+    return ' '.join(re.findall(r'\w+', (text or '').lower()))
+
+
+def word_starts(text):
+    normalized = normalize(text)
+    return [normalized[match.start():] for match in re.finditer(r'\w+', normalized)]
+
+
+class PrefixIndex:
+    """Sorted (key, value) pairs with a count of shops per value"""
+    
+    def __init__(self):
+        self._entries = []
+        self._counts = Counter()
+    
+    def copy(self):
+        index = PrefixIndex()
+        index._entries = list(self._entries)
+        index._counts = Counter(self._counts)
+        return index
+    
+    def add(self, value, text):
+        if self._counts[value] == 0:
+            for key in word_starts(text):
+                insort(self._entries, (key, value))
+        self._counts[value] += 1
+    
+    def discard(self, value, text):
+        self._counts[value] -= 1
+        if self._counts[value] > 0:
+            return
+        del self._counts[value]
+        for key in word_starts(text):
+            position = bisect_left(self._entries, (key, value))
+            if position < len(self._entries) and self._entries[position] == (key, value):
+                del self._entries[position]
+    
+    def lookup(self, prefix, limit):
+        """Values with a word starting with prefix, most common first"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = set()
+        position = bisect_left(self._entries, (prefix,))
+        while position < len(self._entries) and self._entries[position][0].startswith(prefix):
+            matches.add(self._entries[position][1])
+            position += 1
+        return sorted(matches, key=lambda value: (-self._counts[value], value))[:limit]
+
+
+class Snapshot:
+    """Prefix indexes over the active shops at one point in time, not modified once published"""
+    
+    def __init__(self, shops, districts, states, addresses, built_at):
+        self.shops = shops
+        self.districts = districts
+        self.states = states
+        self.addresses = addresses
+        self.built_at = built_at
+    
+    @classmethod
+    def build(cls, rows):
+        snapshot = cls({}, PrefixIndex(), PrefixIndex(), PrefixIndex(), time.monotonic())
+        for shop_id, *entry in rows:
+            snapshot.add(shop_id, tuple(entry))
+        return snapshot
+    
+    def copy(self):
+        return Snapshot(
+            dict(self.shops), self.districts.copy(), self.states.copy(), self.addresses.copy(), self.built_at
+        )
+    
+    def is_fresh(self):
+        max_age = getattr(settings, 'AUTOCOMPLETE_INDEX_MAX_AGE', 300)
+        return time.monotonic() - self.built_at < max_age
+    
+    def add(self, shop_id, entry):
+        self.shops[shop_id] = entry
+        address, district, state, zipcode = entry
+        self.districts.add(district, district)
+        self.states.add(state, state)
+        if address:
+            self.addresses.add(entry, address)
+    
+    def discard(self, shop_id):
+        entry = self.shops.pop(shop_id, None)
+        if entry is None:
+            return
+        address, district, state, zipcode = entry
+        self.districts.discard(district, district)
+        self.states.discard(state, state)
+        if address:
+            self.addresses.discard(entry, address)
+
+
+class AutocompleteIndex:
+    """
+    Serves lookups from an immutable Snapshot without locking. Rebuilds run
+    outside the lock and swap the snapshot reference in; shop updates copy the
+    current snapshot, change the copy and swap it in under the lock.
+    """
+    ADDRESS_FIELDS = ('address', 'district', 'state', 'zipcode')
+    
+    def __init__(self):
+        # Held by the one request rebuilding the snapshot
+        self._build_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._snapshot = None
+        # Bumped by every write, so a rebuild that raced one is not published over it
+        self._generation = 0
+    
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+    
+    def _current(self):
+        """The current snapshot, rebuilt when missing or stale; None while another request builds the first one"""
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.is_fresh():
+            return snapshot
+        if not self._build_lock.acquire(blocking=False):
+            # Another request is rebuilding, serve the stale snapshot meanwhile
+            return snapshot
+        try:
+            from .models import LaundryService
+            
+            generation = self._generation
+            snapshot = Snapshot.build(
+                LaundryService.objects.filter(is_active=True).values_list('id', *self.ADDRESS_FIELDS)
+            )
+            with self._lock:
+                if self._generation == generation:
+                    self._snapshot = snapshot
+            return snapshot
+        finally:
+            self._build_lock.release()
+    
+    def _modify(self, change):
+        with self._lock:
+            if self._snapshot is None:
+                return
+            snapshot = self._snapshot.copy()
+            change(snapshot)
+            self._snapshot = snapshot
+            self._generation += 1
+    
+    def update_shop(self, service):
+        entry = tuple(getattr(service, field) for field in self.ADDRESS_FIELDS)
+        
+        def change(snapshot):
+            snapshot.discard(service.pk)
+            if service.is_active:
+                snapshot.add(service.pk, entry)
+        self._modify(change)
+    
+    def remove_shop(self, shop_id):
+        self._modify(lambda snapshot: snapshot.discard(shop_id))
+    
+    def suggest(self, category, query, limit=10):
+        """Suggestions for 'districts', 'states', 'cities' or 'addresses', or None while the index is unbuilt"""
+        snapshot = self._current()
+        if snapshot is None:
+            return None
+        if category == 'addresses':
+            return [
+                dict(zip(self.ADDRESS_FIELDS, entry))
+                for entry in snapshot.addresses.lookup(query, limit)
+            ]
+        if category == 'states':
+            return snapshot.states.lookup(query, limit)
+        return snapshot.districts.lookup(query, limit)
+
+
+autocomplete_index = AutocompleteIndex()
@@ -0,0 +1,144 @@
+"""
+Weekly availability windows for laundry services.
+
+Operating hours and pickup times are flattened into minute-of-week intervals
+(Monday 00:00 shop local time is minute 0) stored in AvailabilityWindow, so
+"open now" and "can pick up at" become a single indexed range lookup instead of
+loading every shop's hours.
+"""
+from zoneinfo import ZoneInfo
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import LaundryService, AvailabilityWindow
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def _minute_of_day(value):
+    return value.hour * 60 + value.minute
+
+
+def day_interval(day_of_week, start_time, end_time):
+    """
+    Intervals covering start_time to end_time on day_of_week.
+    A closing time at or before the opening time runs past midnight; anything
+    past the end of Sunday wraps around to Monday.
+    """
+    start = day_of_week * MINUTES_PER_DAY + _minute_of_day(start_time)
+    end = day_of_week * MINUTES_PER_DAY + _minute_of_day(end_time)
+    if end <= start:
+        end += MINUTES_PER_DAY
+    if end > MINUTES_PER_WEEK:
+        return [(start, MINUTES_PER_WEEK), (0, end - MINUTES_PER_WEEK)]
+    return [(start, end)]
+
+
+def merge_intervals(intervals):
+    """Sort and merge overlapping or touching intervals"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def shop_windows(pickup_start_time, pickup_end_time, hours):
+    """
+    Return {kind: [(start_minute, end_minute)]} for a shop.
+    hours are OperatingHour-like objects. Pickups run daily on every day the shop
+    is not marked closed; a shop without operating hours has no open windows and
+    picks up every day.
+    """
+    open_intervals = []
+    open_days = set(range(7))
+    if hours:
+        open_days = set()
+        for hour in hours:
+            if hour.is_closed:
+                continue
+            open_days.add(hour.day_of_week)
+            open_intervals.extend(day_interval(hour.day_of_week, hour.opening_time, hour.closing_time))
+
+    pickup_intervals = []
+    for day in open_days:
+        pickup_intervals.extend(day_interval(day, pickup_start_time, pickup_end_time))
+
+    return {
+        AvailabilityWindow.Kind.OPEN: merge_intervals(open_intervals),
+        AvailabilityWindow.Kind.PICKUP: merge_intervals(pickup_intervals),
+    }
+
+
+def _build_windows(shops):
+    return [
+        AvailabilityWindow(laundry_service_id=shop.id, kind=kind, start_minute=start, end_minute=end)
+        for shop in shops
+        for kind, intervals in shop_windows(
+            shop.pickup_start_time, shop.pickup_end_time, shop.operating_hours.all()
+        ).items()
+        for start, end in intervals
+    ]
+
+
+def _shops(queryset):
+    return queryset.only('id', 'pickup_start_time', 'pickup_end_time').prefetch_related('operating_hours')
+
+
+def refresh_availability(shop_ids):
+    """Recompute the availability windows of the given shops"""
+    shop_ids = list(shop_ids)
+    AvailabilityWindow.objects.filter(laundry_service_id__in=shop_ids).delete()
+    # Shops deleted in the meantime simply produce no windows
+    shops = _shops(LaundryService.objects.filter(pk__in=shop_ids))
+    AvailabilityWindow.objects.bulk_create(_build_windows(shops), batch_size=500)
+
+
+def rebuild_availability(batch_size=500):
+    """Recompute availability windows for every shop. Returns the number of shops processed."""
+    AvailabilityWindow.objects.all().delete()
+    processed = 0
+    batch = []
+    for shop in _shops(LaundryService.objects.order_by('id')).iterator(chunk_size=batch_size):
+        batch.append(shop)
+        if len(batch) >= batch_size:
+            AvailabilityWindow.objects.bulk_create(_build_windows(batch))
+            processed += len(batch)
+            batch = []
+    if batch:
+        AvailabilityWindow.objects.bulk_create(_build_windows(batch))
+        processed += len(batch)
+    return processed
+
+
+def shop_time_zone():
+    return ZoneInfo(settings.SHOP_TIME_ZONE)
+
+
+def minute_of_week(value):
+    """Minute-of-week of a datetime in shop local time; naive datetimes are taken as local already"""
+    if timezone.is_aware(value):
+        value = value.astimezone(shop_time_zone())
+    return value.weekday() * MINUTES_PER_DAY + _minute_of_day(value)
+
+
+def requested_window(query_params):
+    """
+    Read the open_now / pickup_at filters from query parameters.
+    Returns (kind, minute_of_week), or None when neither is given.
+    Raises ValueError for a malformed pickup_at.
+    """
+    pickup_at = query_params.get('pickup_at')
+    if pickup_at:
+        value = parse_datetime(pickup_at)
+        if value is None:
+            raise ValueError(f'Invalid pickup_at: {pickup_at}')
+        return AvailabilityWindow.Kind.PICKUP, minute_of_week(value)
+    if query_params.get('open_now', '').lower() in ('1', 'true', 'yes'):
+        return AvailabilityWindow.Kind.OPEN, minute_of_week(timezone.now())
+    return None
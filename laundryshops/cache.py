@@ -0,0 +1,125 @@
+"""
+Response caching for the public catalogue endpoints.
+
+A cached response is keyed on the view, its URL kwargs, the normalized query
+parameters and the current version of every tag the view depends on. Model
+signals bump tag versions after commit, so a write only invalidates responses
+that depend on the changed rows. Versions live in RESPONSE_CACHE_ALIAS, so the
+bumps only reach other worker processes when that cache is shared. Cached
+responses carry an ETag and requests with a matching If-None-Match get a 304.
+"""
+import hashlib
+import json
+import time
+from functools import wraps
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+# Tags for rows a cached response can depend on
+SHOPS = 'shops'
+OFFERINGS = 'offerings'
+HOURS = 'hours'
+REVIEWS = 'reviews'
+SERVICE_TYPES = 'service_types'
+
+
+def shop_tag(pk):
+    """Tag for everything belonging to a single shop"""
+    return f'shop:{pk}'
+
+
+def get_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(tag):
+    return f'laundryshops:tag:{tag}'
+
+
+def tag_versions(tags):
+    cache = get_cache()
+    keys = [_version_key(tag) for tag in tags]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # Start from the clock so an evicted version never repeats an earlier one
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def bump(*tags):
+    cache = get_cache()
+    for tag in tags:
+        try:
+            cache.incr(_version_key(tag))
+        except ValueError:
+            cache.set(_version_key(tag), time.time_ns(), timeout=None)
+
+
+def make_etag(data):
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True).encode()
+    return '"%s"' % hashlib.sha1(body).hexdigest()
+
+
+def cached_response(request, name, kwargs, tags, compute):
+    """Return the cached response for this request, or compute and cache it"""
+    params = sorted(
+        (key, value)
+        for key in request.query_params
+        for value in request.query_params.getlist(key)
+    )
+    raw_key = json.dumps([name, request.get_host(), sorted(kwargs.items()), params, tag_versions(tags)])
+    key = 'laundryshops:response:' + hashlib.sha256(raw_key.encode()).hexdigest()
+    
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry is None:
+        response = compute()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        etag = make_etag(response.data)
+        cache.set(key, (response.data, etag), getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+    else:
+        data, etag = entry
+        response = Response(data)
+    
+    if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    if etag in if_none_match or '*' in if_none_match:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    response['ETag'] = etag
+    return response
+
+
+class CachedResponseMixin:
+    """Cache GET responses of a generic view; set cache_tags or override get_cache_tags()"""
+    cache_tags = ()
+    
+    def get_cache_tags(self):
+        return self.cache_tags
+    
+    def get(self, request, *args, **kwargs):
+        tags = self.get_cache_tags()
+        if tags is None:
+            return super().get(request, *args, **kwargs)
+        return cached_response(
+            request, f'{type(self).__module__}.{type(self).__name__}', kwargs, tags,
+            lambda: super(CachedResponseMixin, self).get(request, *args, **kwargs)
+        )
+
+
+def cache_response(*tags):
+    """Cache GET responses of a function based API view"""
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            return cached_response(
+                request, f'{view_func.__module__}.{view_func.__name__}', kwargs, tags,
+                lambda: view_func(request, *args, **kwargs)
+            )
+        return wrapper
+    return decorator
@@ -0,0 +1,186 @@
+"""
+Streaming bulk import and export of the shop catalogue.
+
+Rows are shops with their offerings and hours, as NDJSON (one JSON object per
+line) or CSV (nested offerings and hours JSON encoded in their columns).
+Imports are validated and inserted in chunks with bulk_create; exports stream
+rows from a chunked iterator so the catalogue is never held in memory.
+"""
+import csv
+import json
+from itertools import islice
+from django.db import transaction, IntegrityError
+from rest_framework.utils.encoders import JSONEncoder
+from .models import LaundryService, ServiceType, ServiceOffering, OperatingHour
+from .serializers import CatalogueSerializer
+from .signals import shops_created_in_bulk
+
+NDJSON = 'ndjson'
+CSV = 'csv'
+FORMATS = (NDJSON, CSV)
+CONTENT_TYPES = {NDJSON: 'application/x-ndjson', CSV: 'text/csv'}
+NESTED_FIELDS = ('service_offerings', 'operating_hours')
+FIELDS = CatalogueSerializer.Meta.fields
+
+
+# What decoding with errors='replace' leaves in place of bytes that are not UTF-8
+REPLACEMENT_CHARACTER = '\ufffd'
+INVALID_UTF8 = 'Invalid UTF-8'
+
+
+def read_rows(lines, file_format):
+    """
+    Yield (line_number, data, error) for each row in an iterable of text lines.
+    Lines should be decoded with errors='replace'; rows with undecodable bytes are reported as errors.
+    """
+    if file_format == CSV:
+        reader = csv.DictReader(lines)
+        for data in reader:
+            line_number = reader.line_num
+            if any(REPLACEMENT_CHARACTER in str(value) for value in data.values()):
+                yield line_number, None, INVALID_UTF8
+                continue
+            try:
+                for field in NESTED_FIELDS:
+                    data[field] = json.loads(data[field]) if data.get(field) else []
+            except json.JSONDecodeError as exc:
+                yield line_number, None, f'Invalid JSON in nested column: {exc}'
+                continue
+            yield line_number, {key: value for key, value in data.items() if value != ''}, None
+        return
+    
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        if REPLACEMENT_CHARACTER in line:
+            yield line_number, None, INVALID_UTF8
+            continue
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as exc:
+            yield line_number, None, f'Invalid JSON: {exc}'
+            continue
+        if not isinstance(data, dict):
+            yield line_number, None, 'Each line must be a JSON object'
+            continue
+        yield line_number, data, None
+
+
+def _insert_chunk(validated_rows, vendor):
+    shops = [
+        LaundryService(vendor=vendor, **{key: value for key, value in validated_data.items() if key not in NESTED_FIELDS})
+        for validated_data in validated_rows
+    ]
+    
+    with transaction.atomic():
+        LaundryService.objects.bulk_create(shops)
+        offerings = []
+        hours = []
+        for shop, validated_data in zip(shops, validated_rows):
+            offerings.extend(
+                ServiceOffering(laundry_service=shop, **offering_data)
+                for offering_data in validated_data.get('service_offerings', [])
+            )
+            hours.extend(
+                OperatingHour(laundry_service=shop, **hour_data)
+                for hour_data in validated_data.get('operating_hours', [])
+            )
+        ServiceOffering.objects.bulk_create(offerings)
+        OperatingHour.objects.bulk_create(hours)
+        shops_created_in_bulk(shops)
+    return len(shops)
+
+
+def _existing_names(names):
+    return set(LaundryService.objects.filter(shop_name__in=names).values_list('shop_name', flat=True))
+
+
+def _insert_rows(lines, validated_rows, vendor, errors):
+    """Insert a chunk in one go, or row by row if it hits a conflict, so one bad row only rejects itself"""
+    try:
+        return _insert_chunk(validated_rows, vendor)
+    except IntegrityError:
+        pass
+    created = 0
+    for line_number, validated_data in zip(lines, validated_rows):
+        try:
+            created += _insert_chunk([validated_data], vendor)
+        except IntegrityError as exc:
+            errors.append({'line': line_number, 'errors': f'Row not imported: {exc}'})
+    return created
+
+
+def import_catalogue(rows, vendor=None, chunk_size=500):
+    """
+    Validate and insert rows from read_rows() in chunks.
+    Returns {'created': count, 'errors': [{'line': n, 'errors': ...}]}.
+    """
+    context = {'service_types': ServiceType.objects.in_bulk()}
+    created = 0
+    errors = []
+    seen_names = set()
+    rows = iter(rows)
+    
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        
+        valid = []
+        for line_number, data, error in chunk:
+            if error:
+                errors.append({'line': line_number, 'errors': error})
+                continue
+            serializer = CatalogueSerializer(data=data, context=context)
+            if not serializer.is_valid():
+                errors.append({'line': line_number, 'errors': serializer.errors})
+                continue
+            shop_name = serializer.validated_data['shop_name']
+            if shop_name in seen_names:
+                errors.append({'line': line_number, 'errors': {'shop_name': ['Duplicate shop name in file']}})
+                continue
+            seen_names.add(shop_name)
+            valid.append((line_number, serializer.validated_data))
+        
+        # Names are checked against the database once per chunk rather than by a validator per row
+        existing = _existing_names([validated_data['shop_name'] for _, validated_data in valid])
+        lines = []
+        validated_rows = []
+        for line_number, validated_data in valid:
+            if validated_data['shop_name'] in existing:
+                errors.append({'line': line_number, 'errors': {'shop_name': ['laundry service with this shop name already exists.']}})
+                continue
+            lines.append(line_number)
+            validated_rows.append(validated_data)
+        
+        if validated_rows:
+            created += _insert_rows(lines, validated_rows, vendor, errors)
+    
+    errors.sort(key=lambda error: error['line'])
+    return {'created': created, 'errors': errors}
+
+
+class _Echo:
+    """File-like object whose write() returns the written value, for streaming csv.writer output"""
+    def write(self, value):
+        return value
+
+
+def export_catalogue(queryset, file_format, chunk_size=500):
+    """Yield the catalogue as NDJSON or CSV text, one shop at a time"""
+    shops = queryset.with_related(reviews=False).order_by('id').iterator(chunk_size=chunk_size)
+    
+    if file_format == CSV:
+        writer = csv.writer(_Echo())
+        yield writer.writerow(FIELDS)
+        for shop in shops:
+            data = CatalogueSerializer(shop).data
+            yield writer.writerow([
+                json.dumps(data[field], cls=JSONEncoder) if field in NESTED_FIELDS
+                else ('' if data[field] is None else data[field])
+                for field in FIELDS
+            ])
+        return
+    
+    for shop in shops:
+        yield json.dumps(CatalogueSerializer(shop).data, cls=JSONEncoder) + '\n'
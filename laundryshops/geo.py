@@ -0,0 +1,165 @@
+"""Geographic helpers for locating laundry services"""
+import heapq
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from math import radians, sin, cos, sqrt, asin
+
+from django.conf import settings
+
+try:
+    import numpy as np
+except ImportError:  # numpy is optional, the stdlib array path is used without it
+    np = None
+
+EARTH_RADIUS_KM = 6371
+# Length of one degree of latitude on the sphere the distances are computed on
+KM_PER_DEGREE = EARTH_RADIUS_KM * radians(1)
+
+
+def bounding_box(lat, lng, radius_km):
+    """Return (min_lat, max_lat, min_lng, max_lng) enclosing a circle of radius_km"""
+    dlat = radius_km / KM_PER_DEGREE
+    cos_lat = cos(radians(lat))
+    if cos_lat < 1e-6:
+        dlng = 180
+    else:
+        dlng = min(radius_km / (KM_PER_DEGREE * cos_lat), 180)
+    return lat - dlat, lat + dlat, lng - dlng, lng + dlng
+
+
+def _vector(values):
+    """Pack floats into a contiguous vector (numpy array if available, else array('d'))"""
+    if np is not None:
+        return np.fromiter(values, dtype=np.float64)
+    return array('d', values)
+
+
+def haversine_many(lat, lng, lat_rads, lng_rads, cos_lats):
+    """
+    Distances in kilometers from (lat, lng) to many points in one pass.
+    Points are given as vectors of latitude/longitude in radians plus cos(latitude).
+    """
+    lat1 = radians(lat)
+    lng1 = radians(lng)
+    cos_lat1 = cos(lat1)
+    if np is not None:
+        a = (np.sin((lat_rads - lat1) / 2) ** 2
+             + cos_lat1 * cos_lats * np.sin((lng_rads - lng1) / 2) ** 2)
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    
+    distances = array('d', bytes(8 * len(lat_rads)))
+    for i in range(len(lat_rads)):
+        a = (sin((lat_rads[i] - lat1) / 2) ** 2
+             + cos_lat1 * cos_lats[i] * sin((lng_rads[i] - lng1) / 2) ** 2)
+        distances[i] = 2 * EARTH_RADIUS_KM * asin(sqrt(min(a, 1.0)))
+    return distances
+
+
+def nearest_within(distances, radius_km, limit=None):
+    """Return positions of distances <= radius_km, nearest first, keeping at most limit"""
+    if np is not None:
+        positions = np.flatnonzero(distances <= radius_km)
+        if limit is not None and len(positions) > limit:
+            positions = positions[np.argpartition(distances[positions], limit - 1)[:limit]]
+        return positions[np.argsort(distances[positions], kind='stable')].tolist()
+    
+    positions = [i for i in range(len(distances)) if distances[i] <= radius_km]
+    if limit is not None and len(positions) > limit:
+        return heapq.nsmallest(limit, positions, key=distances.__getitem__)
+    return sorted(positions, key=distances.__getitem__)
+
+
+class ShopCoordinateIndex:
+    """
+    Coordinates of active shops held in contiguous vectors sorted by latitude.
+    Marked stale by LaundryService signals once their transaction commits and
+    rebuilt lazily with one query; GEO_INDEX_MAX_AGE bounds staleness across
+    worker processes.
+    """
+    
+    def __init__(self):
+        # Serializes rebuilds, so concurrent lookups on a stale index run one query
+        self._build_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._snapshot = None
+        # Bumped by every invalidation, so a rebuild that raced one is not published over it
+        self._generation = 0
+    
+    def invalidate(self):
+        with self._lock:
+            self._snapshot = None
+            self._generation += 1
+    
+    @staticmethod
+    def _is_fresh(snapshot):
+        max_age = getattr(settings, 'GEO_INDEX_MAX_AGE', 300)
+        return snapshot is not None and time.monotonic() - snapshot['built_at'] < max_age
+    
+    def _build(self):
+        from .models import LaundryService
+        
+        built_at = time.monotonic()
+        rows = (
+            LaundryService.objects
+            .filter(is_active=True, latitude__isnull=False, longitude__isnull=False)
+            .order_by('latitude')
+            .values_list('id', 'latitude', 'longitude')
+        )
+        ids = array('q')
+        lats = array('d')
+        lngs = array('d')
+        for shop_id, latitude, longitude in rows:
+            ids.append(shop_id)
+            lats.append(float(latitude))
+            lngs.append(float(longitude))
+        
+        lat_rads = _vector(radians(value) for value in lats)
+        return {
+            'built_at': built_at,
+            'ids': ids,
+            'lats': lats,
+            'lat_rads': lat_rads,
+            'lng_rads': _vector(radians(value) for value in lngs),
+            'cos_lats': _vector(cos(value) for value in lat_rads),
+        }
+    
+    def snapshot(self):
+        snapshot = self._snapshot
+        if self._is_fresh(snapshot):
+            return snapshot
+        with self._build_lock:
+            snapshot = self._snapshot
+            if self._is_fresh(snapshot):
+                return snapshot
+            generation = self._generation
+            snapshot = self._build()
+            with self._lock:
+                if self._generation == generation:
+                    self._snapshot = snapshot
+        return snapshot
+    
+    def nearby(self, lat, lng, radius_km, limit=None):
+        """Return [(shop_id, distance_km)] within radius_km of (lat, lng), nearest first"""
+        data = self.snapshot()
+        min_lat, max_lat, _, _ = bounding_box(lat, lng, radius_km)
+        start = bisect_left(data['lats'], min_lat)
+        end = bisect_right(data['lats'], max_lat)
+        if start >= end:
+            return []
+        
+        distances = haversine_many(
+            lat, lng,
+            data['lat_rads'][start:end],
+            data['lng_rads'][start:end],
+            data['cos_lats'][start:end],
+        )
+        ids = data['ids']
+        return [
+            (ids[start + position], float(distances[position]))
+            for position in nearest_within(distances, radius_km, limit)
+        ]
+
+
+shop_index = ShopCoordinateIndex()
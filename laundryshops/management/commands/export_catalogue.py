@@ -0,0 +1,26 @@
+import sys
+from django.core.management.base import BaseCommand
+from laundryshops import catalogue
+from laundryshops.models import LaundryService
+
+
+class Command(BaseCommand):
+    help = 'Export laundry services with offerings and hours as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', nargs='?', help='Output file, defaults to stdout')
+        parser.add_argument('--format', choices=catalogue.FORMATS, default=catalogue.NDJSON)
+        parser.add_argument('--vendor', help='Only export services owned by this vendor email')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        queryset = LaundryService.objects.all()
+        if options['vendor']:
+            queryset = queryset.filter(vendor__email=options['vendor'])
+
+        rows = catalogue.export_catalogue(queryset, options['format'], chunk_size=options['chunk_size'])
+        if options['path']:
+            with open(options['path'], 'w', newline='', encoding='utf-8') as output:
+                output.writelines(rows)
+        else:
+            sys.stdout.writelines(rows)
@@ -0,0 +1,36 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from accounts.models import User
+from laundryshops import catalogue
+
+
+class Command(BaseCommand):
+    help = 'Bulk import laundry services with offerings and hours from an NDJSON or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=catalogue.FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--vendor', help='Email of the vendor who will own the imported services')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or (catalogue.CSV if path.endswith('.csv') else catalogue.NDJSON)
+
+        vendor = None
+        if options['vendor']:
+            try:
+                vendor = User.objects.get(email=options['vendor'], user_type=User.UserType.VENDOR)
+            except User.DoesNotExist:
+                raise CommandError(f"Vendor {options['vendor']} not found")
+
+        with open(path, newline='', encoding='utf-8', errors='replace') as lines:
+            result = catalogue.import_catalogue(
+                catalogue.read_rows(lines, file_format), vendor=vendor, chunk_size=options['chunk_size']
+            )
+
+        for error in result['errors']:
+            self.stderr.write(f"Line {error['line']}: {json.dumps(error['errors'])}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} laundry services, {len(result['errors'])} rows failed"
+        ))
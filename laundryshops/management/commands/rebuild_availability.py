@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from laundryshops.availability import rebuild_availability
+
+
+class Command(BaseCommand):
+    help = 'Recompute open and pickup availability windows for all laundry services'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        processed = rebuild_availability(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt availability windows for {processed} laundry services'))
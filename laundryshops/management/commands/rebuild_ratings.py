@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from laundryshops.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recompute rating aggregates for all laundry services from their reviews'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        updated = rebuild_ratings(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {updated} laundry services'))
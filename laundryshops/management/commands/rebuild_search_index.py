@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from laundryshops.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the laundry service full-text search index'
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt search index using {type(backend).__name__}'))
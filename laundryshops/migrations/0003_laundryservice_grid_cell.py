@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:46
+
+from math import floor
+from django.db import migrations, models
+
+GRID_CELL_DEGREES = 0.1
+
+
+def grid_cell(latitude, longitude):
+    return floor(float(latitude) / GRID_CELL_DEGREES), floor(float(longitude) / GRID_CELL_DEGREES)
+
+
+def populate_grid_cells(apps, schema_editor):
+    LaundryService = apps.get_model('laundryshops', 'LaundryService')
+    services = list(LaundryService.objects.exclude(latitude=None).exclude(longitude=None))
+    for service in services:
+        service.grid_row, service.grid_col = grid_cell(service.latitude, service.longitude)
+    LaundryService.objects.bulk_update(services, ['grid_row', 'grid_col'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0002_laundryservice_vendor_review_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='laundryservice',
+            name='grid_col',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='laundryservice',
+            name='grid_row',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='laundryservice',
+            index=models.Index(fields=['grid_row', 'grid_col'], name='laundryshop_grid_idx'),
+        ),
+        migrations.RunPython(populate_grid_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:49
+
+from django.db import migrations, models
+from decimal import Decimal
+from django.db.models import Sum, Count
+
+
+def populate_rating_aggregates(apps, schema_editor):
+    LaundryService = apps.get_model('laundryshops', 'LaundryService')
+    Review = apps.get_model('laundryshops', 'Review')
+    totals = {
+        row['laundry_service']: (row['rating_sum'], row['review_count'])
+        for row in Review.objects.order_by().values('laundry_service').annotate(
+            rating_sum=Sum('rating'), review_count=Count('id')
+        )
+    }
+    services = list(LaundryService.objects.only('id', 'rating', 'rating_sum', 'total_reviews'))
+    for service in services:
+        service.rating_sum, service.total_reviews = totals.get(service.id, (0, 0))
+        if service.total_reviews:
+            service.rating = (Decimal(service.rating_sum) / service.total_reviews).quantize(Decimal('0.01'))
+        else:
+            service.rating = Decimal('0.00')
+    LaundryService.objects.bulk_update(services, ['rating', 'rating_sum', 'total_reviews'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0003_laundryservice_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='laundryservice',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_rating_aggregates, migrations.RunPython.noop),
+    ]
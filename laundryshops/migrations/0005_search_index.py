@@ -0,0 +1,35 @@
+from django.db import migrations
+
+SEARCH_COLUMNS = ['shop_name', 'description', 'address', 'district', 'state', 'zipcode']
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    columns = ', '.join(SEARCH_COLUMNS)
+    sources = ', '.join(f"COALESCE({column}, '')" for column in SEARCH_COLUMNS)
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS laundryshops_search USING fts5("
+        f"{columns}, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f"INSERT INTO laundryshops_search (rowid, {columns}) "
+        f"SELECT id, {sources} FROM laundryshops_laundryservice"
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS laundryshops_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0004_laundryservice_rating_sum'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='laundryservice',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['-rating', 'shop_name'], name='laundryshop_active_rating_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['laundry_service', '-created_at', '-id'], name='review_shop_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='review_user_created_idx'),
+        ),
+    ]
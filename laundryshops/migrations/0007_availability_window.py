@@ -0,0 +1,87 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def day_interval(day_of_week, start_time, end_time):
+    start = day_of_week * MINUTES_PER_DAY + start_time.hour * 60 + start_time.minute
+    end = day_of_week * MINUTES_PER_DAY + end_time.hour * 60 + end_time.minute
+    if end <= start:
+        end += MINUTES_PER_DAY
+    if end > MINUTES_PER_WEEK:
+        return [(start, MINUTES_PER_WEEK), (0, end - MINUTES_PER_WEEK)]
+    return [(start, end)]
+
+
+def merge_intervals(intervals):
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def shop_windows(pickup_start_time, pickup_end_time, hours):
+    open_intervals = []
+    open_days = set(range(7))
+    if hours:
+        open_days = set()
+        for hour in hours:
+            if hour.is_closed:
+                continue
+            open_days.add(hour.day_of_week)
+            open_intervals.extend(day_interval(hour.day_of_week, hour.opening_time, hour.closing_time))
+
+    pickup_intervals = []
+    for day in open_days:
+        pickup_intervals.extend(day_interval(day, pickup_start_time, pickup_end_time))
+
+    return {
+        'open': merge_intervals(open_intervals),
+        'pickup': merge_intervals(pickup_intervals),
+    }
+
+
+def populate_availability_windows(apps, schema_editor):
+    LaundryService = apps.get_model('laundryshops', 'LaundryService')
+    AvailabilityWindow = apps.get_model('laundryshops', 'AvailabilityWindow')
+    windows = [
+        AvailabilityWindow(laundry_service_id=shop.id, kind=kind, start_minute=start, end_minute=end)
+        for shop in LaundryService.objects.prefetch_related('operating_hours')
+        for kind, intervals in shop_windows(
+            shop.pickup_start_time, shop.pickup_end_time, shop.operating_hours.all()
+        ).items()
+        for start, end in intervals
+    ]
+    AvailabilityWindow.objects.bulk_create(windows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0006_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('open', 'Open'), ('pickup', 'Pickup')], max_length=10)),
+                ('start_minute', models.PositiveIntegerField()),
+                ('end_minute', models.PositiveIntegerField()),
+                ('laundry_service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability_windows', to='laundryshops.laundryservice')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'start_minute', 'end_minute'], name='availability_lookup_idx')],
+            },
+        ),
+        migrations.RunPython(populate_availability_windows, migrations.RunPython.noop),
+    ]
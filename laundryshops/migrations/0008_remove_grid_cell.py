@@ -0,0 +1,25 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:26
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0007_availability_window'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='laundryservice',
+            name='laundryshop_grid_idx',
+        ),
+        migrations.RemoveField(
+            model_name='laundryservice',
+            name='grid_col',
+        ),
+        migrations.RemoveField(
+            model_name='laundryservice',
+            name='grid_row',
+        ),
+    ]
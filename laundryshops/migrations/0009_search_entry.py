@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 00:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+import laundryshops.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('laundryshops', '0008_remove_grid_cell'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchEntry',
+            fields=[
+                ('laundry_service', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_entry', serialize=False, to='laundryshops.laundryservice')),
+                ('document', laundryshops.models.SearchDocumentField(db_column='laundryshops_search')),
+            ],
+            options={
+                'db_table': 'laundryshops_search',
+                'managed': False,
+            },
+        ),
+    ]
@@ -3,6 +3,35 @@ from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils.translation import gettext_lazy as _
 
+
+class LaundryServiceQuerySet(models.QuerySet):
+    def with_related(self, offerings=True, hours=True, reviews=True):
+        """Prefetch the nested sections a serializer renders so query count stays constant per page"""
+        lookups = []
+        if offerings:
+            lookups.append(models.Prefetch(
+                'service_offerings',
+                queryset=ServiceOffering.objects.select_related('service_type')
+            ))
+        if hours:
+            lookups.append('operating_hours')
+        if reviews:
+            lookups.append(models.Prefetch(
+                'reviews',
+                queryset=Review.objects.select_related('user')
+            ))
+        return self.prefetch_related(*lookups)
+    
+    def available_at(self, kind, minute):
+        """Shops with an availability window of the given kind covering minute-of-week"""
+        # Windows of one kind never overlap, so the join yields each shop at most once
+        return self.filter(
+            availability_windows__kind=kind,
+            availability_windows__start_minute__lte=minute,
+            availability_windows__end_minute__gt=minute
+        )
+
+
 class LaundryService(models.Model):
     """Main model for laundry service providers"""
     
@@ -50,14 +79,24 @@ class LaundryService(models.Model):
         validators=[MinValueValidator(0.00), MaxValueValidator(5.00)]
     )
     total_reviews = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0, editable=False)  # Sum of all review ratings
     
     # Status
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    objects = LaundryServiceQuerySet.as_manager()
+    
     class Meta:
         ordering = ['-rating', 'shop_name']
+        indexes = [
+            # Partial index: listings only ever read active shops
+            models.Index(
+                fields=['-rating', 'shop_name'], name='laundryshop_active_rating_idx',
+                condition=models.Q(is_active=True)
+            ),
+        ]
     
     def __str__(self):
         return self.shop_name
@@ -151,6 +190,75 @@ class Review(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['laundry_service', '-created_at', '-id'], name='review_shop_created_idx'),
+            models.Index(fields=['user', '-created_at', '-id'], name='review_user_created_idx'),
+        ]
     
     def __str__(self):
-        return f"{self.customer_name} - {self.laundry_service.shop_name} - {self.rating}"
\ No newline at end of file
+        return f"{self.customer_name} - {self.laundry_service.shop_name} - {self.rating}"
+
+
+class AvailabilityWindow(models.Model):
+    """
+    Precomputed weekly interval, in minutes from Monday 00:00 shop local time,
+    during which a shop is open or collects pickups. Derived from OperatingHour
+    and the shop's pickup times, see availability.py.
+    """
+    
+    class Kind(models.TextChoices):
+        OPEN = 'open', _('Open')
+        PICKUP = 'pickup', _('Pickup')
+    
+    laundry_service = models.ForeignKey(
+        LaundryService,
+        on_delete=models.CASCADE,
+        related_name='availability_windows'
+    )
+    kind = models.CharField(max_length=10, choices=Kind.choices)
+    start_minute = models.PositiveIntegerField()
+    end_minute = models.PositiveIntegerField()  # Exclusive
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'start_minute', 'end_minute'], name='availability_lookup_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.laundry_service_id} - {self.kind} {self.start_minute}-{self.end_minute}"
+
+
+class SearchDocumentField(models.TextField):
+    """The hidden column of an FTS5 table that is named after the table, matched against a whole row"""
+
+
+@SearchDocumentField.register_lookup
+class Match(models.Lookup):
+    lookup_name = 'match'
+    
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', [*lhs_params, *rhs_params]
+
+
+class SearchEntry(models.Model):
+    """
+    Row of the SQLite FTS5 search index, see search.py. The table is created by
+    migration 0005 and only exists on SQLite; its rowid is the shop id, so
+    searches join it to LaundryService instead of collecting matching ids first.
+    """
+    
+    laundry_service = models.OneToOneField(
+        LaundryService,
+        primary_key=True,
+        db_column='rowid',
+        db_constraint=False,
+        on_delete=models.DO_NOTHING,
+        related_name='search_entry'
+    )
+    document = SearchDocumentField(db_column='laundryshops_search')
+    
+    class Meta:
+        managed = False
+        db_table = 'laundryshops_search'
@@ -0,0 +1,85 @@
+"""
+Rating aggregation for laundry services.
+
+Each LaundryService keeps a running rating_sum and total_reviews that are
+adjusted with atomic F-expression updates whenever a review is written, so the
+average never needs to be recomputed from every review row.
+"""
+from decimal import Decimal
+from django.db.models import Case, When, F, Func, Value, Sum, Count, DecimalField
+from django.db.models.functions import Cast, Round
+from .models import LaundryService, Review
+
+
+class DecimalCast(Cast):
+    """
+    Cast to a decimal so the average is divided exactly on every backend. SQLite
+    keeps whole numbers as integers under NUMERIC and would divide them as such,
+    so it gets a REAL instead.
+    """
+    def __init__(self, expression):
+        super().__init__(expression, DecimalField(max_digits=12, decimal_places=2))
+    
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return Func.as_sql(self, compiler, connection, template='CAST(%(expressions)s AS REAL)', **extra_context)
+
+
+def _apply_delta(laundry_service_id, rating_delta, count_delta):
+    new_sum = F('rating_sum') + rating_delta
+    new_count = F('total_reviews') + count_delta
+    LaundryService.objects.filter(pk=laundry_service_id).update(
+        rating_sum=new_sum,
+        total_reviews=new_count,
+        rating=Case(
+            When(total_reviews__gt=-count_delta, then=Round(DecimalCast(new_sum) / new_count, 2)),
+            default=Value(0),
+            output_field=DecimalField(max_digits=3, decimal_places=2),
+        ),
+    )
+
+
+def review_added(review):
+    _apply_delta(review.laundry_service_id, review.rating, 1)
+
+
+def review_changed(review, previous_rating):
+    if review.rating != previous_rating:
+        _apply_delta(review.laundry_service_id, review.rating - previous_rating, 0)
+
+
+def review_removed(review):
+    _apply_delta(review.laundry_service_id, -review.rating, -1)
+
+
+def average_rating(rating_sum, review_count):
+    if not review_count:
+        return Decimal('0.00')
+    return (Decimal(rating_sum) / review_count).quantize(Decimal('0.01'))
+
+
+def rebuild_ratings(batch_size=500):
+    """Recompute every service's aggregates from its reviews. Returns the number of services updated."""
+    totals = {
+        row['laundry_service']: (row['rating_sum'], row['review_count'])
+        for row in Review.objects.order_by().values('laundry_service').annotate(
+            rating_sum=Sum('rating'), review_count=Count('id')
+        )
+    }
+    
+    updated = 0
+    batch = []
+    services = LaundryService.objects.only('id', 'rating', 'rating_sum', 'total_reviews')
+    for service in services.iterator(chunk_size=batch_size):
+        rating_sum, review_count = totals.get(service.id, (0, 0))
+        service.rating_sum = rating_sum
+        service.total_reviews = review_count
+        service.rating = average_rating(rating_sum, review_count)
+        batch.append(service)
+        if len(batch) >= batch_size:
+            LaundryService.objects.bulk_update(batch, ['rating', 'rating_sum', 'total_reviews'])
+            updated += len(batch)
+            batch = []
+    if batch:
+        LaundryService.objects.bulk_update(batch, ['rating', 'rating_sum', 'total_reviews'])
+        updated += len(batch)
+    return updated
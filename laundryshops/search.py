@@ -0,0 +1,131 @@
+"""
+Full-text search over laundry services.
+
+The backend is chosen by the LAUNDRY_SEARCH_BACKEND setting (a dotted path),
+defaulting to an SQLite FTS5 index on SQLite and to icontains filtering on
+other databases. Backends are kept in sync by the LaundryService signals.
+"""
+import re
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+# Columns indexed for search, in the order used by the FTS table
+SEARCH_COLUMNS = ['shop_name', 'description', 'address', 'district', 'state', 'zipcode']
+
+# Query parameter -> columns it searches
+FILTER_COLUMNS = {
+    'q': ['shop_name', 'description', 'address'],
+    'district': ['district'],
+    'state': ['state'],
+    'zipcode': ['zipcode'],
+    'city': ['district', 'address'],
+}
+
+
+class BaseSearchBackend:
+    def search(self, queryset, terms):
+        """
+        Filter queryset by the search terms, a dict of FILTER_COLUMNS keys to text.
+        Results are ordered by relevance when a general query ('q') is given.
+        """
+        raise NotImplementedError
+    
+    def index(self, services):
+        pass
+    
+    def remove(self, service_ids):
+        pass
+    
+    def rebuild(self):
+        pass
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """Substring matching with icontains, used where no full-text index is available"""
+    
+    def search(self, queryset, terms):
+        for key, text in terms.items():
+            condition = Q()
+            for column in FILTER_COLUMNS[key]:
+                condition |= Q(**{f'{column}__icontains': text})
+            queryset = queryset.filter(condition)
+        return queryset
+
+
+class SQLiteFTSSearchBackend(BaseSearchBackend):
+    """SQLite FTS5 index with prefix matching and bm25 ranking"""
+    table = 'laundryshops_search'
+    # bm25 column weights, in SEARCH_COLUMNS order: matches in the shop name rank highest
+    weights = (10.0, 1.0, 2.0, 3.0, 2.0, 1.0)
+    
+    @staticmethod
+    def match_expression(terms):
+        """Build an FTS5 MATCH expression with every token prefix-matched in its columns"""
+        clauses = []
+        for key, text in terms.items():
+            tokens = re.findall(r'\w+', text.lower())
+            if not tokens:
+                continue
+            columns = ' '.join(FILTER_COLUMNS[key])
+            phrase = ' AND '.join(f'"{token}"*' for token in tokens)
+            clauses.append(f'{{{columns}}} : ({phrase})')
+        return ' AND '.join(clauses)
+    
+    def search(self, queryset, terms):
+        expression = self.match_expression(terms)
+        if not expression:
+            # Only punctuation was given, which matches nothing
+            return queryset.none()
+        
+        # Joined on rowid, so matches are ranked and paginated in the same query
+        queryset = queryset.filter(search_entry__document__match=expression)
+        if 'q' in terms:
+            weights = ', '.join(str(weight) for weight in self.weights)
+            queryset = queryset.order_by(RawSQL(f'bm25({self.table}, {weights})', []), 'id')
+        return queryset
+    
+    def index(self, services):
+        rows = [
+            [service.id] + [getattr(service, column) or '' for column in SEARCH_COLUMNS]
+            for service in services
+        ]
+        placeholders = ', '.join(['%s'] * (len(SEARCH_COLUMNS) + 1))
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [[row[0]] for row in rows])
+            cursor.executemany(
+                f'INSERT INTO {self.table} (rowid, {", ".join(SEARCH_COLUMNS)}) VALUES ({placeholders})',
+                rows
+            )
+    
+    def remove(self, service_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.table} WHERE rowid = %s', [[pk] for pk in service_ids])
+    
+    def rebuild(self):
+        columns = ', '.join(SEARCH_COLUMNS)
+        sources = ', '.join(f"COALESCE({column}, '')" for column in SEARCH_COLUMNS)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            cursor.execute(
+                f'INSERT INTO {self.table} (rowid, {columns}) '
+                f'SELECT id, {sources} FROM laundryshops_laundryservice'
+            )
+
+
+_backend = None
+
+
+def get_search_backend():
+    global _backend
+    if _backend is None:
+        backend_path = getattr(settings, 'LAUNDRY_SEARCH_BACKEND', None)
+        if backend_path:
+            _backend = import_string(backend_path)()
+        elif connection.vendor == 'sqlite':
+            _backend = SQLiteFTSSearchBackend()
+        else:
+            _backend = LikeSearchBackend()
+    return _backend
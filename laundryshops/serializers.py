@@ -1,13 +1,62 @@
 from rest_framework import serializers
 from .models import LaundryService, ServiceType, ServiceOffering, OperatingHour, Review
 from django.contrib.auth.models import User
+from django.db import transaction
+from .signals import shop_children_changed
+
+def sync_children(model, laundry_service, existing, rows, key_field):
+    """
+    Make a shop's child rows match the submitted rows, matched on key_field.
+    Only new, changed and removed rows are written, with one bulk statement each.
+    Returns True if anything changed.
+    """
+    existing_by_key = {child.serializable_value(key_field): child for child in existing}
+    to_create = []
+    to_update = []
+    changed_fields = set()
+    
+    for data in rows:
+        key = data[key_field]
+        child = existing_by_key.pop(getattr(key, 'pk', key), None)
+        if child is None:
+            to_create.append(model(laundry_service=laundry_service, **data))
+            continue
+        fields = [
+            field for field, value in data.items()
+            if field != key_field and getattr(child, field) != value
+        ]
+        if fields:
+            for field in fields:
+                setattr(child, field, data[field])
+            changed_fields.update(fields)
+            to_update.append(child)
+    
+    if existing_by_key:
+        model.objects.filter(pk__in=[child.pk for child in existing_by_key.values()]).delete()
+    if to_update:
+        model.objects.bulk_update(to_update, sorted(changed_fields))
+    if to_create:
+        model.objects.bulk_create(to_create)
+    return bool(existing_by_key or to_update or to_create)
 
 class ServiceTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = ServiceType
         fields = '__all__'
 
+class ServiceTypeField(serializers.PrimaryKeyRelatedField):
+    """Resolves service types from context['service_types'] (pk -> ServiceType) when given"""
+    def to_internal_value(self, data):
+        service_types = self.context.get('service_types')
+        if service_types is None:
+            return super().to_internal_value(data)
+        try:
+            return service_types[int(data)]
+        except (KeyError, TypeError, ValueError):
+            self.fail('does_not_exist', pk_value=data)
+
 class ServiceOfferingSerializer(serializers.ModelSerializer):
+    service_type = ServiceTypeField(queryset=ServiceType.objects.all())
     service_type_name = serializers.CharField(source='service_type.name', read_only=True)
     
     class Meta:
@@ -46,19 +95,37 @@ class LaundryServiceSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['vendor', 'rating', 'total_reviews', 'created_at', 'updated_at']
     
+    def validate_service_offerings(self, value):
+        service_types = [offering['service_type'].pk for offering in value]
+        if len(service_types) != len(set(service_types)):
+            raise serializers.ValidationError("Each service type can only be offered once")
+        return value
+    
+    def validate_operating_hours(self, value):
+        days = [hour['day_of_week'] for hour in value]
+        if len(days) != len(set(days)):
+            raise serializers.ValidationError("Each day of the week can only be listed once")
+        return value
+    
     def create(self, validated_data):
         service_offerings_data = validated_data.pop('service_offerings', [])
         operating_hours_data = validated_data.pop('operating_hours', [])
         
-        laundry_service = LaundryService.objects.create(**validated_data)
-        
-        # Create service offerings
-        for offering_data in service_offerings_data:
-            ServiceOffering.objects.create(laundry_service=laundry_service, **offering_data)
-        
-        # Create operating hours
-        for hour_data in operating_hours_data:
-            OperatingHour.objects.create(laundry_service=laundry_service, **hour_data)
+        with transaction.atomic():
+            laundry_service = LaundryService.objects.create(**validated_data)
+            ServiceOffering.objects.bulk_create([
+                ServiceOffering(laundry_service=laundry_service, **offering_data)
+                for offering_data in service_offerings_data
+            ])
+            OperatingHour.objects.bulk_create([
+                OperatingHour(laundry_service=laundry_service, **hour_data)
+                for hour_data in operating_hours_data
+            ])
+            shop_children_changed(
+                laundry_service,
+                offerings=bool(service_offerings_data),
+                hours=bool(operating_hours_data)
+            )
         
         return laundry_service
     
@@ -66,25 +133,74 @@ class LaundryServiceSerializer(serializers.ModelSerializer):
         service_offerings_data = validated_data.pop('service_offerings', None)
         operating_hours_data = validated_data.pop('operating_hours', None)
         
-        # Update main fields
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
-        instance.save()
-        
-        # Update service offerings if provided
-        if service_offerings_data is not None:
-            # Delete existing offerings
-            instance.service_offerings.all().delete()
-            # Create new offerings
-            for offering_data in service_offerings_data:
-                ServiceOffering.objects.create(laundry_service=instance, **offering_data)
+        with transaction.atomic():
+            # Update main fields
+            for attr, value in validated_data.items():
+                setattr(instance, attr, value)
+            # Only the edited columns, so review aggregates updated since the shop was loaded are kept
+            instance.save(update_fields=[*validated_data, 'updated_at'])
+            
+            offerings_changed = hours_changed = False
+            if service_offerings_data is not None:
+                offerings_changed = sync_children(
+                    ServiceOffering, instance, instance.service_offerings.all(),
+                    service_offerings_data, 'service_type'
+                )
+            if operating_hours_data is not None:
+                hours_changed = sync_children(
+                    OperatingHour, instance, instance.operating_hours.all(),
+                    operating_hours_data, 'day_of_week'
+                )
+            shop_children_changed(instance, offerings=offerings_changed, hours=hours_changed)
         
-        # Update operating hours if provided
-        if operating_hours_data is not None:
-            # Delete existing hours
-            instance.operating_hours.all().delete()
-            # Create new hours
-            for hour_data in operating_hours_data:
-                OperatingHour.objects.create(laundry_service=instance, **hour_data)
-        
-        return instance
\ No newline at end of file
+        return instance
+
+class CatalogueSerializer(LaundryServiceSerializer):
+    """A shop with its offerings and hours, as used by bulk import and export"""
+    reviews = None
+    
+    class Meta(LaundryServiceSerializer.Meta):
+        fields = [
+            field for field in LaundryServiceSerializer.Meta.fields
+            if field not in ('id', 'vendor', 'rating', 'total_reviews', 'created_at', 'updated_at', 'reviews')
+        ]
+        # import_catalogue checks names for a whole chunk at once
+        extra_kwargs = {'shop_name': {'validators': []}}
+
+def get_expand(request):
+    """Return the nested sections requested via ?expand=offerings,hours,reviews"""
+    if request is None:
+        return set()
+    requested = request.query_params.get('expand', '')
+    return {name.strip() for name in requested.split(',')} & set(LaundryServiceSummarySerializer.EXPANDABLE_FIELDS)
+
+class LaundryServiceSummarySerializer(serializers.ModelSerializer):
+    """Compact shop representation for list endpoints; nested sections are opt-in"""
+    EXPANDABLE_FIELDS = {
+        'offerings': ('service_offerings', ServiceOfferingSerializer),
+        'hours': ('operating_hours', OperatingHourSerializer),
+        'reviews': ('reviews', ReviewSerializer),
+    }
+    
+    class Meta:
+        model = LaundryService
+        fields = [
+            'id', 'vendor', 'shop_name', 'phone_number', 'locationUrl',
+            'address', 'district', 'state', 'zipcode', 'latitude', 'longitude',
+            'pickup_start_time', 'pickup_end_time', 'delivery_start_time', 'delivery_end_time',
+            'rating', 'total_reviews', 'is_active'
+        ]
+        read_only_fields = fields
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for name in get_expand(self.context.get('request')):
+            field_name, serializer_class = self.EXPANDABLE_FIELDS[name]
+            self.fields[field_name] = serializer_class(many=True, read_only=True)
+
+class NearbyLaundryServiceSerializer(LaundryServiceSummarySerializer):
+    distance = serializers.FloatField(read_only=True)
+    
+    class Meta(LaundryServiceSummarySerializer.Meta):
+        fields = LaundryServiceSummarySerializer.Meta.fields + ['distance']
+        read_only_fields = fields
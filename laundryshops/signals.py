@@ -0,0 +1,115 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from accounts.models import User
+from .models import LaundryService, ServiceType, ServiceOffering, OperatingHour, Review
+from . import cache
+from .geo import shop_index
+from .search import get_search_backend
+from .autocomplete import autocomplete_index
+from .availability import refresh_availability
+
+
+@receiver([post_save, post_delete], sender=LaundryService)
+def refresh_shop_index(sender, **kwargs):
+    """Coordinates or active status may have changed, rebuild on the first lookup after commit"""
+    # Before commit, a rebuild on another connection would read the old rows and serve them as fresh
+    transaction.on_commit(shop_index.invalidate)
+
+
+@receiver(post_save, sender=LaundryService)
+def index_shop(sender, instance, **kwargs):
+    get_search_backend().index([instance])
+    # After commit, so a rolled back save never reaches the shared in-memory index
+    transaction.on_commit(lambda: autocomplete_index.update_shop(instance))
+
+
+@receiver(post_delete, sender=LaundryService)
+def unindex_shop(sender, instance, **kwargs):
+    get_search_backend().remove([instance.pk])
+    shop_id = instance.pk
+    transaction.on_commit(lambda: autocomplete_index.remove_shop(shop_id))
+
+
+def _bump_after_commit(*tags):
+    transaction.on_commit(lambda: cache.bump(*tags))
+
+
+def _refresh_availability_after_commit(shop_ids):
+    # After commit, so a shop deleted in the same transaction is skipped rather than re-referenced
+    transaction.on_commit(lambda: refresh_availability(shop_ids))
+
+
+@receiver(post_save, sender=LaundryService)
+def refresh_shop_availability(sender, instance, update_fields=None, **kwargs):
+    if update_fields is not None and not {'pickup_start_time', 'pickup_end_time'} & set(update_fields):
+        return
+    _refresh_availability_after_commit([instance.pk])
+
+
+@receiver([post_save, post_delete], sender=OperatingHour)
+def refresh_hour_availability(sender, instance, **kwargs):
+    _refresh_availability_after_commit([instance.laundry_service_id])
+
+
+def shop_children_changed(laundry_service, offerings=False, hours=False):
+    """
+    Notify derived state that a shop's offerings or hours were written in bulk.
+    bulk_create and bulk_update skip model signals, so bulk writers call this instead.
+    """
+    tags = []
+    if offerings:
+        tags.append(cache.OFFERINGS)
+    if hours:
+        tags.append(cache.HOURS)
+        _refresh_availability_after_commit([laundry_service.pk])
+    if tags:
+        _bump_after_commit(cache.shop_tag(laundry_service.pk), *tags)
+
+
+@receiver([post_save, post_delete], sender=LaundryService)
+def invalidate_shop_responses(sender, instance, **kwargs):
+    _bump_after_commit(cache.SHOPS, cache.shop_tag(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=ServiceOffering)
+def invalidate_offering_responses(sender, instance, **kwargs):
+    _bump_after_commit(cache.OFFERINGS, cache.shop_tag(instance.laundry_service_id))
+
+
+@receiver([post_save, post_delete], sender=OperatingHour)
+def invalidate_hour_responses(sender, instance, **kwargs):
+    _bump_after_commit(cache.HOURS, cache.shop_tag(instance.laundry_service_id))
+
+
+@receiver([post_save, post_delete], sender=Review)
+def invalidate_review_responses(sender, instance, **kwargs):
+    # Review writes also change the shop's rating aggregates
+    _bump_after_commit(cache.REVIEWS, cache.shop_tag(instance.laundry_service_id))
+
+
+@receiver(post_save, sender=User)
+def invalidate_reviewer_responses(sender, instance, created, update_fields=None, **kwargs):
+    """Cached reviews show the reviewer's email and phone number"""
+    if created:
+        return
+    if update_fields is not None and not {'email', 'country_code', 'phone_number'} & set(update_fields):
+        return
+    shop_ids = Review.objects.filter(user=instance).order_by().values_list('laundry_service_id', flat=True).distinct()
+    tags = [cache.shop_tag(shop_id) for shop_id in shop_ids]
+    if tags:
+        _bump_after_commit(cache.REVIEWS, *tags)
+
+
+@receiver([post_save, post_delete], sender=ServiceType)
+def invalidate_service_type_responses(sender, instance, **kwargs):
+    _bump_after_commit(cache.SERVICE_TYPES)
+
+
+def shops_created_in_bulk(shops):
+    """Bring derived state up to date after shops were inserted with bulk_create"""
+    get_search_backend().index(shops)
+    transaction.on_commit(shop_index.invalidate)
+    transaction.on_commit(autocomplete_index.invalidate)
+    _refresh_availability_after_commit([shop.pk for shop in shops])
+    _bump_after_commit(cache.SHOPS, cache.OFFERINGS, cache.HOURS)
@@ -1,3 +1,626 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import tempfile
+from array import array
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from math import cos, radians
+from unittest import mock, skipUnless
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from accounts.models import User
+from laundry_service.testing import QueryPlanAssertions
+from . import catalogue
+from .autocomplete import autocomplete_index
+from .availability import shop_windows, minute_of_week, MINUTES_PER_DAY, MINUTES_PER_WEEK
+from .cache import get_cache
+from .geo import EARTH_RADIUS_KM, ShopCoordinateIndex, haversine_many, nearest_within, shop_index
+from .models import LaundryService, ServiceType, ServiceOffering, OperatingHour, AvailabilityWindow, Review
+from .serializers import LaundryServiceSerializer, LaundryServiceSummarySerializer
 
-# Create your tests here.
+
+def create_shop(shop_name='Fresh Folds', **fields):
+    return LaundryService.objects.create(**{
+        'shop_name': shop_name, 'district': 'Pune', 'state': 'Maharashtra', 'zipcode': '411001',
+        'pickup_start_time': time(9), 'pickup_end_time': time(18),
+        'delivery_start_time': time(9), 'delivery_end_time': time(18),
+        **fields
+    })
+
+
+def api_client(user=None):
+    """API client authenticated as user, a new customer by default"""
+    if user is None:
+        user = User.objects.create_user(email='customer@example.com', user_type='customer')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+    return client
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite')
+class QueryPlanTests(QueryPlanAssertions, TestCase):
+    def test_active_services_use_rating_index(self):
+        queryset = LaundryService.objects.filter(is_active=True)
+        self.assertUsesIndex(queryset, 'laundryshop_active_rating_idx')
+        self.assertNoTempSort(queryset)
+
+    def test_availability_lookup_uses_index(self):
+        queryset = LaundryService.objects.available_at(AvailabilityWindow.Kind.OPEN, 600).order_by()
+        self.assertUsesIndex(queryset, 'availability_lookup_idx')
+
+    def test_shop_reviews_use_index(self):
+        queryset = Review.objects.filter(laundry_service_id=1).order_by('-created_at', '-id')
+        self.assertUsesIndex(queryset, 'review_shop_created_idx')
+        self.assertNoTempSort(queryset)
+
+    def test_user_reviews_use_index(self):
+        queryset = Review.objects.filter(user_id=1).order_by('-created_at', '-id')
+        self.assertUsesIndex(queryset, 'review_user_created_idx')
+        self.assertNoTempSort(queryset)
+
+
+class ShopListTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(email='customer@example.com', user_type='customer')
+        self.client = api_client(self.user)
+        self.wash = ServiceType.objects.create(name='Wash')
+
+    def create_shop(self, shop_name):
+        shop = create_shop(shop_name, description='Long text that lists do not need')
+        ServiceOffering.objects.create(laundry_service=shop, service_type=self.wash, price='50.00')
+        OperatingHour.objects.create(laundry_service=shop, day_of_week=0, opening_time=time(9), closing_time=time(18))
+        Review.objects.create(laundry_service=shop, user=self.user, customer_name='A', rating=4)
+        return shop
+
+    def list_shops(self, **params):
+        response = self.client.get('/api/laundry/services/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_list_returns_summaries(self):
+        self.create_shop('Fresh Folds')
+        [shop] = self.list_shops()
+        self.assertEqual(set(shop), set(LaundryServiceSummarySerializer.Meta.fields))
+        self.assertNotIn('description', shop)
+
+    def test_expand_adds_requested_sections(self):
+        self.create_shop('Fresh Folds')
+        [shop] = self.list_shops(expand='offerings,hours,unknown')
+        self.assertEqual(shop['service_offerings'][0]['service_type_name'], 'Wash')
+        self.assertEqual(shop['operating_hours'][0]['day_of_week'], 0)
+        self.assertNotIn('reviews', shop)
+        [shop] = self.list_shops(expand='reviews')
+        self.assertEqual(len(shop['reviews']), 1)
+        self.assertNotIn('service_offerings', shop)
+
+    def count_list_queries(self, **params):
+        get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.list_shops(**params)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_the_list(self):
+        self.create_shop('Shop 0')
+        self.list_shops()
+        baseline = self.count_list_queries(expand='offerings,hours,reviews')
+        for number in range(1, 5):
+            self.create_shop(f'Shop {number}')
+        self.assertEqual(self.count_list_queries(expand='offerings,hours,reviews'), baseline)
+        self.assertEqual(self.count_list_queries(), baseline - 3)
+
+    @override_settings(MAX_PAGE_SIZE=3)
+    def test_page_size_is_capped(self):
+        for number in range(5):
+            create_shop(f'Shop {number}')
+        response = self.client.get('/api/laundry/services/', {'page_size': 1000})
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(response.data['count'], 5)
+
+    def test_reviews_are_paged_newest_first(self):
+        shop = create_shop()
+        reviews = [
+            Review.objects.create(laundry_service=shop, user=self.user, customer_name=f'Customer {number}', rating=5)
+            for number in range(5)
+        ]
+        Review.objects.filter(pk=reviews[0].pk).update(created_at=reviews[0].created_at + timedelta(days=1))
+        expected = [reviews[0].pk] + [review.pk for review in reversed(reviews[1:])]
+
+        response = self.client.get(f'/api/laundry/services/{shop.pk}/reviews/', {'page_size': 2})
+        pages = [response.data['results']]
+        while response.data['next']:
+            response = self.client.get(response.data['next'])
+            pages.append(response.data['results'])
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual([review['id'] for page in pages for review in page], expected)
+
+
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(email='customer@example.com', user_type='customer')
+        self.client = api_client(self.user)
+        self.shop = create_shop()
+
+    def test_matching_etag_gets_not_modified(self):
+        response = self.client.get(f'/api/laundry/services/{self.shop.pk}/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(f'/api/laundry/services/{self.shop.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_writes_invalidate_after_commit(self):
+        etag = self.client.get(f'/api/laundry/services/{self.shop.pk}/')['ETag']
+        self.shop.shop_name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop.save()
+        response = self.client.get(f'/api/laundry/services/{self.shop.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['shop_name'], 'Renamed')
+
+    def test_reviewer_changes_invalidate_their_reviews(self):
+        Review.objects.create(laundry_service=self.shop, user=self.user, customer_name='A', rating=5)
+        url = f'/api/laundry/services/{self.shop.pk}/reviews/'
+        self.assertEqual(self.client.get(url).data['results'][0]['user_email'], 'customer@example.com')
+
+        # Saving fields that reviews do not show keeps the cached response
+        User.objects.filter(pk=self.user.pk).update(email='renamed@example.com')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save(update_fields=['last_login'])
+        self.assertEqual(self.client.get(url).data['results'][0]['user_email'], 'customer@example.com')
+
+        self.user.email = 'renamed@example.com'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertEqual(self.client.get(url).data['results'][0]['user_email'], 'renamed@example.com')
+
+
+class NestedChildrenTests(TestCase):
+    def setUp(self):
+        vendor = User.objects.create_user(email='vendor@example.com', user_type='vendor')
+        self.client = api_client(vendor)
+        self.shop = create_shop(vendor=vendor)
+        self.wash = ServiceType.objects.create(name='Wash')
+        self.iron = ServiceType.objects.create(name='Iron')
+        self.wash_offering = ServiceOffering.objects.create(laundry_service=self.shop, service_type=self.wash, price='50.00')
+        self.monday = OperatingHour.objects.create(
+            laundry_service=self.shop, day_of_week=0, opening_time=time(9), closing_time=time(18)
+        )
+        OperatingHour.objects.create(laundry_service=self.shop, day_of_week=1, opening_time=time(9), closing_time=time(18))
+
+    def patch(self, data):
+        return self.client.patch(f'/api/laundry/services/{self.shop.pk}/', data, format='json')
+
+    def test_children_are_added_updated_and_removed(self):
+        response = self.patch({
+            'service_offerings': [
+                {'service_type': self.wash.pk, 'price': '60.00'},
+                {'service_type': self.iron.pk, 'price': '20.00', 'unit': 'per kg'},
+            ],
+            'operating_hours': [{'day_of_week': 0, 'opening_time': '08:00', 'closing_time': '18:00'}],
+        })
+        self.assertEqual(response.status_code, 200)
+        offerings = {offering.service_type_id: offering for offering in self.shop.service_offerings.all()}
+        self.assertEqual(offerings[self.wash.pk].pk, self.wash_offering.pk)
+        self.assertEqual(offerings[self.wash.pk].price, Decimal('60.00'))
+        self.assertEqual(offerings[self.iron.pk].unit, 'per kg')
+        [hour] = self.shop.operating_hours.all()
+        self.assertEqual((hour.pk, hour.opening_time), (self.monday.pk, time(8)))
+
+    def test_omitted_children_are_kept(self):
+        response = self.patch({'description': 'Updated'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.shop.service_offerings.count(), 1)
+        self.assertEqual(self.shop.operating_hours.count(), 2)
+
+    def test_put_replaces_children(self):
+        data = self.client.get(f'/api/laundry/services/{self.shop.pk}/').data
+        data.pop('reviews')
+        data['service_offerings'] = []
+        data['operating_hours'] = [{'day_of_week': 6, 'opening_time': '10:00', 'closing_time': '14:00'}]
+        response = self.client.put(f'/api/laundry/services/{self.shop.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(self.shop.service_offerings.exists())
+        self.assertEqual(list(self.shop.operating_hours.values_list('day_of_week', flat=True)), [6])
+
+    def test_duplicate_children_are_rejected(self):
+        response = self.patch({'service_offerings': [
+            {'service_type': self.wash.pk, 'price': '60.00'},
+            {'service_type': self.wash.pk, 'price': '70.00'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('service_offerings', response.data)
+        response = self.patch({'operating_hours': [
+            {'day_of_week': 0, 'opening_time': '08:00', 'closing_time': '18:00'},
+            {'day_of_week': 0, 'opening_time': '10:00', 'closing_time': '12:00'},
+        ]})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('operating_hours', response.data)
+        self.assertEqual(self.shop.service_offerings.get().price, Decimal('50.00'))
+        self.assertEqual(self.shop.operating_hours.count(), 2)
+
+
+class CatalogueTests(TestCase):
+    def setUp(self):
+        self.vendor = User.objects.create_user(email='vendor@example.com', user_type='vendor')
+        self.client = api_client(self.vendor)
+        self.wash = ServiceType.objects.create(name='Wash')
+
+    def row(self, shop_name, **fields):
+        return {
+            'shop_name': shop_name, 'district': 'Pune', 'state': 'Maharashtra', 'zipcode': '411001',
+            'pickup_start_time': '09:00', 'pickup_end_time': '18:00',
+            'delivery_start_time': '09:00', 'delivery_end_time': '18:00',
+            'service_offerings': [{'service_type': self.wash.pk, 'price': '40.00'}],
+            'operating_hours': [{'day_of_week': 0, 'opening_time': '09:00', 'closing_time': '18:00'}],
+            **fields
+        }
+
+    def ndjson(self, *rows):
+        return ''.join(json.dumps(row) + '\n' for row in rows).encode()
+
+    def upload(self, body, content_type='application/x-ndjson'):
+        return self.client.generic('POST', '/api/laundry/services/import/', body, content_type=content_type)
+
+    def test_import_ndjson(self):
+        response = self.upload(self.ndjson(self.row('One'), self.row('Two'), self.row('One'), {'shop_name': 'Three'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual([error['line'] for error in response.data['errors']], [3, 4])
+        shop = LaundryService.objects.get(shop_name='Two')
+        self.assertEqual(shop.vendor, self.vendor)
+        self.assertEqual(shop.service_offerings.get().service_type, self.wash)
+        self.assertEqual(shop.operating_hours.get().day_of_week, 0)
+
+    def test_import_csv(self):
+        output = io.StringIO()
+        writer = csv.DictWriter(output, fieldnames=list(self.row('One')))
+        writer.writeheader()
+        for name in ('One', 'Two'):
+            row = self.row(name)
+            writer.writerow({
+                key: json.dumps(value) if key in ('service_offerings', 'operating_hours') else value
+                for key, value in row.items()
+            })
+        response = self.upload(output.getvalue().encode(), content_type='text/csv')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(ServiceOffering.objects.filter(laundry_service__vendor=self.vendor).count(), 2)
+
+    def test_invalid_utf8_rows_are_reported(self):
+        body = self.ndjson(self.row('One')) + b'{"shop_name": "Caf\xe9"}\n' + self.ndjson(self.row('Two'))
+        response = self.upload(body)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'], [{'line': 2, 'errors': 'Invalid UTF-8'}])
+        self.assertEqual(self.upload(b'\xff\xfe\n').status_code, 400)
+
+    def test_existing_names_are_rejected_per_row(self):
+        create_shop('One')
+        response = self.upload(self.ndjson(self.row('One'), self.row('Two')))
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(response.data['errors'][0]['line'], 1)
+        self.assertIn('shop_name', response.data['errors'][0]['errors'])
+
+    def test_conflicting_chunk_falls_back_to_row_inserts(self):
+        create_shop('Two')
+        # A shop created between the name check and the insert
+        with mock.patch('laundryshops.catalogue._existing_names', return_value=set()):
+            result = catalogue.import_catalogue(
+                catalogue.read_rows(self.ndjson(self.row('One'), self.row('Two'), self.row('Three')).decode().splitlines(), catalogue.NDJSON),
+                vendor=self.vendor
+            )
+        self.assertEqual(result['created'], 2)
+        self.assertEqual([error['line'] for error in result['errors']], [2])
+        self.assertEqual(LaundryService.objects.filter(vendor=self.vendor).count(), 2)
+
+    def test_import_query_count_does_not_grow_with_rows(self):
+        def import_queries(names):
+            rows = [(number, self.row(name), None) for number, name in enumerate(names, 1)]
+            with CaptureQueriesContext(connection) as queries:
+                result = catalogue.import_catalogue(rows, vendor=self.vendor)
+            self.assertEqual(result['created'], len(names))
+            return len(queries)
+
+        self.assertEqual(import_queries([f'A{number}' for number in range(4)]), import_queries([f'B{number}' for number in range(8)]))
+
+    def test_export_round_trip(self):
+        self.upload(self.ndjson(self.row('One', description='Steam'), self.row('Two')))
+        response = self.client.get('/api/laundry/services/export/', {'file_format': 'csv'})
+        self.assertEqual(response.status_code, 200)
+        body = b''.join(response.streaming_content)
+        LaundryService.objects.all().delete()
+
+        response = self.upload(body, content_type='text/csv')
+        self.assertEqual((response.data['created'], response.data['errors']), (2, []))
+        shop = LaundryService.objects.get(shop_name='One')
+        self.assertEqual(shop.description, 'Steam')
+        self.assertEqual(shop.service_offerings.get().price, Decimal('40.00'))
+
+    def test_management_commands(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'shops.ndjson')
+            with open(source, 'wb') as output:
+                output.write(self.ndjson(self.row('One'), self.row('Two')) + b'\xff\n')
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('import_catalogue', source, vendor='vendor@example.com', stdout=stdout, stderr=stderr)
+            self.assertIn('Imported 2 laundry services, 1 rows failed', stdout.getvalue())
+            self.assertIn('Line 3: "Invalid UTF-8"', stderr.getvalue())
+
+            exported = os.path.join(directory, 'export.ndjson')
+            call_command('export_catalogue', exported, vendor='vendor@example.com')
+            with open(exported) as lines:
+                self.assertEqual([json.loads(line)['shop_name'] for line in lines], ['One', 'Two'])
+
+
+class RatingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='customer@example.com', user_type='customer')
+        self.client = api_client(self.user)
+        self.shop = create_shop()
+
+    def add_review(self, rating):
+        response = self.client.post(
+            f'/api/laundry/services/{self.shop.pk}/add-review/', {'customer_name': 'A', 'rating': rating}
+        )
+        self.assertEqual(response.status_code, 201)
+        return response.data['id']
+
+    def assertRating(self, rating_sum, total_reviews, rating):
+        self.shop.refresh_from_db()
+        self.assertEqual((self.shop.rating_sum, self.shop.total_reviews, self.shop.rating), (rating_sum, total_reviews, Decimal(rating)))
+
+    def test_rating_follows_review_writes(self):
+        first = self.add_review(5)
+        self.add_review(4)
+        second = self.add_review(4)
+        self.assertRating(13, 3, '4.33')
+
+        response = self.client.patch(f'/api/laundry/reviews/{first}/', {'rating': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertRating(10, 3, '3.33')
+
+        self.assertEqual(self.client.delete(f'/api/laundry/reviews/{second}/').status_code, 204)
+        self.assertRating(6, 2, '3.00')
+
+    def test_rating_rounds_half_up_and_resets_without_reviews(self):
+        ids = [self.add_review(rating) for rating in (1, 2, 2, 2, 2, 2, 2, 2)]
+        self.assertRating(15, 8, '1.88')
+        for review_id in ids:
+            self.client.delete(f'/api/laundry/reviews/{review_id}/')
+        self.assertRating(0, 0, '0.00')
+
+    def test_shop_edits_keep_concurrent_review_aggregates(self):
+        loaded = LaundryService.objects.get(pk=self.shop.pk)
+        self.add_review(4)
+        serializer = LaundryServiceSerializer(loaded, data={'description': 'Updated'}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertRating(4, 1, '4.00')
+        self.assertEqual(self.shop.description, 'Updated')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'The full-text index is SQLite FTS5')
+class SearchTests(TestCase):
+    def setUp(self):
+        self.client = api_client()
+
+    def search(self, **params):
+        response = self.client.get('/api/laundry/services/search/', params)
+        self.assertEqual(response.status_code, 200)
+        return [shop['shop_name'] for shop in response.data['results']]
+
+    def test_name_matches_rank_first(self):
+        create_shop('Corner Laundry', description='Steam ironing next door')
+        create_shop('Steam Press', description='Pressing')
+        create_shop('Quick Wash', description='Washing')
+        self.assertEqual(self.search(q='steam'), ['Steam Press', 'Corner Laundry'])
+
+    def test_words_are_prefix_matched(self):
+        create_shop('Dry Cleaning Centre', district='Delhi', state='Delhi')
+        create_shop('Dryden Laundry', district='Pune')
+        self.assertEqual(self.search(q='dry cle'), ['Dry Cleaning Centre'])
+        self.assertEqual(self.search(q='dry', city='del'), ['Dry Cleaning Centre'])
+
+    def test_query_without_words_matches_nothing(self):
+        create_shop()
+        self.assertEqual(self.search(q='--'), [])
+
+    def test_results_are_paginated_in_rank_order(self):
+        for number in range(5):
+            create_shop(f'Shop {number}', description='steam ' * number)
+        response = self.client.get('/api/laundry/services/search/', {'q': 'steam', 'page_size': 2})
+        self.assertEqual(response.data['count'], 4)
+        names = [shop['shop_name'] for shop in response.data['results']]
+        names += [shop['shop_name'] for shop in self.client.get(response.data['next']).data['results']]
+        self.assertEqual(names, ['Shop 4', 'Shop 3', 'Shop 2', 'Shop 1'])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        autocomplete_index.invalidate()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop = create_shop(district='Nashik', address='12 College Road')
+        self.assertEqual(autocomplete_index.suggest('districts', 'nas'), ['Nashik'])
+
+    def test_saved_shops_are_suggested_without_a_rebuild(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            create_shop('Second', district='Nasik Road')
+            self.shop.district = 'Nagpur'
+            self.shop.save()
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete_index.suggest('districts', 'na'), ['Nagpur', 'Nasik Road'])
+            self.assertEqual(autocomplete_index.suggest('addresses', 'coll')[0]['district'], 'Nagpur')
+
+    def test_inactive_and_deleted_shops_are_dropped(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            second = create_shop('Second', district='Nashik')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shop.is_active = False
+            self.shop.save()
+            second.delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete_index.suggest('districts', 'nas'), [])
+
+    def test_rolled_back_saves_are_not_suggested(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                create_shop('Second', district='Nanded')
+                raise ValueError
+        self.assertEqual(autocomplete_index.suggest('districts', 'nan'), [])
+
+    def test_address_search_misses_stay_in_memory(self):
+        with self.assertNumQueries(0):
+            response = APIClient().get('/api/laundry/address-search/', {'q': 'xyz'})
+        self.assertEqual(response.data['results'], {'districts': [], 'states': [], 'cities': [], 'addresses': []})
+
+    def test_address_search_reads_the_database_while_the_index_is_built(self):
+        autocomplete_index.invalidate()
+        with autocomplete_index._build_lock:
+            # One query each for districts (shared with cities), states and addresses
+            with self.assertNumQueries(3):
+                response = APIClient().get('/api/laundry/address-search/', {'q': 'ashi'})
+        results = response.data['results']
+        self.assertEqual((results['districts'], results['cities']), (['Nashik'], ['Nashik']))
+
+    def test_lookups_keep_their_snapshot_during_updates(self):
+        snapshot = autocomplete_index._current()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_shop('Second', district='Nanded')
+        self.assertEqual(snapshot.districts.lookup('nan', 10), [])
+        self.assertEqual(autocomplete_index.suggest('districts', 'nan'), ['Nanded'])
+
+
+class NearbyTests(TestCase):
+    def setUp(self):
+        shop_index.invalidate()
+        self.client = api_client()
+
+    def nearby(self, radius, **params):
+        response = self.client.get('/api/laundry/services/nearby/', {'lat': 28.6, 'lng': 77.2, 'radius': radius, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['results']
+
+    def test_results_sorted_by_distance_within_radius(self):
+        far = create_shop('Far', latitude='28.690000', longitude='77.200000')
+        near = create_shop('Near', latitude='28.610000', longitude='77.200000')
+        create_shop('Closed', latitude='28.600000', longitude='77.200000', is_active=False)
+        create_shop('Elsewhere', latitude='19.070000', longitude='72.870000')
+
+        results = self.nearby(50)
+        self.assertEqual([shop['id'] for shop in results], [near.id, far.id])
+        self.assertAlmostEqual(results[0]['distance'], 1.11, places=2)
+        self.assertEqual([shop['id'] for shop in self.nearby(50, limit=1)], [near.id])
+
+    def test_radius_boundary_is_inclusive(self):
+        shop = create_shop('Edge', latitude='28.690000', longitude='77.200000')
+        # Due north, so the great-circle distance is the latitude difference
+        distance = EARTH_RADIUS_KM * radians(0.09)
+        self.assertEqual([result['id'] for result in self.nearby(distance + 1e-9)], [shop.id])
+        self.assertEqual(self.nearby(distance - 1e-6), [])
+
+    def test_availability_filter_applies_before_the_limit(self):
+        shops = []
+        with self.captureOnCommitCallbacks(execute=True):
+            # The nearest shop only collects in the evening
+            for name, latitude, pickup_start in (('Near', '28.61', time(19)), ('Middle', '28.62', time(9)), ('Far', '28.63', time(9))):
+                shop = create_shop(
+                    name, latitude=latitude, longitude='77.2', pickup_start_time=pickup_start, pickup_end_time=time(20)
+                )
+                OperatingHour.objects.create(laundry_service=shop, day_of_week=0, opening_time=time(8), closing_time=time(21))
+                shops.append(shop)
+        near, middle, far = shops
+        monday_noon = '2026-10-19T12:00:00'
+        self.assertEqual([shop['id'] for shop in self.nearby(10, pickup_at=monday_noon)], [middle.id, far.id])
+        self.assertEqual([shop['id'] for shop in self.nearby(10, pickup_at=monday_noon, limit=1)], [middle.id])
+
+    def test_index_follows_shop_changes(self):
+        shop = create_shop('Moving', latitude='28.610000', longitude='77.200000')
+        self.assertEqual(len(self.nearby(5)), 1)
+        shop.latitude = '19.070000'
+        with self.captureOnCommitCallbacks(execute=True):
+            shop.save()
+            # Invalidated once the save commits, not while other connections still read the old row
+            self.assertEqual(len(self.nearby(5)), 1)
+        self.assertEqual(self.nearby(5), [])
+
+
+class DistanceEngineTests(TestCase):
+    def test_batch_distances(self):
+        points = [(28.6, 77.2), (28.7, 77.2), (19.07, 72.87)]
+        distances = haversine_many(
+            28.6, 77.2,
+            [radians(lat) for lat, _ in points],
+            [radians(lng) for _, lng in points],
+            [cos(radians(lat)) for lat, _ in points],
+        )
+        self.assertAlmostEqual(distances[0], 0)
+        self.assertAlmostEqual(distances[1], EARTH_RADIUS_KM * radians(0.1))
+        # Delhi to Mumbai
+        self.assertAlmostEqual(distances[2], 1150, delta=10)
+
+    def test_top_k_selection(self):
+        distances = array('d', [5.0, 1.0, 12.0, 3.0, 1.0, 7.0])
+        self.assertEqual(nearest_within(distances, 10), [1, 4, 3, 0, 5])
+        self.assertEqual(nearest_within(distances, 10, limit=3), [1, 4, 3])
+        self.assertEqual(nearest_within(distances, 0.5), [])
+
+    def test_index_is_built_once_until_invalidated(self):
+        create_shop('Near', latitude='28.610000', longitude='77.200000')
+        index = ShopCoordinateIndex()
+        index.nearby(28.6, 77.2, 5)
+        with self.assertNumQueries(0):
+            self.assertEqual(len(index.nearby(28.6, 77.2, 5)), 1)
+        create_shop('Nearer', latitude='28.600000', longitude='77.200000')
+        index.invalidate()
+        with self.assertNumQueries(1):
+            self.assertEqual(len(index.nearby(28.6, 77.2, 5)), 2)
+
+    def test_rebuild_racing_an_invalidation_is_not_kept(self):
+        create_shop('Near', latitude='28.610000', longitude='77.200000')
+        index = ShopCoordinateIndex()
+        build = index._build
+
+        def racing_build():
+            data = build()
+            # A shop change commits while the rows are being read
+            index.invalidate()
+            return data
+        with mock.patch.object(index, '_build', side_effect=racing_build):
+            self.assertEqual(len(index.nearby(28.6, 77.2, 5)), 1)
+        with self.assertNumQueries(1):
+            index.nearby(28.6, 77.2, 5)
+
+
+class AvailabilityTests(TestCase):
+    def create_shop(self):
+        return create_shop()
+
+    def test_overnight_hours_wrap_past_sunday(self):
+        hours = [OperatingHour(day_of_week=6, opening_time=time(22), closing_time=time(2))]
+        windows = shop_windows(time(9), time(18), hours)
+        self.assertEqual(windows[AvailabilityWindow.Kind.OPEN], [(0, 120), (6 * MINUTES_PER_DAY + 1320, MINUTES_PER_WEEK)])
+        self.assertEqual(windows[AvailabilityWindow.Kind.PICKUP], [(6 * MINUTES_PER_DAY + 540, 6 * MINUTES_PER_DAY + 1080)])
+
+    def test_windows_follow_operating_hours(self):
+        shop = self.create_shop()
+        with self.captureOnCommitCallbacks(execute=True):
+            hour = OperatingHour.objects.create(
+                laundry_service=shop, day_of_week=0, opening_time=time(8), closing_time=time(20)
+            )
+        monday_noon = minute_of_week(datetime(2026, 10, 19, 12))
+        self.assertTrue(LaundryService.objects.available_at(AvailabilityWindow.Kind.OPEN, monday_noon).exists())
+        self.assertFalse(LaundryService.objects.available_at(AvailabilityWindow.Kind.OPEN, monday_noon + MINUTES_PER_DAY).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            hour.is_closed = True
+            hour.save()
+        self.assertFalse(LaundryService.objects.available_at(AvailabilityWindow.Kind.OPEN, monday_noon).exists())
+        self.assertFalse(LaundryService.objects.available_at(AvailabilityWindow.Kind.PICKUP, monday_noon).exists())
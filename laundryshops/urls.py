@@ -14,6 +14,8 @@ from .views import (
     LaundryServiceNearbyView,
     AddReviewView,
     VendorServicesListView,
+    CatalogueImportView,
+    CatalogueExportView,
     address_search
 )
 
@@ -23,6 +25,8 @@ urlpatterns = [
     path('services/<int:pk>/', LaundryServiceDetailView.as_view(), name='service_detail'),
     path('services/search/', LaundryServiceSearchView.as_view(), name='service_search'),
     path('services/nearby/', LaundryServiceNearbyView.as_view(), name='service_nearby'),
+    path('services/import/', CatalogueImportView.as_view(), name='service_import'),
+    path('services/export/', CatalogueExportView.as_view(), name='service_export'),
     path('services/<int:pk>/add-review/', AddReviewView.as_view(), name='add_review'),
     path('services/<int:pk>/reviews/', ReviewListCreateView.as_view(), name='service_reviews'),
     
@@ -1,13 +1,24 @@
 from rest_framework import generics, status, permissions, filters
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
+from rest_framework.views import APIView
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.db import transaction
 from django.db.models import Q
 from .models import LaundryService, ServiceType, ServiceOffering, OperatingHour, Review
 from .serializers import (
-    LaundryServiceSerializer, ServiceTypeSerializer, 
-    ServiceOfferingSerializer, OperatingHourSerializer, ReviewSerializer
+    LaundryServiceSerializer, LaundryServiceSummarySerializer, NearbyLaundryServiceSerializer, ServiceTypeSerializer, 
+    ServiceOfferingSerializer, OperatingHourSerializer, ReviewSerializer, get_expand
 )
+from .geo import shop_index
+from . import ratings
+from .search import FILTER_COLUMNS, get_search_backend
+from .autocomplete import autocomplete_index
+from . import catalogue
+from .availability import requested_window
+from .cache import CachedResponseMixin, cache_response, shop_tag, SHOPS, OFFERINGS, HOURS, REVIEWS, SERVICE_TYPES
+from laundry_service.pagination import CreatedAtCursorPagination
 
 class IsVendor(permissions.BasePermission):
     """Permission class to check if user is a vendor"""
@@ -23,68 +34,146 @@ class IsVendorOwner(permissions.BasePermission):
             return True
         return obj.vendor == request.user
 
+class AvailabilityFilterMixin:
+    """Filter shops by ?open_now=true or ?pickup_at=<ISO datetime> using precomputed windows"""
+    def filter_availability(self, queryset):
+        try:
+            window = requested_window(self.request.query_params)
+        except ValueError:
+            return queryset.none()
+        if window is None:
+            return queryset
+        return queryset.available_at(*window)
+
+class ShopPrefetchMixin:
+    """Prefetch only the nested sections the view's serializer will render"""
+    def with_related(self, queryset):
+        if issubclass(self.get_serializer_class(), LaundryServiceSummarySerializer):
+            expand = get_expand(self.request)
+            return queryset.with_related(
+                offerings='offerings' in expand,
+                hours='hours' in expand,
+                reviews='reviews' in expand
+            )
+        return queryset.with_related()
+
 # Laundry Service Views
-class LaundryServiceListCreateView(generics.ListCreateAPIView):
-    queryset = LaundryService.objects.filter(is_active=True)
+class LaundryServiceListCreateView(CachedResponseMixin, AvailabilityFilterMixin, ShopPrefetchMixin, generics.ListCreateAPIView):
     serializer_class = LaundryServiceSerializer
+    cache_tags = (SHOPS, OFFERINGS, HOURS, REVIEWS, SERVICE_TYPES)
     permission_classes = [IsVendor]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['shop_name', 'district', 'state', 'zipcode']
     ordering_fields = ['rating', 'shop_name', 'created_at']
     
+    def get_serializer_class(self):
+        if self.request.method == 'GET':
+            return LaundryServiceSummarySerializer
+        return LaundryServiceSerializer
+    
+    def get_cache_tags(self):
+        # open_now depends on the clock, not only on the data the tags track
+        if 'open_now' in self.request.query_params:
+            return None
+        return self.cache_tags
+    
+    def get_queryset(self):
+        queryset = self.filter_availability(LaundryService.objects.filter(is_active=True))
+        return self.with_related(queryset)
+    
     def perform_create(self, serializer):
         serializer.save(vendor=self.request.user)
 
-class LaundryServiceDetailView(generics.RetrieveUpdateDestroyAPIView):
-    queryset = LaundryService.objects.all()
+class LaundryServiceDetailView(CachedResponseMixin, ShopPrefetchMixin, generics.RetrieveUpdateDestroyAPIView):
     serializer_class = LaundryServiceSerializer
     permission_classes = [IsVendorOwner]
+    
+    def get_cache_tags(self):
+        return (shop_tag(self.kwargs['pk']), SERVICE_TYPES)
+    
+    def get_queryset(self):
+        return self.with_related(LaundryService.objects.all())
 
-class VendorServicesListView(generics.ListAPIView):
+class VendorServicesListView(ShopPrefetchMixin, generics.ListAPIView):
     """List all services owned by the authenticated vendor"""
-    serializer_class = LaundryServiceSerializer
+    serializer_class = LaundryServiceSummarySerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_queryset(self):
-        return LaundryService.objects.filter(vendor=self.request.user)
+        return self.with_related(LaundryService.objects.filter(vendor=self.request.user))
 
-class LaundryServiceSearchView(generics.ListAPIView):
-    serializer_class = LaundryServiceSerializer
+class CatalogueImportView(APIView):
+    """
+    Bulk create services for the authenticated vendor from an NDJSON or CSV body.
+    Content-Type text/csv selects CSV, anything else is read as NDJSON.
+    """
+    permission_classes = [permissions.IsAuthenticated, IsVendor]
     
-    def get_queryset(self):
-        queryset = LaundryService.objects.filter(is_active=True)
-        query = self.request.query_params.get('q', '')
-        district = self.request.query_params.get('district', '')
-        state = self.request.query_params.get('state', '')
-        zipcode = self.request.query_params.get('zipcode', '')
-        city = self.request.query_params.get('city', '')
+    def post(self, request):
+        file_format = catalogue.CSV if request.content_type.startswith('text/csv') else catalogue.NDJSON
+        # Read the body line by line instead of parsing it into request.data
+        lines = (line.decode('utf-8', errors='replace') for line in request.stream or [])
+        result = catalogue.import_catalogue(catalogue.read_rows(lines, file_format), vendor=request.user)
         
-        if query:
-            queryset = queryset.filter(
-                Q(shop_name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(address__icontains=query)
-            )
-        
-        if district:
-            queryset = queryset.filter(district__icontains=district)
+        if result['errors'] and not result['created']:
+            return Response({'status': 'error', **result}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'status': 'success', **result}, status=status.HTTP_200_OK)
+
+class CatalogueExportView(APIView):
+    """Stream the vendor's services (all services for staff) as NDJSON or CSV"""
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        file_format = request.query_params.get('file_format', catalogue.NDJSON)
+        if file_format not in catalogue.FORMATS:
+            return Response({
+                'status': 'error',
+                'message': f'file_format must be one of: {", ".join(catalogue.FORMATS)}'
+            }, status=status.HTTP_400_BAD_REQUEST)
         
-        if state:
-            queryset = queryset.filter(state__icontains=state)
+        queryset = LaundryService.objects.all()
+        if not request.user.is_staff:
+            queryset = queryset.filter(vendor=request.user)
         
-        if zipcode:
-            queryset = queryset.filter(zipcode__icontains=zipcode)
+        response = StreamingHttpResponse(
+            catalogue.export_catalogue(queryset, file_format),
+            content_type=catalogue.CONTENT_TYPES[file_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="catalogue.{file_format}"'
+        return response
+
+class LaundryServiceSearchView(ShopPrefetchMixin, generics.ListAPIView):
+    serializer_class = LaundryServiceSummarySerializer
+    
+    def get_queryset(self):
+        queryset = LaundryService.objects.filter(is_active=True)
+        terms = {}
+        for param in FILTER_COLUMNS:
+            value = self.request.query_params.get(param, '').strip()
+            if value:
+                terms[param] = value
         
-        if city:
-            queryset = queryset.filter(
-                Q(district__icontains=city) |
-                Q(address__icontains=city)
-            )
+        if terms:
+            queryset = get_search_backend().search(queryset, terms)
         
-        return queryset
+        return self.with_related(queryset)
+
+def search_addresses_db(column, query):
+    """Substring search over active services for 'district', 'state' or 'address' values"""
+    services = LaundryService.objects.filter(is_active=True)
+    
+    if column in ['district', 'state']:
+        return list(services.filter(
+            **{f'{column}__icontains': query}
+        ).order_by(column).values_list(column, flat=True).distinct()[:10])
+    
+    return list(services.filter(
+        address__icontains=query
+    ).order_by('address').values('address', 'district', 'state', 'zipcode').distinct()[:10])
 
 @api_view(['GET'])
 @permission_classes([permissions.AllowAny])
+@cache_response(SHOPS)
 def address_search(request):
     """
     Search for unique addresses, cities, states, and districts
@@ -106,31 +195,23 @@ def address_search(request):
         'addresses': []
     }
     
-    services = LaundryService.objects.filter(is_active=True)
-    
-    if search_type in ['all', 'district']:
-        districts = services.filter(
-            district__icontains=query
-        ).values_list('district', flat=True).distinct()[:10]
-        results['districts'] = list(districts)
-    
-    if search_type in ['all', 'state']:
-        states = services.filter(
-            state__icontains=query
-        ).values_list('state', flat=True).distinct()[:10]
-        results['states'] = list(states)
-    
-    if search_type in ['all', 'city']:
-        cities = services.filter(
-            Q(district__icontains=query)
-        ).values_list('district', flat=True).distinct()[:10]
-        results['cities'] = list(cities)
-    
-    if search_type in ['all', 'address']:
-        addresses = services.filter(
-            address__icontains=query
-        ).values('address', 'district', 'state', 'zipcode').distinct()[:10]
-        results['addresses'] = list(addresses)
+    # Cities are matched against districts
+    categories = {
+        'district': ('districts', 'district'),
+        'state': ('states', 'state'),
+        'city': ('cities', 'district'),
+        'address': ('addresses', 'address'),
+    }
+    fallback = {}
+    for category, (result_key, column) in categories.items():
+        if search_type in ['all', category]:
+            # Served from the in-memory prefix index; the database is only read while it is being built
+            suggestions = autocomplete_index.suggest(result_key, query)
+            if suggestions is None:
+                if column not in fallback:
+                    fallback[column] = search_addresses_db(column, query)
+                suggestions = fallback[column]
+            results[result_key] = suggestions
     
     return Response({
         'status': 'success',
@@ -138,13 +219,16 @@ def address_search(request):
         'results': results
     })
 
-class LaundryServiceNearbyView(generics.ListAPIView):
-    serializer_class = LaundryServiceSerializer
+class LaundryServiceNearbyView(AvailabilityFilterMixin, ShopPrefetchMixin, generics.ListAPIView):
+    serializer_class = NearbyLaundryServiceSerializer
+    default_limit = 50
+    max_limit = 500
     
     def get_queryset(self):
         lat = self.request.query_params.get('lat')
         lng = self.request.query_params.get('lng')
         radius = self.request.query_params.get('radius', 10)
+        limit = self.request.query_params.get('limit', self.default_limit)
         
         if not lat or not lng:
             return LaundryService.objects.none()
@@ -153,29 +237,31 @@ class LaundryServiceNearbyView(generics.ListAPIView):
             lat = float(lat)
             lng = float(lng)
             radius = float(radius)
+            limit = min(max(int(limit), 1), self.max_limit)
         except ValueError:
             return LaundryService.objects.none()
         
-        # Simple distance calculation
-        from math import radians, sin, cos, sqrt, atan2
-        
-        def calculate_distance(lat1, lon1, lat2, lon2):
-            R = 6371
-            lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
-            dlat = lat2 - lat1
-            dlon = lon2 - lon1
-            a = sin(dlat/2)**2 + cos(lat1) * cos(lat2) * sin(dlon/2)**2
-            c = 2 * atan2(sqrt(a), sqrt(1-a))
-            return R * c
+        # Distances for all candidate shops are computed in one pass over the coordinate index
+        active = LaundryService.objects.filter(is_active=True)
+        available = self.filter_availability(active)
+        if available is active:
+            matches = shop_index.nearby(lat, lng, radius, limit=limit)
+        else:
+            # Apply the availability filter before the limit so it does not cut into the nearest shops
+            matches = shop_index.nearby(lat, lng, radius)
+            available_ids = set(available.filter(id__in=[match[0] for match in matches]).values_list('id', flat=True))
+            matches = [match for match in matches if match[0] in available_ids][:limit]
+        services = self.with_related(
+            LaundryService.objects.filter(is_active=True)
+        ).in_bulk([shop_id for shop_id, _ in matches])
         
         nearby_services = []
-        for service in LaundryService.objects.filter(is_active=True):
-            if service.latitude and service.longitude:
-                distance = calculate_distance(lat, lng, float(service.latitude), float(service.longitude))
-                if distance <= radius:
-                    nearby_services.append(service.id)
-        
-        return LaundryService.objects.filter(id__in=nearby_services)
+        for shop_id, distance in matches:
+            service = services.get(shop_id)
+            if service is not None:
+                service.distance = round(distance, 2)
+                nearby_services.append(service)
+        return nearby_services
 
 class AddReviewView(generics.CreateAPIView):
     serializer_class = ReviewSerializer
@@ -183,28 +269,22 @@ class AddReviewView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         laundry_service = get_object_or_404(LaundryService, id=self.kwargs['pk'])
-        review = serializer.save(user=self.request.user, laundry_service=laundry_service)
-        self.update_service_rating(laundry_service)
-    
-    def update_service_rating(self, laundry_service):
-        reviews = laundry_service.reviews.all()
-        if reviews.exists():
-            total_rating = sum(review.rating for review in reviews)
-            average_rating = total_rating / reviews.count()
-            laundry_service.rating = round(average_rating, 2)
-            laundry_service.total_reviews = reviews.count()
-            laundry_service.save()
+        with transaction.atomic():
+            review = serializer.save(user=self.request.user, laundry_service=laundry_service)
+            ratings.review_added(review)
 
 # Service Type Views
-class ServiceTypeListCreateView(generics.ListCreateAPIView):
-    queryset = ServiceType.objects.all()
+class ServiceTypeListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
+    queryset = ServiceType.objects.order_by('name')
     serializer_class = ServiceTypeSerializer
     permission_classes = [IsVendor]
+    cache_tags = (SERVICE_TYPES,)
 
-class ServiceTypeDetailView(generics.RetrieveUpdateDestroyAPIView):
+class ServiceTypeDetailView(CachedResponseMixin, generics.RetrieveUpdateDestroyAPIView):
     queryset = ServiceType.objects.all()
     serializer_class = ServiceTypeSerializer
     permission_classes = [IsVendor]
+    cache_tags = (SERVICE_TYPES,)
 
 # Service Offering Views
 class ServiceOfferingListCreateView(generics.ListCreateAPIView):
@@ -213,12 +293,13 @@ class ServiceOfferingListCreateView(generics.ListCreateAPIView):
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['service_type__name', 'laundry_service__shop_name']
     ordering_fields = ['price', 'service_type__name', 'laundry_service__shop_name']
+    ordering = ['id']
     
     def get_queryset(self):
         # Vendors can only see offerings for their own services
         if self.request.user.is_authenticated and self.request.user.user_type == 'vendor':
-            return ServiceOffering.objects.filter(laundry_service__vendor=self.request.user)
-        return ServiceOffering.objects.all()
+            return ServiceOffering.objects.filter(laundry_service__vendor=self.request.user).select_related('service_type')
+        return ServiceOffering.objects.select_related('service_type')
 
 
 class ServiceOfferingDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -228,8 +309,8 @@ class ServiceOfferingDetailView(generics.RetrieveUpdateDestroyAPIView):
     def get_queryset(self):
         # Vendors can only access offerings for their own services
         if self.request.user.is_authenticated and self.request.user.user_type == 'vendor':
-            return ServiceOffering.objects.filter(laundry_service__vendor=self.request.user)
-        return ServiceOffering.objects.all()
+            return ServiceOffering.objects.filter(laundry_service__vendor=self.request.user).select_related('service_type')
+        return ServiceOffering.objects.select_related('service_type')
 
 # Operating Hour Views
 class OperatingHourListCreateView(generics.ListCreateAPIView):
@@ -253,18 +334,25 @@ class OperatingHourDetailView(generics.RetrieveUpdateDestroyAPIView):
         return OperatingHour.objects.all()
 
 # Review Views
-class ReviewListCreateView(generics.ListCreateAPIView):
+class ReviewListCreateView(CachedResponseMixin, generics.ListCreateAPIView):
     serializer_class = ReviewSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    pagination_class = CreatedAtCursorPagination
+    
+    def get_cache_tags(self):
+        # Only the per-shop listing is public; the other listings depend on the user
+        if 'pk' in self.kwargs:
+            return (shop_tag(self.kwargs['pk']),)
+        return None
     
     def get_queryset(self):
         laundry_service_id = self.kwargs.get('pk')
         if laundry_service_id:
-            return Review.objects.filter(laundry_service_id=laundry_service_id)
+            return Review.objects.filter(laundry_service_id=laundry_service_id).select_related('user')
         
         if self.request.user.is_authenticated:
-            return Review.objects.filter(user=self.request.user)
-        return Review.objects.all()
+            return Review.objects.filter(user=self.request.user).select_related('user')
+        return Review.objects.select_related('user')
     
     def perform_create(self, serializer):
         laundry_service_id = self.request.data.get('laundry_service')
@@ -272,17 +360,9 @@ class ReviewListCreateView(generics.ListCreateAPIView):
             laundry_service_id = self.kwargs.get('pk')
         
         laundry_service = get_object_or_404(LaundryService, id=laundry_service_id)
-        serializer.save(user=self.request.user, laundry_service=laundry_service)
-        self.update_service_rating(laundry_service)
-    
-    def update_service_rating(self, laundry_service):
-        reviews = laundry_service.reviews.all()
-        if reviews.exists():
-            total_rating = sum(review.rating for review in reviews)
-            average_rating = total_rating / reviews.count()
-            laundry_service.rating = round(average_rating, 2)
-            laundry_service.total_reviews = reviews.count()
-            laundry_service.save()
+        with transaction.atomic():
+            review = serializer.save(user=self.request.user, laundry_service=laundry_service)
+            ratings.review_added(review)
 
 class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = ReviewSerializer
@@ -290,28 +370,16 @@ class ReviewDetailView(generics.RetrieveUpdateDestroyAPIView):
     
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Review.objects.filter(user=self.request.user)
-        return Review.objects.all()
+            return Review.objects.filter(user=self.request.user).select_related('user')
+        return Review.objects.select_related('user')
     
     def perform_update(self, serializer):
-        review = self.get_object()
-        serializer.save()
-        self.update_service_rating(review.laundry_service)
+        previous_rating = serializer.instance.rating
+        with transaction.atomic():
+            review = serializer.save()
+            ratings.review_changed(review, previous_rating)
     
     def perform_destroy(self, instance):
-        laundry_service = instance.laundry_service
-        instance.delete()
-        self.update_service_rating(laundry_service)
-    
-    def update_service_rating(self, laundry_service):
-        reviews = laundry_service.reviews.all()
-        if reviews.exists():
-            total_rating = sum(review.rating for review in reviews)
-            average_rating = total_rating / reviews.count()
-            laundry_service.rating = round(average_rating, 2)
-            laundry_service.total_reviews = reviews.count()
-            laundry_service.save()
-        else:
-            laundry_service.rating = 0.00
-            laundry_service.total_reviews = 0
-            laundry_service.save()
\ No newline at end of file
+        with transaction.atomic():
+            instance.delete()
+            ratings.review_removed(instance)